@@ -1,18 +1,40 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, File, Request, UploadFile, WebSocket
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional, List
+from contextlib import asynccontextmanager
+import asyncio
 import json
+import time
 from main import RespirIAModel
+from bulk import iter_scored
+from audio import AudioCache, AudioJobManager
+from streaming import format_sse
+from ingestion import StreamSession
+from observability import CONTENT_TYPE, HTTP_LATENCY, HTTP_REQUESTS, REGISTRY, configure_logging
 from config import Config
 import os
 
+# Journaux structurés (JSON par défaut, voir Config.LOG_FORMAT)
+configure_logging()
+
+@asynccontextmanager
+async def lifespan(app):
+    """
+    À l'arrêt : libère le pool de connexions HTTP vers OpenRouter et
+    les threads de génération des messages vocaux
+    """
+    yield
+    await model.aclose()
+    audio_jobs.shutdown()
+
 # Initialisation de l'API
 app = FastAPI(
     title="RespirIA API",
     description="API de prédiction des risques respiratoires avec IA",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configuration CORS pour permettre les appels depuis une application web/mobile
@@ -24,10 +46,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    """
+    Compte les requêtes et mesure leur durée, par route
+    Pour les réponses diffusées (streaming), la durée s'arrête au début de la réponse
+    """
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        # Le modèle de chemin (/audio/{filename}) évite une série par fichier
+        path = route.path if route is not None else "inconnue"
+        HTTP_REQUESTS.inc(route=path, method=request.method, status=status)
+        HTTP_LATENCY.observe(time.perf_counter() - started, route=path, method=request.method)
+
 # Initialiser le modèle IA (chargé une seule fois au démarrage)
 model = RespirIAModel()
 model.load_training_data()
 
+# Génération des messages vocaux en arrière-plan
+audio_jobs = AudioJobManager(model.audio_cache)
+
 # Modèles de données Pydantic
 class SensorData(BaseModel):
     """
@@ -60,6 +104,12 @@ class SensorData(BaseModel):
             }
         }
 
+def validate_sensor_data(item):
+    """
+    Relevé brut -> dict validé (lève ValueError / TypeError si invalide)
+    """
+    return SensorData(**item).dict(exclude_none=True)
+
 class AnalysisResponse(BaseModel):
     """
     Format de la réponse d'analyse
@@ -84,7 +134,15 @@ class AnalysisResponse(BaseModel):
     recommandations: Optional[List[str]] = []
     message_vocal: str
     previsions: Optional[str] = None
+    reutilise: bool = False  # True si le résultat précédent de l'appareil est réutilisé (relevé inchangé)
+    tendances: Optional[dict] = None  # Moyennes, pentes et prévisions sur les derniers relevés de l'appareil
     audio_url: Optional[str] = None
+    audio_status: Optional[str] = None  # "pending", "ready" ou "failed"
+    audio_status_url: Optional[str] = None
+    confiance: Optional[float] = None  # Probabilité du niveau prédit par le modèle local
+    maladie_probable: Optional[str] = None  # Maladie la plus probable selon le modèle local
+    source: Optional[str] = None  # "local", "model", "cache", "reuse", "llm" ou "fallback" (LLM indisponible)
+    modele: Optional[str] = None  # Modèle OpenRouter ayant produit l'analyse
 
 
 # Routes de l'API
@@ -99,8 +157,14 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "POST /analyze": "Analyser les données des capteurs",
+            "POST /analyze-stream": "Analyser en streaming (Server-Sent Events)",
             "POST /analyze-with-audio": "Analyser et générer l'audio",
+            "GET /audio-status/{job_id}": "État de la génération d'un message vocal",
+            "POST /bulk-score": "Score en masse d'un fichier CSV / JSON-lines (sans LLM)",
+            "POST /predict": "Prédiction du modèle local pour un lot de relevés (sans LLM)",
+            "WS /ws/ingest": "Flux continu de relevés (passerelles), résultats et alertes poussés",
             "GET /health": "Vérifier l'état de l'API",
+            "GET /metrics": "Métriques au format Prometheus",
             "GET /docs": "Documentation interactive"
         }
     }
@@ -112,10 +176,29 @@ async def health_check():
     """
     return {
         "status": "healthy",
+        "worker": os.getpid(),
         "model_loaded": model.training_context != "",
-        "gemini_configured": Config.GEMINI_API_KEY != "votre_cle_api_ici"
+        "gemini_configured": bool(Config.OPENROUTER_API_KEY),
+        "cache": model.cache.stats() if model.cache is not None else None,
+        "audio_cache": model.audio_cache.stats(),
+        "tokens": model.token_usage.stats(),
+        "parsing": model.parse_stats.stats(),
+        "coalescing": model.inflight_async.stats(),
+        "models": model.router.stats(),
+        "upstream": model.upstream.stats(),
+        "series": model.series.stats() if model.series is not None else None,
+        "changes": model.changes.stats() if model.changes is not None else None,
+        "risk_model": model.risk_model.info if model.risk_model is not None else None
     }
 
+@app.get("/metrics")
+async def metrics():
+    """
+    Métriques au format texte Prometheus (requêtes, latences par étape,
+    jetons OpenRouter, caches, analyses dégradées)
+    """
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
 @app.post("/analyze", response_model=AnalysisResponse)
 async def analyze_environment(sensor_data: SensorData):
     """
@@ -132,7 +215,7 @@ async def analyze_environment(sensor_data: SensorData):
         data_dict = sensor_data.dict(exclude_none=True)
         
         # Analyser avec le modèle IA
-        result = model.analyze_environment(data_dict)
+        result = await model.analyze_environment_async(data_dict)
         
         # Ajouter le statut de succès
         result["success"] = True
@@ -145,6 +228,35 @@ async def analyze_environment(sensor_data: SensorData):
             detail=f"Erreur lors de l'analyse : {str(e)}"
         )
 
+@app.post("/analyze-stream")
+async def analyze_stream(sensor_data: SensorData):
+    """
+    Analyse en streaming (Server-Sent Events)
+    Les champs niveau_risque et score_risque sont envoyés (événement "field")
+    dès qu'ils sont générés, avant les recommandations et les prévisions ;
+    l'analyse complète arrive dans l'événement "result"
+    
+    Args:
+        sensor_data: Données des capteurs au format JSON
+        
+    Returns:
+        Flux text/event-stream
+    """
+    data_dict = sensor_data.dict(exclude_none=True)
+    
+    async def events():
+        async for event, data in model.analyze_environment_stream(data_dict):
+            if event == "result":
+                data["success"] = True
+            yield format_sse(event, data)
+        yield format_sse("done", {})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/analyze-with-audio", response_model=AnalysisResponse)
 async def analyze_with_audio(sensor_data: SensorData):
     """
@@ -161,17 +273,17 @@ async def analyze_with_audio(sensor_data: SensorData):
         data_dict = sensor_data.dict(exclude_none=True)
         
         # Analyser avec le modèle IA
-        result = model.analyze_environment(data_dict)
+        result = await model.analyze_environment_async(data_dict)
         
-        # Générer l'audio si un message vocal existe
+        # Planifier la génération de l'audio si un message vocal existe
+        # L'analyse est renvoyée immédiatement, l'audio est synthétisé en arrière-plan
         if "message_vocal" in result and result["message_vocal"]:
-            user_id = data_dict.get("user_id", "unknown")
-            filename = f"alerte_{user_id}_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.mp3"
-            audio_path = model.generate_audio(result["message_vocal"], filename)
+            job = audio_jobs.submit(result["message_vocal"])
             
-            if audio_path:
-                # Retourner l'URL relative du fichier audio
-                result["audio_url"] = f"/audio/{filename}"
+            # Retourner l'URL relative du fichier audio et celle de l'état du job
+            result["audio_url"] = f"/audio/{job['filename']}"
+            result["audio_status"] = job["status"]
+            result["audio_status_url"] = f"/audio-status/{job['job_id']}"
         
         result["success"] = True
         
@@ -183,10 +295,34 @@ async def analyze_with_audio(sensor_data: SensorData):
             detail=f"Erreur lors de l'analyse avec audio : {str(e)}"
         )
 
+@app.get("/audio-status/{job_id}")
+async def get_audio_status(job_id: str):
+    """
+    État de la génération d'un message vocal
+    
+    Args:
+        job_id: Identifiant du job (renvoyé dans audio_status_url)
+        
+    Returns:
+        Statut "pending", "ready" ou "failed" et URL du fichier audio
+    """
+    job = audio_jobs.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job audio non trouvé")
+    
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "audio_url": f"/audio/{job['filename']}",
+        "error": job["error"]
+    }
+
 @app.get("/audio/{filename}")
 async def get_audio_file(filename: str):
     """
     Récupère un fichier audio généré
+    Si la synthèse est encore en cours, attend jusqu'à AUDIO_WAIT_TIMEOUT
+    secondes puis répond 202 si le fichier n'est toujours pas prêt
     
     Args:
         filename: Nom du fichier audio
@@ -197,7 +333,23 @@ async def get_audio_file(filename: str):
     file_path = os.path.join(Config.AUDIO_OUTPUT_DIR, filename)
     
     if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="Fichier audio non trouvé")
+        job_id = filename[len(AudioCache.PREFIX):-len(".mp3")] if filename.startswith(AudioCache.PREFIX) else None
+        future = audio_jobs.future(job_id) if job_id else None
+        
+        if future is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), Config.AUDIO_WAIT_TIMEOUT)
+            except asyncio.TimeoutError:
+                return JSONResponse(
+                    status_code=202,
+                    content={"status": "pending", "audio_status_url": f"/audio-status/{job_id}"},
+                    headers={"Retry-After": "1"}
+                )
+            except Exception:
+                raise HTTPException(status_code=500, detail="Échec de la génération audio")
+        
+        if not os.path.exists(file_path):
+            raise HTTPException(status_code=404, detail="Fichier audio non trouvé")
     
     return FileResponse(
         file_path,
@@ -206,26 +358,48 @@ async def get_audio_file(filename: str):
     )
 
 @app.post("/batch-analyze")
-async def batch_analyze(sensor_data_list: List[SensorData]):
+async def batch_analyze(
+    sensor_data_list: List[dict],
+    concurrency: Optional[int] = None,
+    timeout: Optional[float] = None
+):
     """
     Analyse plusieurs ensembles de données en batch
+    Les analyses sont lancées en parallèle (concurrence bornée) et les
+    résultats sont renvoyés dans l'ordre des entrées ; chaque relevé est
+    validé dans sa propre tâche, un relevé invalide n'échoue que dans sa case
     
     Args:
-        sensor_data_list: Liste de données capteurs
+        sensor_data_list: Liste de données capteurs (format SensorData)
+        concurrency: Nombre maximal d'analyses simultanées (plafonné par la configuration)
+        timeout: Délai maximal pour l'ensemble du batch en secondes (strictement positif)
         
     Returns:
-        Liste des analyses
+        Liste des analyses, nombre d'échecs et durée du batch
     """
+    if timeout is not None and timeout <= 0:
+        raise HTTPException(status_code=400, detail="timeout doit être strictement positif")
+    
     try:
-        results = []
+        if concurrency is not None:
+            concurrency = max(1, min(concurrency, Config.BATCH_MAX_CONCURRENCY))
         
-        for sensor_data in sensor_data_list:
-            data_dict = sensor_data.dict(exclude_none=True)
-            result = model.analyze_environment(data_dict)
-            result["success"] = True
-            results.append(result)
+        start = time.perf_counter()
+        results = await model.analyze_batch_async(
+            sensor_data_list,
+            concurrency=concurrency,
+            timeout=timeout,
+            validate=validate_sensor_data
+        )
+        duration_ms = (time.perf_counter() - start) * 1000
         
-        return {"results": results, "total": len(results)}
+        failed = sum(1 for result in results if not result["success"])
+        return {
+            "results": results,
+            "total": len(results),
+            "failed": failed,
+            "duration_ms": round(duration_ms, 1)
+        }
         
     except Exception as e:
         raise HTTPException(
@@ -233,8 +407,62 @@ async def batch_analyze(sensor_data_list: List[SensorData]):
             detail=f"Erreur lors de l'analyse batch : {str(e)}"
         )
 
-# Import pandas pour timestamp (si nécessaire)
-import pandas as pd
+@app.post("/predict")
+async def predict(sensor_data_list: List[SensorData]):
+    """
+    Prédiction du modèle local (régression logistique distillée des verdicts
+    du LLM) pour un lot de relevés, sans appel externe
+    
+    Returns:
+        Prédictions dans l'ordre des entrées et durée du calcul
+    """
+    if model.risk_model is None:
+        raise HTTPException(status_code=503, detail="Modèle local non chargé (RISK_MODEL_ENABLED)")
+    start = time.perf_counter()
+    results = model.predict([sensor_data.dict(exclude_none=True) for sensor_data in sensor_data_list])
+    return {
+        "results": results,
+        "total": len(results),
+        "duration_ms": round((time.perf_counter() - start) * 1000, 3)
+    }
+
+@app.post("/bulk-score")
+async def bulk_score(file: UploadFile = File(...), output_format: str = "ndjson"):
+    """
+    Score en masse d'un fichier de relevés (CSV ou JSON-lines), sans LLM
+    Le fichier est traité par blocs vectorisés et les résultats sont diffusés
+    au fil de l'eau
+    
+    Args:
+        file: Fichier CSV ou JSON-lines (.jsonl / .ndjson) de relevés capteurs
+        output_format: "ndjson" ou "csv"
+        
+    Returns:
+        Flux des relevés scorés
+    """
+    if output_format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="output_format doit valoir 'ndjson' ou 'csv'")
+    
+    filename = (file.filename or "").lower()
+    is_ndjson = filename.endswith((".jsonl", ".ndjson", ".json")) or "json" in (file.content_type or "")
+    input_format = "ndjson" if is_ndjson else "csv"
+    
+    media_type = "text/csv" if output_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        iter_scored(file.file, input_format, output_format, model.training_profile),
+        media_type=media_type
+    )
+
+@app.websocket("/ws/ingest")
+async def ingest(websocket: WebSocket):
+    """
+    Ingestion continue des relevés d'une passerelle (voir ingestion.py)
+    Chaque message contient un relevé SensorData ou une liste de relevés ;
+    les résultats (par lots) et les alertes sont poussés sur la même connexion
+    """
+    await websocket.accept()
+    session = StreamSession(websocket, model.analyze_batch_async, validate_sensor_data)
+    await session.run()
 
 # Lancer l'API
 if __name__ == "__main__":
@@ -0,0 +1,263 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from observability import span
+
+logger = logging.getLogger(__name__)
+
+# Moteur de synthèse, importé à la première synthèse (gTTS et requests
+# ralentissent le démarrage) ; remplaçable, voir benchmarks/mock_tts.py
+gTTS = None
+
+
+def _engine():
+    global gTTS
+    if gTTS is None:
+        from gtts import gTTS
+    return gTTS
+
+
+class AudioCache:
+    """
+    Cache des messages vocaux synthétisés, adressé par contenu
+    Le nom du fichier dérive de l'empreinte (langue + texte) : un message
+    déjà synthétisé est réutilisé, et les demandes simultanées pour un même
+    texte ne déclenchent qu'une seule synthèse
+    """
+
+    PREFIX = "tts_"
+
+    def __init__(self, directory=None, language=None):
+        self.directory = directory or Config.AUDIO_OUTPUT_DIR
+        self.language = language or Config.AUDIO_LANGUAGE
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, text):
+        """
+        Empreinte du message (langue + texte)
+        """
+        return hashlib.sha256(f"{self.language}\n{text}".encode("utf-8")).hexdigest()[:32]
+
+    def filename(self, text):
+        return f"{self.PREFIX}{self.key(text)}.mp3"
+
+    def path(self, text):
+        return os.path.join(self.directory, self.filename(text))
+
+    def get_or_create(self, text):
+        """
+        Retourne le chemin du MP3 du message, en le synthétisant si nécessaire
+
+        Returns:
+            str: Chemin du fichier audio
+        """
+        path = self.path(text)
+        if os.path.exists(path):
+            self._touch(path)
+            self.hits += 1
+            return path
+
+        lock = self._lock_for(path)
+        try:
+            with lock:
+                # Un autre appel a pu synthétiser le même texte pendant l'attente
+                if os.path.exists(path):
+                    self._touch(path)
+                    self.hits += 1
+                    return path
+                self.misses += 1
+                self.synthesize(text, path)
+        finally:
+            # Verrou libéré même si la synthèse échoue ou si le fichier existait déjà
+            with self._locks_guard:
+                if self._locks.get(path) is lock:
+                    del self._locks[path]
+
+        self.evict()
+        return path
+
+    def synthesize(self, text, path):
+        """
+        Synthèse gTTS, écrite de façon atomique (jamais de fichier partiel visible)
+        """
+        with span("tts_synthesis"):
+            buffer = io.BytesIO()
+            _engine()(text=text, lang=self.language, slow=False).write_to_fp(buffer)
+
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with span("audio_write"):
+                with open(tmp_path, "wb") as f:
+                    f.write(buffer.getvalue())
+                os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def evict(self):
+        """
+        Supprime les fichiers du cache trop anciens, puis les moins récemment
+        utilisés tant que la taille totale dépasse Config.AUDIO_CACHE_MAX_BYTES
+        """
+        now = time.time()
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+
+        for name in names:
+            if not (name.startswith(self.PREFIX) and name.endswith(".mp3")):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > Config.AUDIO_CACHE_MAX_AGE:
+                self._remove(path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= Config.AUDIO_CACHE_MAX_BYTES:
+                break
+            self._remove(path)
+            total -= size
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def _lock_for(self, path):
+        with self._locks_guard:
+            return self._locks.setdefault(path, threading.Lock())
+
+    @staticmethod
+    def _touch(path):
+        # La date de modification sert d'horodatage de dernière utilisation
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class AudioJobManager:
+    """
+    Génération des messages vocaux en arrière-plan
+    Chaque job est identifié par l'empreinte du message : un texte déjà en
+    cours de synthèse ou déjà disponible ne crée pas de nouveau job
+    """
+
+    PENDING = "pending"
+    READY = "ready"
+    FAILED = "failed"
+
+    def __init__(self, cache, workers=None):
+        self.cache = cache
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or Config.AUDIO_WORKERS,
+            thread_name_prefix="audio"
+        )
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, text):
+        """
+        Planifie la synthèse d'un message (sans attendre)
+
+        Returns:
+            dict: État du job (job_id, status, filename)
+        """
+        job_id = self.cache.key(text)
+        filename = self.cache.filename(text)
+
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(job_id)
+            if job is not None and job["status"] != self.FAILED:
+                return self._describe(job_id, job)
+
+            if os.path.exists(self.cache.path(text)):
+                job = {"status": self.READY, "filename": filename, "error": None,
+                       "future": None, "finished_at": time.time()}
+            else:
+                job = {"status": self.PENDING, "filename": filename, "error": None,
+                       "future": None, "finished_at": None}
+                job["future"] = self._executor.submit(self._run, job_id, text)
+            self._jobs[job_id] = job
+            return self._describe(job_id, job)
+
+    def status(self, job_id):
+        """
+        État d'un job, ou None s'il est inconnu
+        Un fichier présent dans le cache est toujours considéré comme prêt
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return self._describe(job_id, job)
+
+        filename = f"{self.cache.PREFIX}{job_id}.mp3"
+        if os.path.exists(os.path.join(self.cache.directory, filename)):
+            return {"job_id": job_id, "status": self.READY, "filename": filename, "error": None}
+        return None
+
+    def future(self, job_id):
+        """
+        Future de la synthèse en cours (None si aucun job en attente)
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job["future"] if job is not None and job["status"] == self.PENDING else None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job_id, text):
+        try:
+            self.cache.get_or_create(text)
+            status, error = self.READY, None
+        except Exception as e:
+            logger.error("Erreur lors de la génération audio : %s", e, extra={"job_id": job_id})
+            status, error = self.FAILED, str(e)
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job["status"] = status
+                job["error"] = error
+                job["finished_at"] = time.time()
+                job["future"] = None
+        if error is not None:
+            raise RuntimeError(error)
+
+    def _prune(self):
+        # Les jobs terminés ne sont conservés que Config.AUDIO_JOB_TTL secondes
+        limit = time.time() - Config.AUDIO_JOB_TTL
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finished_at"] is not None and job["finished_at"] < limit
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    @staticmethod
+    def _describe(job_id, job):
+        return {"job_id": job_id, "status": job["status"], "filename": job["filename"], "error": job["error"]}
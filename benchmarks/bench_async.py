@@ -0,0 +1,115 @@
+"""
+Benchmark de charge : appel OpenRouter bloquant vs client asynchrone
+
+Lance un faux serveur OpenRouter local, puis envoie N analyses simultanées
+depuis une boucle asyncio, comme le font les routes FastAPI :
+- "avant" : analyze_environment (requests.post bloque la boucle)
+- "après" : analyze_environment_async (httpx, pool keep-alive)
+
+Cache, détection de changement et regroupement des requêtes identiques
+sont désactivés : chaque analyse appelle le LLM, seule la concurrence des
+appels est mesurée.
+
+Usage :
+    python benchmarks/bench_async.py --requests 200 --concurrency 50 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from config import Config
+from benchmarks.mock_openrouter import start_in_thread
+
+SENSOR_DATA = {
+    "temperature": 30.0,
+    "humidity": 35.0,
+    "co2": 1200.0,
+    "pm25": 45.0,
+    "pollen": "élevé",
+    "location": "Abidjan",
+    "user_id": "bench"
+}
+
+
+def percentile(values, q):
+    """
+    Percentile par interpolation linéaire (q entre 0 et 100)
+    """
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    position = (len(ordered) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+async def run_load(analyze, total, concurrency):
+    """
+    Exécute `total` analyses avec au plus `concurrency` en vol
+    Toutes les requêtes arrivent au même instant : la latence de chacune est
+    mesurée depuis cet instant, attente comprise (latence perçue par le client)
+
+    Returns:
+        tuple: (latences en secondes, durée totale en secondes)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    start = time.perf_counter()
+
+    async def one():
+        async with semaphore:
+            await analyze(dict(SENSOR_DATA))
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(total)))
+    return latencies, time.perf_counter() - start
+
+
+def report(label, latencies, elapsed):
+    print(f"{label:<8} p50={percentile(latencies, 50) * 1000:8.1f} ms  "
+          f"p99={percentile(latencies, 99) * 1000:8.1f} ms  "
+          f"débit={len(latencies) / elapsed:8.1f} req/s  "
+          f"(moyenne {statistics.mean(latencies) * 1000:.1f} ms)")
+
+
+async def main(args):
+    server = start_in_thread(port=args.port, latency=args.latency)
+    Config.OPENROUTER_BASE_URL = f"http://127.0.0.1:{args.port}"
+    Config.OPENROUTER_API_KEY = Config.OPENROUTER_API_KEY or "mock"
+    # Requêtes identiques : sans cela, presque toutes seraient servies par le
+    # cache, la détection de changement ou un appel déjà en cours
+    Config.ANALYSIS_MODE = "llm"
+    Config.CACHE_ENABLED = False
+    Config.CHANGE_DETECTION = False
+    Config.COALESCE_REQUESTS = False
+    Config.VERDICT_LOG_ENABLED = False
+
+    from main import RespirIAModel
+    model = RespirIAModel()
+
+    async def blocking(sensor_data):
+        # Reproduit l'ancien comportement des routes : appel synchrone dans une coroutine
+        return model.analyze_environment(sensor_data)
+
+    print(f"{args.requests} requêtes, concurrence {args.concurrency}, latence LLM simulée {args.latency * 1000:.0f} ms\n")
+    report("avant", *await run_load(blocking, args.requests, args.concurrency))
+    report("après", *await run_load(model.analyze_environment_async, args.requests, args.concurrency))
+
+    await model.aclose()
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark client OpenRouter synchrone vs asynchrone")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2, help="Latence simulée du LLM en secondes")
+    parser.add_argument("--port", type=int, default=8099)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,68 @@
+"""
+Benchmark du score en masse (bulk.py) : lignes par seconde
+
+Génère des relevés synthétiques, puis mesure :
+- "score"   : score vectorisé d'un DataFrame déjà en mémoire
+- "fichier" : lecture CSV par blocs + score + sérialisation CSV (chaîne complète)
+
+Usage :
+    python benchmarks/bench_bulk.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bulk import iter_scored, load_profile, score_dataframe
+
+
+def synthetic_readings(rows, seed=0):
+    """
+    Relevés aléatoires couvrant toutes les bandes de Config.THRESHOLDS
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "temperature": rng.uniform(5, 40, rows).round(1),
+        "humidity": rng.uniform(10, 90, rows).round(1),
+        "co2": rng.uniform(300, 2500, rows).round(0),
+        "pm25": rng.uniform(0, 100, rows).round(1),
+        "no2": rng.uniform(0, 300, rows).round(1),
+        "pressure": rng.uniform(980, 1050, rows).round(1),
+        "pollen": rng.choice(["faible", "moyen", "élevé", "très élevé"], rows),
+        "user_id": rng.integers(0, 1000, rows).astype(str)
+    })
+
+
+def timed(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def main(args):
+    profile = load_profile()
+    print(f"{'lignes':>10} {'score (lignes/s)':>18} {'fichier (lignes/s)':>20}")
+    for rows in args.sizes:
+        df = synthetic_readings(rows)
+        score_time = timed(lambda: score_dataframe(df, profile))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "releves.csv")
+            df.to_csv(path, index=False)
+            sink = open(os.devnull, "w")
+            file_time = timed(lambda: [sink.write(part) for part in iter_scored(path, "csv", "csv", profile)])
+            sink.close()
+
+        print(f"{rows:>10} {rows / score_time:>18,.0f} {rows / file_time:>20,.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark du score en masse")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    main(parser.parse_args())
@@ -0,0 +1,112 @@
+"""
+Benchmark du format colonnaire (.npcols) face au CSV d'entraînement
+
+Le jeu d'entraînement est agrandi (tirage avec remise de ses lignes) à la
+taille demandée, écrit en CSV puis converti. Chaque mesure tourne dans un
+processus neuf et parcourt toutes les valeurs numériques :
+- "csv"           : pd.read_csv du fichier complet (types de CSV_DTYPES)
+- "npcols"        : ouverture projetée + DataFrame complet (ColumnarDataset.to_dataframe)
+- "csv stats"     : statistiques d'entraînement calculées par blocs depuis le CSV
+- "npcols stats"  : mêmes statistiques depuis le jeu colonnaire
+
+Mémoire : RssAnon (privée au processus) et RssFile (pages du fichier
+projeté, partagées entre workers par le cache du système), d'après
+/proc/self/status (Linux).
+
+Usage :
+    python benchmarks/bench_columnar.py --rows 1000000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import pandas as pd
+
+from columnar import convert_csv
+from config import Config
+
+_PROBE = """
+import json, time
+started = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - started
+status = dict(line.split(":", 1) for line in open("/proc/self/status"))
+print(json.dumps({{
+    "seconds": elapsed,
+    **{{key: int(status[key].split()[0]) // 1024 for key in ("VmHWM", "RssAnon", "RssFile")}}
+}}))
+"""
+
+CASES = {
+    "csv": """
+import pandas as pd
+from training_stats import CSV_DTYPES
+df = pd.read_csv({csv!r}, dtype=CSV_DTYPES)
+df.select_dtypes("number").sum()
+""",
+    "npcols": """
+from columnar import ColumnarDataset
+df = ColumnarDataset({npcols!r}).to_dataframe()
+df.select_dtypes("number").sum()
+""",
+    "csv stats": """
+from training_stats import compute_training_stats_from_csv
+compute_training_stats_from_csv({csv!r})
+""",
+    "npcols stats": """
+from training_stats import compute_training_stats_from_csv
+compute_training_stats_from_csv({npcols!r})
+"""
+}
+
+
+def synthetic_training(rows, seed=0):
+    """
+    Lignes du jeu d'entraînement tirées avec remise jusqu'à `rows` lignes
+    """
+    df = pd.read_csv(os.path.join(ROOT, Config.TRAINING_DATA_PATH))
+    return df.sample(n=rows, replace=True, random_state=seed).reset_index(drop=True)
+
+
+def measure(case, paths):
+    code = _PROBE.format(code=CASES[case].format(**paths))
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {"csv": os.path.join(tmp, "training.csv"), "npcols": os.path.join(tmp, "training.npcols")}
+        synthetic_training(args.rows).to_csv(paths["csv"], index=False)
+
+        started = time.perf_counter()
+        convert_csv(paths["csv"], paths["npcols"], compact=args.compact)
+        conversion = time.perf_counter() - started
+        print(f"{args.rows:,} lignes : CSV {os.path.getsize(paths['csv']) / 1e6:.1f} Mo, "
+              f".npcols {directory_size(paths['npcols']) / 1e6:.1f} Mo (conversion {conversion:.1f} s)\n")
+
+        print(f"{'mesure':<14} {'temps (s)':>10} {'pic (Mo)':>10} {'RssAnon (Mo)':>13} {'RssFile (Mo)':>13}")
+        for case in CASES:
+            result = measure(case, paths)
+            print(f"{case:<14} {result['seconds']:>10.2f} {result['VmHWM']:>10} "
+                  f"{result['RssAnon']:>13} {result['RssFile']:>13}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark du format colonnaire")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--compact", action="store_true", help="Mesures en float32")
+    main(parser.parse_args())
@@ -0,0 +1,82 @@
+"""
+Micro-benchmark de la construction du prompt
+
+Compare l'ancienne construction (f-string complète reformatée à chaque
+requête, données capteurs indentées) à la construction actuelle (préfixe
+fixe compilé au chargement + bloc capteurs compact), et affiche le nombre
+de jetons estimé par requête.
+
+Usage :
+    python benchmarks/bench_prompt.py --iterations 20000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from config import Config
+from main import PROMPT_INSTRUCTIONS, SYSTEM_ROLE, RespirIAModel, estimate_tokens
+
+SENSOR_DATA = {
+    "temperature": 30.0,
+    "humidity": 35.0,
+    "co2": 1200.0,
+    "pm25": 45.0,
+    "pollen": "élevé",
+    "timestamp": "2026-01-14T14:30:00",
+    "location": "Abidjan",
+    "user_id": "bench"
+}
+
+
+def legacy_prompt(model, sensor_data):
+    """
+    Reproduit l'ancienne construction : tout le texte reformaté à chaque appel
+    """
+    return f"""
+{model.training_context}
+
+MISSION :
+Analyse les données environnementales suivantes et prédit les risques pour les maladies respiratoires.
+
+DONNÉES DES CAPTEURS :
+{json.dumps(sensor_data, indent=2, ensure_ascii=False)}
+
+{model._similar_cases_block(sensor_data)}
+{PROMPT_INSTRUCTIONS}"""
+
+
+def timed(function, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main(args):
+    Config.OPENROUTER_API_KEY = Config.OPENROUTER_API_KEY or "bench"
+    model = RespirIAModel()
+    model.load_training_data()
+
+    legacy_us = timed(lambda: legacy_prompt(model, SENSOR_DATA), args.iterations)
+    current_us = timed(lambda: model._build_request(SENSOR_DATA), args.iterations)
+
+    legacy_tokens = estimate_tokens(SYSTEM_ROLE) + estimate_tokens(legacy_prompt(model, SENSOR_DATA))
+    prefix_tokens = estimate_tokens(model._prompt_prefix)
+    user_tokens = estimate_tokens(model._build_prompt(SENSOR_DATA))
+
+    print(f"Construction du prompt ({args.iterations} itérations, {Config.RETRIEVAL_K} cas similaires)")
+    print(f"  avant : {legacy_us:8.1f} µs/requête")
+    print(f"  après : {current_us:8.1f} µs/requête (payload complet)")
+    print("\nJetons d'entrée estimés par requête")
+    print(f"  avant : {legacy_tokens} (aucune partie réutilisable)")
+    print(f"  après : {prefix_tokens + user_tokens} = {prefix_tokens} préfixe fixe (cache fournisseur) + {user_tokens} variables")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmark de la construction du prompt")
+    parser.add_argument("--iterations", type=int, default=20000)
+    main(parser.parse_args())
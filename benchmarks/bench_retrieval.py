@@ -0,0 +1,66 @@
+"""
+Benchmark de la recherche des cas similaires (retrieval.py)
+
+Mesure le temps d'une requête des k plus proches voisins en fonction de la
+taille du jeu d'entraînement (cas synthétiques), ainsi que la taille du
+bloc de prompt généré, qui doit rester constante.
+
+Usage :
+    python benchmarks/bench_retrieval.py --sizes 1000 10000 100000 1000000 --k 5
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from retrieval import CaseIndex, format_cases
+
+
+def synthetic_cases(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "maladie": rng.choice(["grippe", "infections respiratoires", "asthme"], rows),
+        "temperature": rng.normal(38.5, 0.8, rows).round(1),
+        "humidity": rng.normal(65, 7, rows).round(0),
+        "co2": rng.normal(850, 70, rows).round(0),
+        "pm25": rng.normal(26, 6, rows).round(0),
+        "pollen": rng.choice(["faible", "moyen"], rows),
+        "symptomes": "fatigue, toux",
+        "severite": rng.choice(["faible", "modérée", "élevée", "critique"], rows),
+        "recommandations": "Repos, hydratation"
+    })
+
+
+def main(args):
+    queries = [
+        {"co2": float(c), "pm25": float(p), "humidity": float(h), "pollen": "moyen"}
+        for c, p, h in zip(np.linspace(600, 1200, 50), np.linspace(5, 60, 50), np.linspace(30, 90, 50))
+    ]
+    print(f"{'cas':>10} {'construction (ms)':>18} {'requête (µs)':>14} {'prompt (car.)':>14}")
+    for rows in args.sizes:
+        df = synthetic_cases(rows)
+        start = time.perf_counter()
+        index = CaseIndex.from_dataframe(df)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for query in queries:
+                index.query(query, k=args.k)
+        query_us = (time.perf_counter() - start) / (args.repeat * len(queries)) * 1e6
+
+        prompt_size = len(format_cases(index.query(queries[0], k=args.k)))
+        print(f"{rows:>10} {build_ms:>18.1f} {query_us:>14.1f} {prompt_size:>14}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la recherche des cas similaires")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,74 @@
+"""
+Benchmark du modèle local de risque (risk_model.py)
+
+Mesure :
+- le temps d'entraînement (a priori des seuils + verdicts du journal, maladie sur le CSV)
+- la latence par relevé : RiskScorer.score (seuils), LearnedRiskScorer.score
+  (analyse locale complète du modèle) et RiskModel.predict par lots
+- l'accord du modèle avec les seuils sur des relevés synthétiques inédits
+
+Usage :
+    python benchmarks/bench_risk_model.py --sizes 1 10 100 10000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from config import Config
+from risk_model import LearnedRiskScorer, RiskModel, score_arrays, synthetic_readings
+from scoring import RiskScorer
+
+POLLEN_LABELS = {score: label for label, score in Config.POLLEN_SCORES.items()}
+
+
+def as_readings(columns):
+    """
+    Relevés (dictionnaires) à partir des tableaux de synthetic_readings
+    """
+    readings = []
+    for i in range(len(columns["pollen"])):
+        reading = {field: float(values[i]) for field, values in columns.items()
+                   if field != "pollen" and not np.isnan(values[i])}
+        if not np.isnan(columns["pollen"][i]):
+            reading["pollen"] = POLLEN_LABELS[int(columns["pollen"][i])]
+        readings.append(reading)
+    return readings
+
+
+def per_reading_us(function, readings, repeat):
+    function(readings)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(readings)
+    return (time.perf_counter() - start) / repeat / len(readings) * 1e6
+
+
+def main(args):
+    start = time.perf_counter()
+    model = RiskModel.train(verdict_path=args.verdicts)
+    print(f"Entraînement : {time.perf_counter() - start:.2f} s  {model.info}\n")
+
+    columns = synthetic_readings(max(args.sizes), seed=1)
+    readings = as_readings(columns)
+    agreement = (model.predict_columns(columns)["niveau_risque"] == score_arrays(columns)["niveau_risque"]).mean()
+    print(f"Accord avec les seuils (relevés inédits) : {agreement:.1%}\n")
+
+    rules, learned = RiskScorer(), LearnedRiskScorer(model)
+    single = readings[:200]
+    print(f"{'RiskScorer.score':<26} {per_reading_us(lambda rs: [rules.score(r) for r in rs], single, 5):>8.1f} µs/relevé")
+    print(f"{'LearnedRiskScorer.score':<26} {per_reading_us(lambda rs: [learned.score(r) for r in rs], single, 5):>8.1f} µs/relevé")
+    for size in args.sizes:
+        repeat = max(1, 2000 // size)
+        print(f"{f'predict (lots de {size})':<26} {per_reading_us(model.predict, readings[:size], repeat):>8.1f} µs/relevé")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark du modèle local de risque")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 10_000])
+    parser.add_argument("--verdicts", default=Config.VERDICT_LOG_PATH, help="Journal des verdicts du LLM")
+    main(parser.parse_args())
@@ -0,0 +1,161 @@
+"""
+Temps de démarrage à froid de l'API et des outils en ligne de commande
+
+Chaque cible est importée dans un processus Python neuf (N fois) : temps
+total du processus et temps d'import (pour api : chargement du modèle et
+des artefacts d'entraînement compris). Une exécution supplémentaire avec
+`python -X importtime` donne les modules les plus coûteux, et les
+dépendances lourdes qui doivent rester paresseuses (pandas, gTTS, requests)
+sont signalées si elles sont chargées au démarrage.
+
+Usage :
+    python benchmarks/bench_startup.py -o demarrage.json
+    python benchmarks/bench_startup.py --compare demarrage.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from benchmarks.load_test import git_commit
+
+TARGETS = ("api", "main", "bulk")
+# Dépendances chargées uniquement sur les chemins qui en ont besoin
+LAZY_MODULES = ("pandas", "gtts", "requests")
+COMPARED_METRICS = ("import_ms", "process_ms")
+
+_PROBE = """
+import sys, time
+started = time.perf_counter()
+import {target}
+elapsed = time.perf_counter() - started
+print(elapsed, ",".join(m for m in {lazy!r} if m in sys.modules))
+"""
+
+
+def _environment():
+    env = dict(os.environ)
+    env.setdefault("OPENROUTER_API_KEY", "bench")
+    env["LOG_LEVEL"] = "ERROR"
+    return env
+
+
+def measure(target, runs):
+    """
+    Temps d'import et temps total du processus (médianes sur `runs` processus)
+    """
+    code = _PROBE.format(target=target, lazy=LAZY_MODULES)
+    import_times, process_times, loaded = [], [], set()
+    for _ in range(runs):
+        started = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", code], cwd=ROOT, env=_environment(),
+            capture_output=True, text=True, check=True
+        ).stdout.split()
+        process_times.append(time.perf_counter() - started)
+        import_times.append(float(output[0]))
+        if len(output) > 1:
+            loaded.update(output[1].split(","))
+    return {
+        "import_ms": round(statistics.median(import_times) * 1000, 1),
+        "process_ms": round(statistics.median(process_times) * 1000, 1),
+        "lazy_loaded": sorted(loaded)
+    }
+
+
+def slowest_imports(target, top):
+    """
+    Modules dont l'import (cumulé) est le plus long, d'après -X importtime
+    """
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"], cwd=ROOT, env=_environment(),
+        capture_output=True, text=True, check=True
+    ).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, name = (part.strip() for part in line.replace("import time:", "|").split("|"))
+        modules.append((int(cumulative_us), int(self_us), name))
+    modules.sort(reverse=True)
+    return [
+        {"module": name, "cumulative_ms": round(cumulative / 1000, 1), "self_ms": round(own / 1000, 1)}
+        for cumulative, own, name in modules[:top]
+    ]
+
+
+def compare(current, baseline, tolerance):
+    """
+    Affiche l'écart avec la référence ; renvoie la liste des régressions
+    """
+    regressions = []
+    print(f"\nComparaison avec la référence ({baseline['meta'].get('commit')}) :")
+    for target, metrics in current["targets"].items():
+        reference = baseline["targets"].get(target)
+        if reference is None:
+            continue
+        for metric in COMPARED_METRICS:
+            new, old = metrics[metric], reference[metric]
+            change = (new - old) / old * 100 if old else 0.0
+            worse = change > tolerance
+            flag = "  RÉGRESSION" if worse else ""
+            print(f"  {target:<6} {metric:<12} {old:>8} -> {new:>8}  ({change:+.1f} %){flag}")
+            if worse:
+                regressions.append((target, metric, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Temps de démarrage à froid de RespirIA")
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=list(TARGETS))
+    parser.add_argument("--runs", type=int, default=5, help="Processus lancés par cible")
+    parser.add_argument("--top", type=int, default=10, help="Modules les plus lents affichés")
+    parser.add_argument("-o", "--output", help="Fichier JSON des résultats")
+    parser.add_argument("--compare", help="Résultats de référence (JSON) à comparer")
+    parser.add_argument("--tolerance", type=float, default=15, help="Écart toléré avant régression (%%)")
+    args = parser.parse_args()
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args)
+        },
+        "targets": {}
+    }
+
+    failed = False
+    for target in args.targets:
+        metrics = measure(target, args.runs)
+        metrics["slowest_imports"] = slowest_imports(target, args.top)
+        results["targets"][target] = metrics
+        print(f"{target:<6} import={metrics['import_ms']:8.1f} ms  processus={metrics['process_ms']:8.1f} ms")
+        for entry in metrics["slowest_imports"]:
+            print(f"         {entry['cumulative_ms']:8.1f} ms  {entry['module']}")
+        if metrics["lazy_loaded"]:
+            failed = True
+            print(f"         chargés au démarrage (devraient être paresseux) : {', '.join(metrics['lazy_loaded'])}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\nRésultats écrits dans {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            failed = bool(compare(results, json.load(f), args.tolerance)) or failed
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""
+Test de charge hors-ligne de l'API RespirIA
+
+Démarre trois processus : le faux serveur OpenRouter, l'API (synthèse
+vocale simulée) et ce client de charge. Chaque scénario envoie N requêtes
+avec une concurrence donnée et mesure débit, percentiles de latence,
+erreurs et mémoire du processus de l'API. Les résultats sont écrits en
+JSON et peuvent être comparés à une exécution de référence.
+
+Scénarios :
+- analyze : POST /analyze
+- batch   : POST /batch-analyze (--batch-size relevés par requête)
+- audio   : POST /analyze-with-audio puis GET de l'audio jusqu'à ce qu'il soit prêt
+
+Usage :
+    python benchmarks/load_test.py --requests 500 --concurrency 50 -o resultats.json
+    python benchmarks/load_test.py --llm-failure-rate 0.05 --compare reference.json -o resultats.json
+    python benchmarks/load_test.py --env ANALYSIS_MODE=hybrid --scenarios analyze batch
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_async import percentile
+
+SCENARIOS = ("analyze", "batch", "audio")
+# Sens d'amélioration de chaque métrique comparée : +1 plus haut = mieux, -1 plus bas = mieux
+COMPARED_METRICS = {
+    "throughput_rps": 1,
+    "latency_p50_ms": -1,
+    "latency_p95_ms": -1,
+    "latency_p99_ms": -1,
+    "error_rate": -1,
+    "fallback_rate": -1,
+    "peak_rss_mb": -1
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_memory(pid):
+    """
+    Mémoire résidente actuelle et maximale d'un processus (Mo), via /proc (Linux)
+    """
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return None, None
+    to_mb = lambda name: int(fields[name].split()[0]) / 1024 if name in fields else None
+    return to_mb("VmRSS"), to_mb("VmHWM")
+
+
+def sensor_payloads(count, distinct, seed):
+    """
+    Relevés aléatoires reproductibles ; distinct > 0 limite le nombre de relevés
+    différents (pour solliciter le cache et le regroupement des requêtes)
+    """
+    rng = random.Random(seed)
+
+    def one():
+        return {
+            "temperature": round(rng.uniform(15, 38), 1),
+            "humidity": round(rng.uniform(20, 90), 1),
+            "co2": round(rng.uniform(350, 2500)),
+            "pm25": round(rng.uniform(2, 150), 1),
+            "no2": round(rng.uniform(5, 200), 1),
+            "pollen": rng.choice(["faible", "modéré", "élevé", "très élevé"]),
+            "user_id": f"bench{rng.randrange(1000)}"
+        }
+
+    pool = [one() for _ in range(distinct)] if distinct > 0 else None
+    return [rng.choice(pool) if pool else one() for _ in range(count)]
+
+
+class Stack:
+    """
+    Faux serveur OpenRouter + API lancés dans des processus séparés
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.mock_port = free_port()
+        self.api_port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.api_port}"
+        self.processes = []
+
+    def __enter__(self):
+        args = self.args
+        self.processes.append(subprocess.Popen([
+            sys.executable, os.path.join(ROOT, "benchmarks", "mock_openrouter.py"),
+            "--port", str(self.mock_port),
+            "--latency", str(args.llm_latency),
+            "--failure-rate", str(args.llm_failure_rate)
+        ]))
+
+        env = dict(os.environ)
+        env.update({
+            "OPENROUTER_BASE_URL": f"http://127.0.0.1:{self.mock_port}",
+            "OPENROUTER_API_KEY": "mock",
+            "LOG_LEVEL": "ERROR"
+        })
+        env.update(dict(item.split("=", 1) for item in args.env))
+        self.api = subprocess.Popen([
+            sys.executable, os.path.join(ROOT, "benchmarks", "serve_api.py"),
+            "--port", str(self.api_port),
+            "--tts-latency", str(args.tts_latency),
+            "--tts-failure-rate", str(args.tts_failure_rate)
+        ], cwd=ROOT, env=env)
+        self.processes.append(self.api)
+
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            if self.api.poll() is not None:
+                raise RuntimeError("L'API s'est arrêtée au démarrage")
+            try:
+                if httpx.get(f"{self.base_url}/health", timeout=1).status_code == 200:
+                    return self
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError("L'API n'a pas démarré dans les temps")
+
+    def __exit__(self, *exc):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+async def fetch_audio(client, url, deadline):
+    # /audio/{filename} attend la synthèse puis renvoie 202 si elle n'est pas terminée
+    while True:
+        response = await client.get(url)
+        if response.status_code != 202 or time.perf_counter() > deadline:
+            return response
+
+
+async def run_scenario(stack, scenario, args):
+    """
+    Exécute un scénario et renvoie ses métriques
+    """
+    items = args.requests * (args.batch_size if scenario == "batch" else 1)
+    payloads = sensor_payloads(items, args.distinct, args.seed)
+    latencies, errors, fallbacks = [], 0, 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    rss_samples = []
+
+    async def request(client, index):
+        nonlocal errors, fallbacks
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                if scenario == "batch":
+                    batch = payloads[index * args.batch_size:(index + 1) * args.batch_size]
+                    response = await client.post("/batch-analyze", json=batch)
+                    ok = response.status_code == 200 and response.json()["failed"] == 0
+                    if ok:
+                        fallbacks += sum(r.get("source") == "fallback" for r in response.json()["results"])
+                elif scenario == "audio":
+                    response = await client.post("/analyze-with-audio", json=payloads[index])
+                    ok = response.status_code == 200
+                    audio_url = response.json().get("audio_url") if ok else None
+                    if audio_url:
+                        response = await fetch_audio(client, audio_url, started + args.timeout)
+                        ok = response.status_code == 200
+                else:
+                    response = await client.post("/analyze", json=payloads[index])
+                    ok = response.status_code == 200 and response.json().get("niveau_risque") != "ERREUR"
+                    # Réponse dégradée (score local) : LLM indisponible ou disjoncteur ouvert
+                    fallbacks += ok and response.json().get("source") == "fallback"
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors += 1
+
+    async def sample_memory(stop):
+        while not stop.is_set():
+            rss, _ = process_memory(stack.api.pid)
+            if rss is not None:
+                rss_samples.append(rss)
+            try:
+                await asyncio.wait_for(stop.wait(), 0.1)
+            except asyncio.TimeoutError:
+                pass
+
+    async with httpx.AsyncClient(base_url=stack.base_url, timeout=args.timeout, limits=limits) as client:
+        # Échauffement : connexions ouvertes, imports paresseux effectués
+        for index in range(min(args.warmup, args.requests)):
+            await request(client, index)
+        latencies.clear()
+        errors = fallbacks = 0
+
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_memory(stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(request(client, index) for index in range(args.requests)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await sampler
+
+    _, peak = process_memory(stack.api.pid)
+    return {
+        "requests": args.requests,
+        "errors": errors,
+        "error_rate": round(errors / args.requests, 4),
+        # Proportion des analyses servies par le score local faute de LLM
+        "fallback_rate": round(fallbacks / items, 4),
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(args.requests / elapsed, 2),
+        "items_per_s": round(items / elapsed, 2),
+        "latency_mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "latency_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "latency_p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "latency_p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "latency_max_ms": round(max(latencies) * 1000, 2),
+        "mean_rss_mb": round(sum(rss_samples) / len(rss_samples), 1) if rss_samples else None,
+        "peak_rss_mb": round(peak, 1) if peak is not None else None
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline, tolerance):
+    """
+    Affiche l'écart avec la référence ; renvoie la liste des régressions
+    """
+    regressions = []
+    print(f"\nComparaison avec la référence ({baseline['meta'].get('commit')}) :")
+    for scenario, metrics in current["scenarios"].items():
+        reference = baseline["scenarios"].get(scenario)
+        if reference is None:
+            continue
+        for metric, direction in COMPARED_METRICS.items():
+            new, old = metrics.get(metric), reference.get(metric)
+            if new is None or old is None:
+                continue
+            change = (new - old) / old * 100 if old else (0.0 if new == old else float("inf"))
+            # Un taux quasi nul ne compte pas comme régression, même en hausse relative
+            worse = change * direction < -tolerance and not (metric.endswith("_rate") and new <= 0.001)
+            flag = "  RÉGRESSION" if worse else ""
+            print(f"  {scenario:<8} {metric:<16} {old:>10} -> {new:>10}  ({change:+.1f} %){flag}")
+            if worse:
+                regressions.append((scenario, metric, change))
+    return regressions
+
+
+def report(name, metrics):
+    print(f"{name:<8} {metrics['throughput_rps']:8.1f} req/s  "
+          f"p50={metrics['latency_p50_ms']:8.1f} ms  p95={metrics['latency_p95_ms']:8.1f} ms  "
+          f"p99={metrics['latency_p99_ms']:8.1f} ms  erreurs={metrics['error_rate']:.1%}  "
+          f"dégradées={metrics['fallback_rate']:.1%}  "
+          f"RSS max={metrics['peak_rss_mb']} Mo")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge hors-ligne de l'API RespirIA")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=300, help="Requêtes par scénario")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=20, help="Relevés par requête du scénario batch")
+    parser.add_argument("--distinct", type=int, default=0, help="Nombre de relevés différents (0 = tous différents)")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--tts-latency", type=float, default=0.3)
+    parser.add_argument("--tts-failure-rate", type=float, default=0.0)
+    parser.add_argument("--env", action="append", default=[], metavar="CLÉ=VALEUR",
+                        help="Variable de configuration passée à l'API (répétable)")
+    parser.add_argument("-o", "--output", help="Fichier JSON des résultats")
+    parser.add_argument("--compare", help="Résultats de référence (JSON) à comparer")
+    parser.add_argument("--tolerance", type=float, default=10, help="Écart toléré avant régression (%%)")
+    args = parser.parse_args()
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args)
+        },
+        "scenarios": {}
+    }
+
+    print(f"{args.requests} requêtes par scénario, concurrence {args.concurrency}, "
+          f"LLM {args.llm_latency * 1000:.0f} ms ({args.llm_failure_rate:.0%} d'échecs), "
+          f"TTS {args.tts_latency * 1000:.0f} ms\n")
+    with Stack(args) as stack:
+        for scenario in args.scenarios:
+            metrics = asyncio.run(run_scenario(stack, scenario, args))
+            results["scenarios"][scenario] = metrics
+            report(scenario, metrics)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\nRésultats écrits dans {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Faux serveur OpenRouter pour les benchmarks hors-ligne
+
+Expose /chat/completions (format compatible OpenAI) et répond avec une
+analyse JSON valide après une latence configurable, en une fois ou en
+streaming SSE ("stream": true). Une proportion configurable de requêtes
+échoue (503) pour éprouver les nouvelles tentatives et le disjoncteur.
+
+Usage :
+    python benchmarks/mock_openrouter.py --port 8099 --latency 0.2 --failure-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+MOCK_ANALYSIS = {
+    "niveau_risque": "MODÉRÉ",
+    "score_risque": 55,
+    "maladies_concernees": ["asthme"],
+    "facteurs_risque": [
+        {"facteur": "CO2 élevé", "valeur": "1100 ppm", "impact": "modéré"}
+    ],
+    "recommandations": ["Aérez votre intérieur"],
+    "message_vocal": "Risque respiratoire modéré détecté. Pensez à aérer votre logement.",
+    "previsions": "Conditions stables pour les prochaines heures."
+}
+
+
+def create_app(latency=0.2, failure_rate=0.0):
+    """
+    Crée l'application du faux serveur avec la latence donnée (en secondes)
+    et la proportion de requêtes en échec (0 à 1)
+    """
+    app = FastAPI(title="Mock OpenRouter")
+    app.state.latency = latency
+    app.state.failure_rate = failure_rate
+    app.state.served = 0
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        if random.random() < app.state.failure_rate:
+            await asyncio.sleep(app.state.latency / 10)
+            return JSONResponse(status_code=503, content={"error": {"message": "mock: service indisponible"}})
+        if payload.get("stream"):
+            return StreamingResponse(stream_chunks(payload), media_type="text/event-stream")
+        await asyncio.sleep(app.state.latency)
+        # Message vocal propre à chaque réponse, comme pour des relevés différents
+        app.state.served += 1
+        analysis = dict(MOCK_ANALYSIS, message_vocal=f"{MOCK_ANALYSIS['message_vocal']} Relevé {app.state.served}.")
+        return {
+            "id": "mock",
+            "model": payload.get("model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": json.dumps(analysis, ensure_ascii=False)},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        }
+
+    async def stream_chunks(payload):
+        # Le texte est découpé en morceaux répartis sur la latence simulée
+        content = json.dumps(MOCK_ANALYSIS, ensure_ascii=False, indent=2)
+        pieces = [content[i:i + 16] for i in range(0, len(content), 16)]
+        for piece in pieces:
+            await asyncio.sleep(app.state.latency / len(pieces))
+            chunk = {"model": payload.get("model"), "choices": [{"index": 0, "delta": {"content": piece}}]}
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return app
+
+
+def start_in_thread(port=8099, latency=0.2, failure_rate=0.0):
+    """
+    Démarre le faux serveur dans un thread et attend qu'il soit prêt
+
+    Returns:
+        uvicorn.Server: Serveur en cours (mettre should_exit à True pour l'arrêter)
+    """
+    config = uvicorn.Config(create_app(latency, failure_rate), host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Faux serveur OpenRouter")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.2, help="Latence simulée en secondes")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Proportion de réponses 503")
+    args = parser.parse_args()
+    uvicorn.run(
+        create_app(args.latency, args.failure_rate),
+        host="127.0.0.1", port=args.port, log_level="warning"
+    )
@@ -0,0 +1,43 @@
+"""
+Fausse synthèse vocale pour les benchmarks hors-ligne
+
+Remplace gTTS dans audio.py : chaque synthèse attend une latence
+configurable puis écrit quelques octets par caractère, sans appel réseau.
+Une proportion configurable de synthèses échoue.
+"""
+import random
+import time
+
+import audio
+
+
+class MockTTS:
+    """
+    Interface minimale de gTTS utilisée par audio.AudioCache
+    """
+
+    latency = 0.3
+    failure_rate = 0.0
+
+    def __init__(self, text, lang="fr", slow=False):
+        self.text = text
+
+    def write_to_fp(self, fp):
+        time.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            raise RuntimeError("mock: échec de la synthèse vocale")
+        # Taille proche d'un MP3 gTTS (environ 1 Ko par tranche de 10 caractères)
+        fp.write(b"ID3" + b"\0" * (100 * len(self.text)))
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            self.write_to_fp(f)
+
+
+def install(latency=0.3, failure_rate=0.0):
+    """
+    Active la fausse synthèse dans le processus courant
+    """
+    MockTTS.latency = latency
+    MockTTS.failure_rate = failure_rate
+    audio.gTTS = MockTTS
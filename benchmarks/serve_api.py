@@ -0,0 +1,43 @@
+"""
+Lance l'API RespirIA pour les benchmarks, avec une synthèse vocale simulée
+
+OPENROUTER_BASE_URL doit pointer vers le faux serveur OpenRouter
+(benchmarks/mock_openrouter.py) ; benchmarks/load_test.py s'en charge.
+
+Usage :
+    OPENROUTER_BASE_URL=http://127.0.0.1:8099 OPENROUTER_API_KEY=mock \\
+        python benchmarks/serve_api.py --port 8100 --tts-latency 0.3
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import uvicorn
+
+from config import Config
+from benchmarks import mock_tts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API RespirIA avec synthèse vocale simulée")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--tts-latency", type=float, default=0.3, help="Durée simulée d'une synthèse (secondes)")
+    parser.add_argument("--tts-failure-rate", type=float, default=0.0)
+    parser.add_argument("--audio-dir", help="Dossier des MP3 (temporaire par défaut)")
+    args = parser.parse_args()
+
+    # Les MP3 factices ne doivent pas se mêler à output_audio/, ni les
+    # verdicts du faux serveur aux données d'entraînement du modèle local
+    Config.AUDIO_OUTPUT_DIR = args.audio_dir or tempfile.mkdtemp(prefix="respiria_bench_audio_")
+    Config.VERDICT_LOG_ENABLED = False
+    mock_tts.install(args.tts_latency, args.tts_failure_rate)
+
+    import api
+    uvicorn.run(api.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
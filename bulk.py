@@ -0,0 +1,186 @@
+"""
+Score en masse de relevés capteurs (CSV, JSON-lines ou colonnaire .npcols)
+
+Les relevés sont lus par blocs et chaque bloc est scoré en une seule passe
+vectorisée (NumPy) d'après Config.THRESHOLDS et les profils de maladies
+issus de data/training_data.csv. Aucun appel au LLM.
+
+Usage :
+    python bulk.py releves.csv -o resultats.csv
+    python bulk.py releves.jsonl --format ndjson > resultats.jsonl
+    python bulk.py archives/releves.npcols -o resultats.csv
+"""
+import argparse
+import io
+import sys
+import numpy as np
+from columnar import is_columnar
+from config import Config
+from scoring import pollen_lookup, score_arrays
+
+SENSOR_FIELDS = ("temperature", "humidity", "co2", "pm25", "no2", "pressure")
+OUTPUT_COLUMNS = (
+    "score_risque", "niveau_risque", "air_quality_score",
+    "air_quality_level", "facteur_principal", "maladie_proche"
+)
+
+
+class TrainingProfile:
+    """
+    Profil moyen de chaque maladie du jeu d'entraînement
+    Chaque relevé est rapproché de la maladie dont le profil est le plus
+    proche (distance euclidienne sur les variables centrées-réduites)
+    """
+
+    def __init__(self, diseases, means, stds, features):
+        self.diseases = np.asarray(diseases, dtype=object)
+        self.means = np.asarray(means, dtype=np.float64)  # (maladies, variables)
+        self.stds = np.asarray(stds, dtype=np.float64)  # (variables,)
+        self.features = list(features)
+
+    @classmethod
+    def from_dataframe(cls, df, features=None):
+        """
+        Construit le profil à partir du DataFrame d'entraînement
+        """
+        features = [f for f in (features or Config.PROFILE_FEATURES) if f in df.columns]
+        grouped = df.groupby("maladie")[features].mean()
+        stds = df[features].std().replace(0, 1).fillna(1)
+        return cls(grouped.index.tolist(), grouped.to_numpy(), stds.to_numpy(), features)
+
+    @classmethod
+    def from_stats(cls, stats, features=None):
+        """
+        Construit le profil à partir des statistiques précalculées (training_stats.py)
+        """
+        diseases = list(stats["diseases"])
+        features = [
+            f for f in (features or Config.PROFILE_FEATURES)
+            if f in stats["global_std"] and all(f in stats["diseases"][d]["features"] for d in diseases)
+        ]
+        means = [[stats["diseases"][d]["features"][f]["mean"] for f in features] for d in diseases]
+        stds = [stats["global_std"][f] or 1 for f in features]
+        return cls(diseases, np.reshape(means, (len(diseases), len(features))), stds, features)
+
+    def nearest(self, columns):
+        """
+        Maladie la plus proche pour chaque relevé (None si aucune variable connue)
+        """
+        size = len(next(iter(columns.values())))
+        if not self.features or len(self.diseases) == 0:
+            return np.full(size, None, dtype=object)
+
+        values = np.column_stack([
+            np.asarray(columns[f], dtype=np.float64) if f in columns else np.full(size, np.nan)
+            for f in self.features
+        ])
+        z = (values[:, None, :] - self.means[None, :, :]) / self.stds
+        # Les variables absentes ne comptent pas dans la distance
+        distances = np.nansum(z * z, axis=2)
+        nearest = self.diseases[distances.argmin(axis=1)]
+        return np.where(np.isnan(values).all(axis=1), None, nearest)
+
+
+def score_dataframe(df, profile=None):
+    """
+    Score vectorisé d'un DataFrame de relevés
+
+    Returns:
+        DataFrame: Colonnes d'entrée + colonnes de OUTPUT_COLUMNS
+    """
+    import pandas as pd
+    columns = {
+        field: pd.to_numeric(df[field], errors="coerce").to_numpy(dtype=np.float64)
+        for field in SENSOR_FIELDS if field in df.columns
+    }
+    if "pollen" in df.columns:
+        # Correspondance calculée une fois par catégorie plutôt que par ligne
+        pollen = df["pollen"].astype("category")
+        lookup = np.append(pollen_lookup(pollen.cat.categories), np.nan)
+        columns["pollen"] = lookup[pollen.cat.codes.to_numpy()]
+    if not columns:
+        columns["_"] = np.full(len(df), np.nan)
+
+    scored = score_arrays(columns)
+    result = df.copy()
+    for name, values in scored.items():
+        result[name] = values
+    result["maladie_proche"] = profile.nearest(columns) if profile is not None else None
+    return result
+
+
+def read_chunks(source, input_format="csv", chunk_size=None):
+    """
+    Lit un fichier (chemin ou objet fichier) de relevés par blocs de DataFrame
+    """
+    # pandas n'est importé que pour le score en masse (démarrage de l'API plus rapide)
+    import pandas as pd
+    chunk_size = chunk_size or Config.BULK_CHUNK_ROWS
+    if input_format == "columnar":
+        from columnar import ColumnarDataset
+        return ColumnarDataset(source).iter_chunks(chunk_rows=chunk_size)
+    if input_format == "ndjson":
+        return pd.read_json(source, lines=True, chunksize=chunk_size)
+    return pd.read_csv(source, chunksize=chunk_size)
+
+
+def iter_scored(source, input_format="csv", output_format="ndjson", profile=None, chunk_size=None):
+    """
+    Générateur de résultats sérialisés, bloc par bloc
+    Permet de diffuser la réponse sans charger tout le fichier en mémoire
+
+    Yields:
+        str: Lignes JSON (ndjson) ou morceau de CSV (en-tête au premier bloc)
+    """
+    first = True
+    for chunk in read_chunks(source, input_format, chunk_size):
+        scored = score_dataframe(chunk, profile)
+        if output_format == "csv":
+            buffer = io.StringIO()
+            scored.to_csv(buffer, index=False, header=first)
+            yield buffer.getvalue()
+        else:
+            lines = scored.to_json(orient="records", lines=True, force_ascii=False)
+            yield lines if not lines or lines.endswith("\n") else lines + "\n"
+        first = False
+
+
+def load_profile():
+    """
+    Profil des maladies issu des statistiques de Config.TRAINING_DATA_PATH
+    """
+    from training_stats import load_or_build_stats
+    stats, _ = load_or_build_stats(Config.TRAINING_DATA_PATH)
+    return TrainingProfile.from_stats(stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score en masse de relevés capteurs")
+    parser.add_argument("input", help="Fichier CSV, JSON-lines ou dossier .npcols (- pour l'entrée standard)")
+    parser.add_argument("-o", "--output", help="Fichier de sortie (sortie standard par défaut)")
+    parser.add_argument("--input-format", choices=("csv", "ndjson", "columnar"), help="Déduit de l'extension par défaut")
+    parser.add_argument("--format", choices=("csv", "ndjson"), default="csv", help="Format de sortie")
+    parser.add_argument("--chunk-size", type=int, default=Config.BULK_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    input_format = args.input_format
+    if input_format is None:
+        if is_columnar(args.input):
+            input_format = "columnar"
+        elif args.input.endswith((".jsonl", ".ndjson", ".json")):
+            input_format = "ndjson"
+        else:
+            input_format = "csv"
+    source = sys.stdin if args.input == "-" else args.input
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+
+    try:
+        for part in iter_scored(source, input_format, args.format, load_profile(), args.chunk_size):
+            output.write(part)
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
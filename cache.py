@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+
+
+def payload_key(sensor_data, buckets=None):
+    """
+    Empreinte normalisée d'un jeu de données capteurs
+    Les champs de Config.THRESHOLDS sont arrondis à leur intervalle,
+    les identifiants de requête (user_id, timestamp) sont ignorés
+    """
+    buckets = buckets or Config.CACHE_BUCKETS
+    normalized = {}
+    for field, value in sensor_data.items():
+        if field in Config.CACHE_IGNORED_FIELDS or value is None:
+            continue
+        if field in Config.THRESHOLDS and isinstance(value, (int, float)):
+            bucket = buckets.get(field, 1)
+            value = round(round(value / bucket) * bucket, 6)
+        elif isinstance(value, str):
+            value = value.strip().lower()
+        normalized[field] = value
+
+    raw = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class MemoryCacheBackend:
+    """
+    Stockage en mémoire avec expiration (TTL) et éviction LRU
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """
+    Stockage SQLite persistant : survit aux redémarrages de l'API
+    """
+
+    def __init__(self, path, max_entries):
+        self.max_entries = max_entries
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._connect()
+        # Une connexion SQLite ne doit pas être partagée entre processus :
+        # chaque worker créé par fork (gunicorn --preload) rouvre la sienne
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._connect)
+
+    def _connect(self):
+        self._lock = threading.Lock()
+        # timeout : attente du verrou d'écriture tenu par un autre worker
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS analysis_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_analysis_cache_access ON analysis_cache(last_access)"
+        )
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM analysis_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE analysis_cache SET last_access = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analysis_cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now)
+            )
+            # Éviction LRU au-delà de la taille maximale
+            self._conn.execute(
+                "DELETE FROM analysis_cache WHERE key IN ("
+                "SELECT key FROM analysis_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0]
+
+
+class AnalysisCache:
+    """
+    Cache des analyses, indexé sur les mesures capteurs quantifiées
+    Deux lectures dont les valeurs tombent dans les mêmes intervalles
+    (bruit de mesure) partagent la même entrée et évitent un appel à Gemini
+    """
+
+    # Réponses qui ne doivent jamais être servies depuis le cache
+    UNCACHEABLE_LEVELS = ("ERREUR", "INDÉTERMINÉ")
+    # Champs propres à l'appareil qui a déclenché l'analyse, jamais mis en cache
+    DEVICE_FIELDS = ("tendances", "previsions")
+
+    def __init__(self, backend=None, ttl=None, max_entries=None, buckets=None):
+        self.ttl = ttl or Config.CACHE_TTL
+        self.buckets = buckets or Config.CACHE_BUCKETS
+        max_entries = max_entries or Config.CACHE_MAX_ENTRIES
+        backend = backend or Config.CACHE_BACKEND
+
+        if backend == "sqlite":
+            self.backend = SQLiteCacheBackend(Config.CACHE_SQLITE_PATH, max_entries)
+        else:
+            self.backend = MemoryCacheBackend(max_entries)
+        self.backend_name = backend
+
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, sensor_data):
+        """
+        Calcule la clé de cache d'un jeu de données capteurs (voir payload_key)
+        """
+        return payload_key(sensor_data, self.buckets)
+
+    def get(self, key):
+        """
+        Retourne une copie de l'analyse en cache, ou None
+        """
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    def set(self, key, result):
+        """
+        Met en cache une analyse (sauf les réponses de secours), sans ses
+        champs propres à l'appareil (DEVICE_FIELDS)
+        """
+        if result.get("niveau_risque") in self.UNCACHEABLE_LEVELS:
+            return
+        shared = {field: value for field, value in result.items() if field not in self.DEVICE_FIELDS}
+        self.backend.set(key, json.dumps(shared, ensure_ascii=False), self.ttl)
+
+    def stats(self):
+        """
+        Compteurs exposés sur /health
+        """
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend_name,
+            "entries": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
@@ -0,0 +1,124 @@
+"""
+Détection de changement : le LLM n'est consulté que si les conditions évoluent
+
+Pour chaque appareil (user_id / location), le dernier relevé analysé par le
+LLM et son résultat sont conservés. Un nouveau relevé réutilise ce résultat
+tant qu'aucun champ n'a varié de plus de Config.CHANGE_DELTAS par rapport au
+relevé analysé, qu'aucune mesure n'a changé de plage de Config.THRESHOLDS et
+que l'analyse a moins de Config.CHANGE_MAX_AGE secondes. La comparaison se
+fait avec le relevé analysé (et non le précédent) : une dérive lente finit
+donc par déclencher une nouvelle analyse.
+"""
+import threading
+from collections import OrderedDict
+from config import Config
+from scoring import threshold_band
+from timeseries import device_key, reading_time
+
+
+class ChangeDetector:
+    """
+    Dernier état analysé de chaque appareil (LRU borné)
+    """
+
+    # Champs propres à la requête ou au relevé, ignorés dans la comparaison
+    IGNORED_FIELDS = Config.CACHE_IGNORED_FIELDS
+    # Champs recalculés à chaque relevé, jamais conservés avec le résultat
+    VOLATILE_FIELDS = ("tendances", "reutilise")
+
+    def __init__(self, deltas=None, max_age=None, max_devices=None):
+        self.deltas = deltas or Config.CHANGE_DELTAS
+        self.max_age = max_age or Config.CHANGE_MAX_AGE
+        self.max_devices = max_devices or Config.TIMESERIES_MAX_DEVICES
+        self._states = OrderedDict()  # appareil -> (relevé, plages, instant, résultat)
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.changed = 0
+
+    def __len__(self):
+        return len(self._states)
+
+    def reusable(self, sensor_data):
+        """
+        Résultat précédent de l'appareil si le relevé n'a pas significativement changé
+
+        Returns:
+            dict | None: Copie du résultat à réutiliser, None si une nouvelle analyse est nécessaire
+        """
+        key = device_key(sensor_data)
+        if key is None:
+            return None
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                return None
+            reading, bands, analyzed_at, result = state
+            if reading_time(sensor_data) - analyzed_at > self.max_age or self._has_changed(
+                reading, bands, sensor_data
+            ):
+                self.changed += 1
+                return None
+            self._states.move_to_end(key)
+            self.reused += 1
+        result = dict(result)
+        result["source"] = "reuse"
+        result["reutilise"] = True
+        return result
+
+    def remember(self, sensor_data, result):
+        """
+        Enregistre le relevé analysé et son résultat comme nouvel état de référence
+        """
+        key = device_key(sensor_data)
+        if key is None:
+            return
+        reading = self._comparable(sensor_data)
+        state = (
+            reading,
+            self._bands(reading),
+            reading_time(sensor_data),
+            {k: v for k, v in result.items() if k not in self.VOLATILE_FIELDS}
+        )
+        with self._lock:
+            self._states[key] = state
+            self._states.move_to_end(key)
+            while len(self._states) > self.max_devices:
+                self._states.popitem(last=False)
+
+    def stats(self):
+        total = self.reused + self.changed
+        return {
+            "devices": len(self),
+            "reused": self.reused,
+            "changed": self.changed,
+            "reuse_rate": round(self.reused / total, 3) if total else 0.0
+        }
+
+    def _comparable(self, sensor_data):
+        return {
+            field: value for field, value in sensor_data.items()
+            if field not in self.IGNORED_FIELDS and value is not None
+        }
+
+    @staticmethod
+    def _bands(reading):
+        return {
+            field: threshold_band(field, value)
+            for field, value in reading.items()
+            if field in Config.THRESHOLDS and isinstance(value, (int, float))
+        }
+
+    def _has_changed(self, reading, bands, sensor_data):
+        current = self._comparable(sensor_data)
+        if current.keys() != reading.keys():
+            return True  # champ apparu ou disparu
+        for field, value in current.items():
+            previous = reading[field]
+            if isinstance(value, (int, float)) and isinstance(previous, (int, float)):
+                if field in bands and threshold_band(field, value) != bands[field]:
+                    return True
+                if abs(value - previous) > self.deltas.get(field, 0):
+                    return True
+            elif value != previous:
+                return True
+        return False
@@ -0,0 +1,223 @@
+"""
+Format colonnaire des données d'entraînement et des relevés historiques
+
+Un jeu de données « .npcols » est un dossier contenant :
+- meta.json : nombre de lignes, colonnes et leur type, empreinte du CSV d'origine
+- <colonne>.npy : colonnes numériques en float64 (valeurs identiques à la
+  lecture du CSV) ; avec --compact, les mesures (champs de Config.THRESHOLDS)
+  sont en float32, au prix d'arrondis pouvant changer de plage une valeur
+  située exactement sur un seuil
+- <colonne>.codes.npy (int32, -1 = valeur manquante) et <colonne>.labels.npy :
+  colonnes texte encodées par dictionnaire (chaque libellé stocké une fois)
+
+Les .npy sont ouverts en mémoire projetée (np.load(mmap_mode="r")) : aucune
+analyse de texte au chargement, les pages ne sont lues qu'à l'accès et
+plusieurs workers partagent les mêmes pages du cache du système. Un chemin
+Config.TRAINING_DATA_PATH se terminant par .npcols est lu dans ce format.
+
+Usage :
+    python columnar.py data/training_data.csv                 # -> data/training_data.npcols
+    python columnar.py releves.csv archives/releves.npcols --compact
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from config import Config
+
+SUFFIX = ".npcols"
+FORMAT_VERSION = 1
+CATEGORY = "category"
+
+
+def is_columnar(path):
+    return isinstance(path, (str, os.PathLike)) and os.fspath(path).rstrip("/").endswith(SUFFIX)
+
+
+class ColumnarDataset:
+    """
+    Jeu de données .npcols ouvert en lecture (colonnes projetées en mémoire)
+    """
+
+    def __init__(self, path):
+        self.path = os.fspath(path)
+        with open(os.path.join(self.path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Version du format colonnaire non prise en charge : {meta.get('version')}")
+        self.rows = meta["rows"]
+        self.kinds = meta["columns"]  # colonne -> "float32", "float64" ou "category"
+        self.source_hash = meta["source_hash"]
+        self._labels = {}
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def columns(self):
+        return list(self.kinds)
+
+    def values(self, column):
+        """
+        Valeurs d'une colonne numérique, ou codes d'une colonne texte (sans copie)
+        """
+        suffix = ".codes.npy" if self.kinds[column] == CATEGORY else ".npy"
+        return np.load(os.path.join(self.path, column + suffix), mmap_mode="r")
+
+    def labels(self, column):
+        """
+        Libellés d'une colonne texte (index des codes)
+        """
+        import pandas as pd
+        if column not in self._labels:
+            labels = np.load(os.path.join(self.path, column + ".labels.npy"), mmap_mode="r")
+            self._labels[column] = pd.Index(labels, dtype=str)
+        return self._labels[column]
+
+    def row_bytes(self, columns=None):
+        return sum(
+            4 if kind == CATEGORY else np.dtype(kind).itemsize
+            for column, kind in self.kinds.items() if columns is None or column in columns
+        )
+
+    def iter_chunks(self, columns=None, chunk_rows=None):
+        """
+        DataFrames successifs de chunk_rows lignes ; les colonnes numériques
+        sont des vues des fichiers projetés, les colonnes texte des catégories
+        """
+        import pandas as pd
+        columns = [c for c in self.kinds if columns is None or c in columns]
+        chunk_rows = chunk_rows or Config.BULK_CHUNK_ROWS
+        arrays = {column: self.values(column) for column in columns}
+        for start in range(0, self.rows, chunk_rows):
+            stop = min(start + chunk_rows, self.rows)
+            data = {}
+            for column, values in arrays.items():
+                if self.kinds[column] == CATEGORY:
+                    data[column] = pd.Categorical.from_codes(values[start:stop], categories=self.labels(column))
+                else:
+                    data[column] = values[start:stop]
+            yield pd.DataFrame(data, copy=False)
+
+    def to_dataframe(self, columns=None):
+        import pandas as pd
+        chunks = list(self.iter_chunks(columns, chunk_rows=max(self.rows, 1)))
+        return chunks[0] if chunks else pd.DataFrame(columns=columns or self.columns)
+
+
+def convert_csv(csv_path, output_path=None, chunk_rows=None, compact=False):
+    """
+    Convertit un CSV en jeu de données .npcols, bloc par bloc (mémoire bornée)
+    Le type de chaque colonne est déterminé sur le premier bloc
+
+    Args:
+        compact: Mesures de Config.THRESHOLDS stockées en float32
+
+    Returns:
+        str: Chemin du dossier créé
+    """
+    import pandas as pd
+    from training_stats import file_hash
+    output_path = output_path or os.path.splitext(csv_path)[0] + SUFFIX
+    chunk_rows = chunk_rows or Config.BULK_CHUNK_ROWS
+    parent = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".npcols_", dir=parent)
+
+    try:
+        kinds, files, dictionaries, rows = {}, {}, {}, 0
+        for chunk in pd.read_csv(csv_path, chunksize=chunk_rows):
+            if not kinds:
+                for column in chunk.columns:
+                    kinds[column] = _column_kind(column, chunk[column], compact)
+                    suffix = ".codes.raw" if kinds[column] == CATEGORY else ".raw"
+                    files[column] = open(os.path.join(tmp_dir, column + suffix), "wb")
+                    dictionaries[column] = {}
+            for column, kind in kinds.items():
+                if kind == CATEGORY:
+                    values = _encode(chunk[column], dictionaries[column])
+                else:
+                    values = pd.to_numeric(chunk[column], errors="coerce").to_numpy(dtype=kind)
+                values.tofile(files[column])
+            rows += len(chunk)
+
+        for column, kind in kinds.items():
+            files[column].close()
+            if kind == CATEGORY:
+                _finalize(os.path.join(tmp_dir, column), ".codes.raw", ".codes.npy", np.int32, rows)
+                labels = list(dictionaries[column])
+                np.save(os.path.join(tmp_dir, column + ".labels.npy"), np.array(labels, dtype=str))
+            else:
+                _finalize(os.path.join(tmp_dir, column), ".raw", ".npy", kind, rows)
+
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "version": FORMAT_VERSION,
+                "rows": rows,
+                "columns": kinds,
+                "source_hash": file_hash(csv_path)
+            }, f, ensure_ascii=False, indent=1)
+
+        if os.path.isdir(output_path):
+            shutil.rmtree(output_path)
+        os.replace(tmp_dir, output_path)
+    except BaseException:
+        for f in locals().get("files", {}).values():
+            f.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return output_path
+
+
+def _column_kind(column, series, compact):
+    if series.dtype.kind not in "iufb":
+        return CATEGORY
+    return "float32" if compact and column in Config.THRESHOLDS else "float64"
+
+
+def _encode(series, dictionary):
+    """
+    Codes globaux (int32) d'une colonne texte ; complète le dictionnaire libellé -> code
+    """
+    categorical = series.astype(str).where(series.notna()).astype("category")
+    lookup = np.array(
+        [dictionary.setdefault(label, len(dictionary)) for label in categorical.cat.categories] + [-1],
+        dtype=np.int32
+    )
+    # Code -1 (valeur manquante) : dernier élément de lookup
+    return lookup[categorical.cat.codes.to_numpy()]
+
+
+def _finalize(base, raw_suffix, npy_suffix, dtype, rows):
+    """
+    Ajoute l'en-tête .npy devant les valeurs brutes écrites bloc par bloc
+    """
+    with open(base + npy_suffix, "wb") as out:
+        np.lib.format.write_array_header_1_0(out, {
+            "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+            "fortran_order": False,
+            "shape": (rows,)
+        })
+        with open(base + raw_suffix, "rb") as raw:
+            shutil.copyfileobj(raw, out, 1 << 20)
+    os.remove(base + raw_suffix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conversion d'un CSV au format colonnaire .npcols")
+    parser.add_argument("input", help="Fichier CSV (données d'entraînement ou relevés)")
+    parser.add_argument("output", nargs="?", help=f"Dossier {SUFFIX} (même nom que le CSV par défaut)")
+    parser.add_argument("--chunk-rows", type=int, default=Config.BULK_CHUNK_ROWS)
+    parser.add_argument("--compact", action="store_true", help="Mesures en float32 (fichiers deux fois plus petits)")
+    args = parser.parse_args()
+
+    path = convert_csv(args.input, args.output, args.chunk_rows, args.compact)
+    dataset = ColumnarDataset(path)
+    size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    print(f"✓ {len(dataset)} lignes, {len(dataset.columns)} colonnes -> {path} ({size / 1e6:.1f} Mo)")
+
+
+if __name__ == "__main__":
+    main()
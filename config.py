@@ -11,17 +11,192 @@ class Config:
     # Modèle Gemini via OpenRouter
     GEMINI_MODEL = os.getenv("GEMINI_MODEL", "google/gemini-2.5-pro")  
     
+    # Routage : modèle rapide pour les relevés à faible risque, GEMINI_MODEL sinon
+    ROUTING_ENABLED = os.getenv("ROUTING_ENABLED", "true").lower() == "true"
+    FAST_MODEL = os.getenv("FAST_MODEL", "google/gemini-2.5-flash")
+    # Score local à partir duquel le modèle principal est utilisé
+    ROUTING_FAST_MAX_SCORE = int(os.getenv("ROUTING_FAST_MAX_SCORE", "50"))
+    # Nombre de latences conservées par modèle (calcul des percentiles)
+    ROUTING_LATENCY_WINDOW = 500
+    
+    # Couverture : seconde requête vers un modèle de secours si la première tarde
+    HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() == "true"
+    # Modèle de secours (par défaut : l'autre modèle du routage)
+    HEDGE_MODEL = os.getenv("HEDGE_MODEL", "")
+    # Délai avant couverture tant que le p95 n'est pas mesuré (secondes)
+    HEDGE_DELAY = float(os.getenv("HEDGE_DELAY", "8"))
+    HEDGE_MIN_SAMPLES = 20
+    
+    # Tarifs (USD par million de jetons), utilisés si OpenRouter ne renvoie pas le coût
+    MODEL_PRICING = {
+        "google/gemini-2.5-pro": {"input": 1.25, "output": 10.0},
+        "google/gemini-2.5-flash": {"input": 0.30, "output": 2.50}
+    }
+    
     # Chemins des fichiers
-    TRAINING_DATA_PATH = "data/training_data.csv"
+    # CSV ou jeu colonnaire .npcols converti par columnar.py
+    TRAINING_DATA_PATH = os.getenv("TRAINING_DATA_PATH", "data/training_data.csv")
     SAMPLE_INPUT_PATH = "data/sample_input.json"
+    # Artefacts précalculés (statistiques d'entraînement, indexés par empreinte du CSV)
+    TRAINING_STATS_DIR = os.getenv("TRAINING_STATS_DIR", "data/.artifacts")
+    # Lecture du CSV d'entraînement par blocs : budget mémoire d'un bloc (Mo) et
+    # taille de l'échantillon par maladie et variable servant aux quantiles
+    TRAINING_MEMORY_MB = int(os.getenv("TRAINING_MEMORY_MB", "256"))
+    TRAINING_QUANTILE_SAMPLE = int(os.getenv("TRAINING_QUANTILE_SAMPLE", "20000"))
     
     # Paramètres du modèle
     TEMPERATURE = 0.7
     MAX_OUTPUT_TOKENS = 2048
     
+    # Déploiement multi-processus (serve.py) ; au-delà d'un worker, le cache
+    # des analyses passe par défaut en SQLite pour être partagé
+    WORKERS = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+    
+    # Paramètres du client HTTP (pool de connexions vers OpenRouter)
+    HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+    HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+    
+    # Nouvelles tentatives sur erreurs transitoires (attente exponentielle, Retry-After respecté)
+    RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "2"))
+    RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+    RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "8"))
+    RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+    
+    # Disjoncteur : coupe les appels si le taux d'erreur dépasse BREAKER_ERROR_RATE
+    # sur les BREAKER_WINDOW dernières secondes (au moins BREAKER_MIN_CALLS appels)
+    BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+    BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+    BREAKER_WINDOW = float(os.getenv("BREAKER_WINDOW", "30"))
+    BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))
+    
+    # Limite de débit côté client (quota OpenRouter) ; 0 = pas de limite
+    RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "0"))
+    RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "0"))  # 0 = égal au débit
+    # Attente maximale d'un jeton avant de basculer sur le score local (secondes)
+    RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "2"))
+    
+    # Sortie structurée : le fournisseur doit respecter le schéma JSON de l'analyse
+    STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "true").lower() == "true"
+    # Longueur maximale de la réponse renvoyée dans le prompt de réparation
+    REPAIR_MAX_INPUT_CHARS = 6000
+    
+    # Mise en cache côté fournisseur de la partie fixe du prompt (cache_control)
+    PROMPT_CACHING = os.getenv("PROMPT_CACHING", "true").lower() == "true"
+    
+    # Streaming (/analyze-stream) : relayer aussi chaque morceau de texte généré
+    STREAM_FORWARD_TOKENS = os.getenv("STREAM_FORWARD_TOKENS", "true").lower() == "true"
+    
+    # Paramètres de l'analyse en batch
+    BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+    BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "64"))
+    BATCH_TIMEOUT = float(os.getenv("BATCH_TIMEOUT", "120"))
+    
+    # Ingestion WebSocket (/ws/ingest) : lots par connexion et contre-pression
+    WS_BATCH_SIZE = int(os.getenv("WS_BATCH_SIZE", "32"))
+    WS_BATCH_WAIT = float(os.getenv("WS_BATCH_WAIT", "0.05"))  # secondes d'attente pour compléter un lot
+    WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "256"))  # relevés en attente par connexion
+    WS_MAX_INFLIGHT_BATCHES = int(os.getenv("WS_MAX_INFLIGHT_BATCHES", "4"))
+    ALERT_LEVELS = ("ÉLEVÉ", "CRITIQUE")  # niveaux poussés en alerte à la passerelle
+    
+    # Journalisation : "json" (une ligne structurée par événement) ou "text"
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    
     # Paramètres audio
     AUDIO_LANGUAGE = "fr"  
     AUDIO_OUTPUT_DIR = "output_audio/"
+    # Cache des messages vocaux (fichiers tts_<empreinte>.mp3)
+    AUDIO_CACHE_MAX_BYTES = int(os.getenv("AUDIO_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+    AUDIO_CACHE_MAX_AGE = int(os.getenv("AUDIO_CACHE_MAX_AGE", str(7 * 24 * 3600)))  # secondes
+    # Génération audio en arrière-plan
+    AUDIO_WORKERS = int(os.getenv("AUDIO_WORKERS", "4"))
+    AUDIO_JOB_TTL = int(os.getenv("AUDIO_JOB_TTL", "3600"))  # secondes
+    AUDIO_WAIT_TIMEOUT = float(os.getenv("AUDIO_WAIT_TIMEOUT", "10"))  # attente max sur /audio/{filename}
+    
+    # Mode d'analyse :
+    # "llm"    : toujours interroger le LLM (le score local complète la qualité de l'air)
+    # "hybrid" : réponse locale, LLM seulement si le score est ambigu ou >= LOCAL_LLM_THRESHOLD
+    # "local"  : score local uniquement, aucun appel externe
+    ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "llm")
+    LOCAL_LLM_THRESHOLD = int(os.getenv("LOCAL_LLM_THRESHOLD", "50"))
+    LOCAL_AMBIGUITY_MARGIN = float(os.getenv("LOCAL_AMBIGUITY_MARGIN", "5"))
+    # Moteur des réponses locales : "rules" (seuils, scoring.py) ou "model" (risk_model.py)
+    LOCAL_BACKEND = os.getenv("LOCAL_BACKEND", "rules")
+    
+    # Modèle local (régression logistique) distillé des verdicts du LLM
+    RISK_MODEL_ENABLED = os.getenv("RISK_MODEL_ENABLED", "true").lower() == "true"
+    # Confiance en deçà de laquelle la réponse du modèle est ambiguë (le mode "hybrid" consulte le LLM)
+    RISK_MODEL_MIN_CONFIDENCE = float(os.getenv("RISK_MODEL_MIN_CONFIDENCE", "0.6"))
+    # Relevés synthétiques étiquetés par les seuils (a priori) et poids d'un verdict du LLM
+    RISK_MODEL_PRIOR_ROWS = int(os.getenv("RISK_MODEL_PRIOR_ROWS", "20000"))
+    RISK_MODEL_VERDICT_WEIGHT = float(os.getenv("RISK_MODEL_VERDICT_WEIGHT", "20"))
+    RISK_MODEL_MAX_VERDICTS = int(os.getenv("RISK_MODEL_MAX_VERDICTS", "100000"))
+    # Journal des verdicts du LLM (mesures et niveau de risque, sans identifiant), sur activation
+    VERDICT_LOG_ENABLED = os.getenv("VERDICT_LOG_ENABLED", "false").lower() == "true"
+    VERDICT_LOG_PATH = os.getenv("VERDICT_LOG_PATH", os.path.join(TRAINING_STATS_DIR, "llm_verdicts.jsonl"))
+    # Taille au-delà de laquelle le journal est renommé en <VERDICT_LOG_PATH>.1
+    VERDICT_LOG_MAX_MB = float(os.getenv("VERDICT_LOG_MAX_MB", "20"))
+    # Points d'accès dont les verdicts servent à l'entraînement (séparés par des virgules)
+    VERDICT_TRUSTED_ENDPOINTS = [
+        url.strip().rstrip("/")
+        for url in os.getenv("VERDICT_TRUSTED_ENDPOINTS", "https://openrouter.ai/api/v1").split(",")
+        if url.strip()
+    ]
+    
+    # Score en masse (bulk.py et /bulk-score)
+    BULK_CHUNK_ROWS = int(os.getenv("BULK_CHUNK_ROWS", "50000"))
+    # Variables du CSV d'entraînement comparées aux relevés pour trouver la maladie la plus proche
+    # (la colonne temperature du CSV est une température corporelle, pas ambiante)
+    PROFILE_FEATURES = ["humidity", "co2", "pm25"]
+    
+    # Recherche des cas d'entraînement similaires injectés dans le prompt (0 pour désactiver)
+    RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "5"))
+    RETRIEVAL_FEATURES = ["humidity", "co2", "pm25", "pollen"]
+    # Cas conservés dans l'index (échantillon du CSV au-delà)
+    RETRIEVAL_MAX_CASES = int(os.getenv("RETRIEVAL_MAX_CASES", "200000"))
+    
+    # Regroupement des analyses identiques simultanées (un seul appel au LLM en vol par clé)
+    COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "true").lower() == "true"
+    
+    # Historique par appareil (user_id / location) : tendances et prévision locales
+    TIMESERIES_ENABLED = os.getenv("TIMESERIES_ENABLED", "true").lower() == "true"
+    TIMESERIES_WINDOW = int(os.getenv("TIMESERIES_WINDOW", "60"))  # relevés conservés par appareil
+    TIMESERIES_MAX_DEVICES = int(os.getenv("TIMESERIES_MAX_DEVICES", "100000"))
+    TIMESERIES_MIN_POINTS = 3  # relevés nécessaires pour estimer une pente
+    FORECAST_HORIZON = int(os.getenv("FORECAST_HORIZON", "1800"))  # secondes
+    # Variation relative sur l'horizon à partir de laquelle une tendance est signalée
+    FORECAST_MIN_CHANGE = 0.05
+    
+    # Détection de changement : le résultat précédent d'un appareil est réutilisé tant
+    # qu'aucun champ n'a varié de plus de CHANGE_DELTAS ni changé de plage de THRESHOLDS, sur activation
+    CHANGE_DETECTION = os.getenv("CHANGE_DETECTION", "false").lower() == "true"
+    CHANGE_MAX_AGE = int(os.getenv("CHANGE_MAX_AGE", "900"))  # secondes
+    CHANGE_DELTAS = {
+        "co2": 50,
+        "humidity": 5,
+        "temperature": 1,
+        "pm25": 5,
+        "no2": 10,
+        "pressure": 3
+    }
+    
+    # Cache des analyses (clé = mesures arrondies à l'intervalle de chaque champ)
+    CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")  # "memory" ou "sqlite"
+    CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", "cache/analysis_cache.db")
+    CACHE_TTL = int(os.getenv("CACHE_TTL", "900"))  # secondes
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+    CACHE_BUCKETS = {
+        "co2": 25,
+        "humidity": 2,
+        "temperature": 0.5,
+        "pm25": 2,
+        "no2": 5,
+        "pressure": 2
+    }
+    CACHE_IGNORED_FIELDS = ("user_id", "timestamp")
     
     # Seuils d'alerte
     THRESHOLDS = {
@@ -31,4 +206,23 @@ class Config:
         "pm25": {"normal": 12, "warning": 35, "danger": 55},
         "no2": {"normal": 40, "warning": 100, "danger": 200},
         "pressure": {"min_normal": 1000, "max_normal": 1030}
-    }
\ No newline at end of file
+    }
+    
+    # Score de risque associé au niveau de pollen déclaré
+    POLLEN_SCORES = {
+        "faible": 10,
+        "moyen": 40,
+        "modéré": 40,
+        "élevé": 60,
+        "très élevé": 80
+    }
+    
+    # Ordre de sévérité (pour les corrélations du contexte d'entraînement)
+    SEVERITY_ORDER = {
+        "faible": 0,
+        "modérée": 1,
+        "élevée": 2,
+        "critique": 3
+    }
+    # Corrélation minimale pour citer une variable dans le contexte
+    CONTEXT_MIN_CORRELATION = 0.1
@@ -0,0 +1,179 @@
+"""
+Ingestion continue des relevés par WebSocket (une connexion par passerelle)
+
+Protocole (messages texte JSON) :
+- la passerelle envoie un relevé (objet SensorData) ou une liste de relevés ;
+  un champ "id" facultatif est renvoyé tel quel avec le résultat (à défaut,
+  numéro d'ordre du relevé sur la connexion)
+- le serveur répond de façon asynchrone :
+    {"type": "results", "results": [{"id": ..., "result": {...}}, ...]}
+    {"type": "alert", "id": ..., "appareil": ..., "niveau_risque": ..., "message_vocal": ...}
+    {"type": "error", "id": ..., "detail": ...}
+
+Les relevés reçus sont regroupés par lots (Config.WS_BATCH_SIZE relevés ou
+Config.WS_BATCH_WAIT secondes) analysés en parallèle. Contre-pression : la
+file d'entrée, le nombre de lots en cours et la file d'envoi sont bornés ;
+un client qui ne lit plus ses résultats bloque l'envoi, puis l'analyse, puis
+la lecture de la connexion, et la passerelle est freinée par TCP au lieu de
+remplir la mémoire du serveur.
+"""
+import asyncio
+import json
+import logging
+from fastapi import WebSocketDisconnect
+from config import Config
+from observability import REGISTRY, STREAM_READINGS, CallbackMetric
+from timeseries import device_key
+
+logger = logging.getLogger(__name__)
+
+
+class StreamSession:
+    """
+    Connexion WebSocket d'une passerelle : réception, regroupement en lots,
+    analyse et envoi des résultats et alertes
+    """
+
+    active = 0  # connexions ouvertes (toutes sessions)
+
+    def __init__(self, websocket, analyze_batch, validate, batch_size=None, batch_wait=None,
+                 queue_size=None, max_batches=None):
+        """
+        Args:
+            websocket: Connexion acceptée (interface Starlette)
+            analyze_batch: Coroutine analysant une liste de relevés (RespirIAModel.analyze_batch_async)
+            validate: Fonction relevé brut -> dict validé (lève ValueError / TypeError si invalide)
+        """
+        self.websocket = websocket
+        self.analyze_batch = analyze_batch
+        self.validate = validate
+        self.batch_size = batch_size or Config.WS_BATCH_SIZE
+        self.batch_wait = batch_wait if batch_wait is not None else Config.WS_BATCH_WAIT
+        queue_size = queue_size or Config.WS_QUEUE_SIZE
+        self._inbound = asyncio.Queue(maxsize=queue_size)
+        self._outbound = asyncio.Queue(maxsize=queue_size)
+        self._batch_slots = asyncio.Semaphore(max_batches or Config.WS_MAX_INFLIGHT_BATCHES)
+        self._batches = set()
+        self._sequence = 0
+        self._alerted = {}  # appareil -> dernier niveau ayant déclenché une alerte
+
+    async def run(self):
+        """
+        Traite la connexion jusqu'à sa fermeture par le client
+        """
+        StreamSession.active += 1
+        tasks = [
+            asyncio.create_task(self._receive()),
+            asyncio.create_task(self._dispatch()),
+            asyncio.create_task(self._send_loop())
+        ]
+        try:
+            # La réception s'arrête à la déconnexion, l'envoi sur une erreur de la connexion
+            await asyncio.wait([tasks[0], tasks[2]], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            StreamSession.active -= 1
+            # Client parti : les analyses en cours n'ont plus de destinataire
+            pending = tasks + list(self._batches)
+            for task in pending:
+                task.cancel()
+            await asyncio.wait(pending)
+
+    async def _receive(self):
+        while True:
+            try:
+                text = await self.websocket.receive_text()
+            except WebSocketDisconnect:
+                return
+            try:
+                frame = json.loads(text)
+            except ValueError as e:
+                STREAM_READINGS.inc(status="invalid")
+                await self._outbound.put({"type": "error", "id": None, "detail": f"JSON invalide : {e}"})
+                continue
+
+            for item in frame if isinstance(frame, list) else [frame]:
+                self._sequence += 1
+                reading_id = item.pop("id", self._sequence) if isinstance(item, dict) else self._sequence
+                try:
+                    sensor_data = self.validate(item)
+                except (ValueError, TypeError) as e:
+                    STREAM_READINGS.inc(status="invalid")
+                    await self._outbound.put({"type": "error", "id": reading_id, "detail": str(e)})
+                    continue
+                STREAM_READINGS.inc(status="accepted")
+                # Bloque lorsque la file est pleine : la connexion n'est plus lue
+                await self._inbound.put((reading_id, sensor_data))
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._batch_slots.acquire()
+            batch = [await self._inbound.get()]
+            deadline = loop.time() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._inbound.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            task = asyncio.create_task(self._process(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _process(self, batch):
+        try:
+            results = await self.analyze_batch([sensor_data for _, sensor_data in batch])
+            await self._outbound.put({
+                "type": "results",
+                "results": [{"id": reading_id, "result": result} for (reading_id, _), result in zip(batch, results)]
+            })
+            for (reading_id, sensor_data), result in zip(batch, results):
+                alert = self._alert_for(reading_id, sensor_data, result)
+                if alert is not None:
+                    await self._outbound.put(alert)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Erreur lors de l'analyse d'un lot WebSocket : %s", e)
+            for reading_id, _ in batch:
+                await self._outbound.put({"type": "error", "id": reading_id, "detail": str(e)})
+        finally:
+            self._batch_slots.release()
+
+    def _alert_for(self, reading_id, sensor_data, result):
+        """
+        Alerte lorsqu'un appareil passe à un niveau de Config.ALERT_LEVELS
+        (une seule alerte tant que le niveau ne change pas)
+        """
+        device = device_key(sensor_data) or reading_id
+        level = result.get("niveau_risque")
+        previous = self._alerted.get(device)
+        if level not in Config.ALERT_LEVELS:
+            self._alerted.pop(device, None)
+            return None
+        if level == previous:
+            return None
+        self._alerted[device] = level
+        return {
+            "type": "alert",
+            "id": reading_id,
+            "appareil": device,
+            "niveau_risque": level,
+            "score_risque": result.get("score_risque"),
+            "message_vocal": result.get("message_vocal")
+        }
+
+    async def _send_loop(self):
+        while True:
+            message = await self._outbound.get()
+            try:
+                await self.websocket.send_text(json.dumps(message, ensure_ascii=False))
+            except Exception:
+                return  # connexion fermée
+
+
+REGISTRY.register(CallbackMetric(
+    "respiria_stream_connections", "Connexions WebSocket d'ingestion ouvertes", lambda: StreamSession.active
+))
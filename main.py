@@ -1,9 +1,226 @@
-import requests
-import pandas as pd
+import asyncio
+import httpx
 import json
 from config import Config
-from gtts import gTTS
+from cache import AnalysisCache, payload_key
+from scoring import RiskScorer
+from bulk import TrainingProfile
+from training_stats import context_from_stats, load_or_build_stats
+from retrieval import format_cases, load_or_build_index
+from risk_model import LearnedRiskScorer, VerdictLog, load_or_train_risk_model
+from streaming import EARLY_FIELDS, IncrementalFieldExtractor, parse_sse_line
+from audio import AudioCache
+from change_detection import ChangeDetector
+from timeseries import DeviceSeriesStore, forecast_text
+from singleflight import AsyncSingleFlight, SingleFlight
+from routing import ModelRouter
+from resilience import UpstreamError, UpstreamGuard, UpstreamUnavailable, parse_retry_after
+from observability import (
+    ANALYSES, FALLBACKS, REGISTRY, UPSTREAM_REQUESTS, UPSTREAM_TOKENS,
+    CallbackMetric, configure_logging, span
+)
+import logging
 import os
+import time
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_ROLE = "Tu es RespirIA, un assistant médical spécialisé dans la prédiction des risques respiratoires."
+
+# Consignes fixes du prompt (identiques pour toutes les requêtes)
+PROMPT_INSTRUCTIONS = """
+MISSION :
+Analyse les données environnementales envoyées par l'utilisateur et prédit les risques pour les maladies respiratoires.
+
+ANALYSE REQUISE :
+1. Niveau de risque global (FAIBLE / MODÉRÉ / ÉLEVÉ / CRITIQUE)
+2. Maladies potentiellement concernées (asthme, bronchite, rhinite allergique, etc.)
+3. Facteurs environnementaux problématiques
+4. Recommandations personnalisées et concrètes
+5. Prévisions pour les prochaines heures
+
+FORMAT DE RÉPONSE (JSON) :
+{
+    "niveau_risque": "MODÉRÉ",
+    "score_risque": 65,
+    "maladies_concernees": ["asthme", "rhinite"],
+    "facteurs_risque": [
+        {"facteur": "CO2 élevé", "valeur": "1200 ppm", "impact": "élevé"},
+        {"facteur": "Humidité faible", "valeur": "30%", "impact": "modéré"}
+    ],
+    "recommandations": [
+        "Évitez les activités physiques intenses",
+        "Aérez votre intérieur tôt le matin",
+        "Gardez votre inhalateur à portée de main"
+    ],
+    "message_vocal": "Attention, risque respiratoire modéré détecté. Le taux de CO2 est élevé et l'air est sec. Je vous conseille d'éviter les activités physiques intenses et de bien aérer votre logement.",
+    "previsions": "Le risque devrait diminuer en soirée avec la baisse des températures."
+}
+
+Réponds UNIQUEMENT avec le JSON, sans texte supplémentaire.
+"""
+
+
+# Schéma JSON de l'analyse attendue (sortie structurée), aligné sur AnalysisResponse
+ANALYSIS_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "niveau_risque": {"type": "string", "enum": ["FAIBLE", "MODÉRÉ", "ÉLEVÉ", "CRITIQUE"]},
+        "score_risque": {"type": "integer"},
+        "maladies_concernees": {"type": "array", "items": {"type": "string"}},
+        "facteurs_risque": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "facteur": {"type": "string"},
+                    "valeur": {"type": "string"},
+                    "impact": {"type": "string"}
+                },
+                "required": ["facteur", "valeur", "impact"],
+                "additionalProperties": False
+            }
+        },
+        "recommandations": {"type": "array", "items": {"type": "string"}},
+        "message_vocal": {"type": "string"},
+        "previsions": {"type": "string"}
+    },
+    "required": [
+        "niveau_risque", "score_risque", "maladies_concernees", "facteurs_risque",
+        "recommandations", "message_vocal", "previsions"
+    ],
+    "additionalProperties": False
+}
+
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "analyse_respiria", "strict": True, "schema": ANALYSIS_JSON_SCHEMA}
+}
+
+REPAIR_INSTRUCTIONS = (
+    "Le texte envoyé devait être un unique objet JSON avec les champs niveau_risque, "
+    "score_risque, maladies_concernees, facteurs_risque, recommandations, message_vocal "
+    "et previsions. Corrige-le et réponds UNIQUEMENT avec le JSON valide."
+)
+
+
+def extract_json_object(text):
+    """
+    Décode le premier objet JSON équilibré d'un texte
+    Tolère les balises markdown et le texte avant / après l'objet
+    
+    Returns:
+        dict | list | None: Objet décodé, ou None si aucun JSON valide
+    """
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+
+    start = text.find("{")
+    while start != -1:
+        depth = 0
+        in_string = False
+        escaped = False
+        for index in range(start, len(text)):
+            char = text[index]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char == "{":
+                depth += 1
+            elif char == "}":
+                depth -= 1
+                if depth == 0:
+                    try:
+                        return json.loads(text[start:index + 1])
+                    except ValueError:
+                        break
+        start = text.find("{", start + 1)
+    return None
+
+
+class ParseStats:
+    """
+    Suivi des réponses du LLM dont le JSON n'a pas pu être extrait
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.failures = 0
+        self.repaired = 0
+        self.unrecovered = 0
+
+    def record(self, success):
+        self.total += 1
+        if not success:
+            self.failures += 1
+
+    def record_repair(self, success):
+        if success:
+            self.repaired += 1
+        else:
+            self.unrecovered += 1
+
+    def stats(self):
+        return {
+            "responses": self.total,
+            "parse_failures": self.failures,
+            "repaired": self.repaired,
+            "unrecovered": self.unrecovered,
+            "failure_rate": round(self.failures / self.total, 4) if self.total else 0.0
+        }
+
+
+def estimate_tokens(text):
+    """
+    Estimation grossière du nombre de jetons d'un texte (~4 caractères par jeton)
+    """
+    return (len(text) + 3) // 4
+
+
+class TokenUsage:
+    """
+    Cumul des jetons facturés, d'après le champ "usage" des réponses OpenRouter
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+        self.last = None
+
+    def record(self, usage):
+        if not usage:
+            return
+        details = usage.get("prompt_tokens_details") or {}
+        self.last = {
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "cached_tokens": details.get("cached_tokens", 0) or 0,
+            "completion_tokens": usage.get("completion_tokens", 0)
+        }
+        self.requests += 1
+        self.prompt_tokens += self.last["prompt_tokens"]
+        self.cached_tokens += self.last["cached_tokens"]
+        self.completion_tokens += self.last["completion_tokens"]
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "completion_tokens": self.completion_tokens,
+            "prompt_tokens_per_request": round(self.prompt_tokens / self.requests, 1) if self.requests else 0,
+            "last": self.last
+        }
+
 
 class RespirIAModel:
     """
@@ -17,47 +234,430 @@ class RespirIAModel:
         self.base_url = Config.OPENROUTER_BASE_URL
         self.model = Config.GEMINI_MODEL
         self.training_context = ""
+        self.training_profile = None
+        self.case_index = None
+        self.risk_model = None
+        self._async_client = None
+        self.token_usage = TokenUsage()
+        self.parse_stats = ParseStats()
+        self.inflight = SingleFlight()
+        self.inflight_async = AsyncSingleFlight()
+        self.router = ModelRouter(primary_model=self.model)
+        self.upstream = UpstreamGuard()
+        self.cache = AnalysisCache() if Config.CACHE_ENABLED else None
+        self.scorer = RiskScorer()
+        self.audio_cache = AudioCache()
+        self.series = DeviceSeriesStore() if Config.TIMESERIES_ENABLED else None
+        self.changes = ChangeDetector() if Config.CHANGE_DETECTION else None
+        self.verdicts = VerdictLog(endpoint=self.base_url) if Config.VERDICT_LOG_ENABLED else None
         
         if not self.api_key:
             raise ValueError("OPENROUTER_API_KEY non configurée dans .env")
         
+        self._compile_prompt()
+        self._register_metrics()
+        
+    def _register_metrics(self):
+        """
+        Expose sur /metrics les compteurs tenus par les composants du modèle
+        """
+        cache = self.cache
+        for metric in (
+            CallbackMetric("respiria_cache_hits_total", "Analyses servies depuis le cache",
+                           lambda: cache.hits if cache else 0, kind="counter"),
+            CallbackMetric("respiria_cache_misses_total", "Analyses absentes du cache",
+                           lambda: cache.misses if cache else 0, kind="counter"),
+            CallbackMetric("respiria_audio_cache_hits_total", "Messages vocaux déjà synthétisés",
+                           lambda: self.audio_cache.hits, kind="counter"),
+            CallbackMetric("respiria_audio_cache_misses_total", "Messages vocaux synthétisés",
+                           lambda: self.audio_cache.misses, kind="counter"),
+            CallbackMetric("respiria_coalesced_requests_total", "Analyses regroupées sur un appel en cours",
+                           lambda: self.inflight.coalesced + self.inflight_async.coalesced, kind="counter"),
+            CallbackMetric("respiria_upstream_retries_total", "Nouvelles tentatives vers OpenRouter",
+                           lambda: self.upstream.retries, kind="counter"),
+            CallbackMetric("respiria_upstream_rejected_total", "Appels écartés (disjoncteur ouvert ou quota)",
+                           lambda: self.upstream.rejected, kind="counter"),
+            CallbackMetric("respiria_circuit_breaker_open", "1 si le disjoncteur est ouvert",
+                           lambda: int(self.upstream.breaker.state == "open")),
+            CallbackMetric("respiria_parse_failures_total", "Réponses du LLM sans JSON exploitable",
+                           lambda: self.parse_stats.failures, kind="counter"),
+            CallbackMetric("respiria_tracked_devices", "Appareils dont l'historique récent est conservé",
+                           lambda: len(self.series) if self.series is not None else 0),
+            CallbackMetric("respiria_reused_analyses_total", "Analyses réutilisées (relevé inchangé)",
+                           lambda: self.changes.reused if self.changes is not None else 0, kind="counter"),
+            CallbackMetric("respiria_logged_verdicts_total", "Verdicts du LLM journalisés pour le modèle local",
+                           lambda: self.verdicts.logged if self.verdicts is not None else 0, kind="counter"),
+        ):
+            REGISTRY.register(metric)
+
     def load_training_data(self):
         """
         Charge et prépare les données d'entraînement
         Ces données serviront de contexte pour Gemini
+        Les statistiques sont rechargées depuis l'artefact précalculé tant que
+        le CSV n'a pas changé (voir training_stats.py)
+        
+        Returns:
+            dict: Statistiques par maladie, ou None en cas d'erreur
         """
         try:
-            df = pd.read_csv(Config.TRAINING_DATA_PATH)
-            print(f"✓ Données chargées : {len(df)} enregistrements")
+            stats, cached = load_or_build_stats(Config.TRAINING_DATA_PATH)
+            origin = "artefact précalculé" if cached else "CSV"
+            logger.info(
+                "Données d'entraînement chargées",
+                extra={"origin": origin, "records": stats["total"]}
+            )
             
             # Créer un contexte d'apprentissage pour Gemini
-            self.training_context = self._create_context_from_data(df)
-            return df
+            self.training_context = context_from_stats(stats)
+            self._compile_prompt()
+            # Profils moyens par maladie pour le score en masse
+            self.training_profile = TrainingProfile.from_stats(stats)
+            # Index des cas les plus proches, injectés dans chaque prompt
+            if Config.RETRIEVAL_K > 0:
+                self.case_index = load_or_build_index(Config.TRAINING_DATA_PATH, stats["csv_hash"])
+            if Config.RISK_MODEL_ENABLED:
+                self._load_risk_model(stats["csv_hash"])
+            return stats
         except Exception as e:
-            print(f"✗ Erreur lors du chargement des données : {e}")
+            logger.error("Erreur lors du chargement des données : %s", e)
             return None
+
+    def _load_risk_model(self, csv_hash):
+        """
+        Charge le modèle local (entraîné seulement si aucun artefact n'existe ;
+        voir python risk_model.py) ; avec Config.LOCAL_BACKEND = "model", il
+        remplace les seuils pour les réponses locales
+        Un échec n'empêche pas le chargement des données d'entraînement
+        """
+        try:
+            self.risk_model = load_or_train_risk_model(Config.TRAINING_DATA_PATH, csv_hash)
+        except Exception as e:
+            logger.warning("Modèle local indisponible : %s", e)
+            return
+        logger.info("Modèle local chargé", extra=self.risk_model.info)
+        if Config.LOCAL_BACKEND == "model":
+            self.scorer = LearnedRiskScorer(self.risk_model)
     
-    def _create_context_from_data(self, df):
-        """
-        Transforme les données CSV en contexte textuel pour Gemini
-        """
-        context = """
-                Tu es RespirIA, un assistant médical spécialisé dans la prédiction des risques respiratoires.
-                CONNAISSANCES MÉDICALES (basées sur les données d'entraînement) :
-        """
-        # Analyser les patterns dans les données
-        if 'maladie' in df.columns and 'conditions' in df.columns:
-            diseases = df['maladie'].unique()
-            for disease in diseases:
-                disease_data = df[df['maladie'] == disease]
-                context += f"\n{disease.upper()} :\n"
-                context += f"- Cas observés : {len(disease_data)}\n"
-                
-        # Ajouter des statistiques générales
-        context += f"\n\nTOTAL DES CAS ANALYSÉS : {len(df)}\n"
+    def _compile_prompt(self):
+        """
+        Construit une seule fois la partie fixe du prompt (rôle, contexte
+        d'entraînement, consignes, schéma JSON)
+        Elle est envoyée à l'identique à chaque appel, ce qui permet au
+        fournisseur de la mettre en cache (Config.PROMPT_CACHING)
+        """
+        self._prompt_prefix = f"{SYSTEM_ROLE}\n{self.training_context}\n{PROMPT_INSTRUCTIONS}"
+        if Config.PROMPT_CACHING:
+            content = [{"type": "text", "text": self._prompt_prefix, "cache_control": {"type": "ephemeral"}}]
+        else:
+            content = self._prompt_prefix
+        self._system_message = {"role": "system", "content": content}
+
+    def _build_prompt(self, sensor_data):
+        """
+        Construit la partie variable du prompt : données capteurs compactes
+        et cas d'entraînement similaires
+        Les tendances de l'appareil n'y figurent pas : la réponse est partagée
+        (cache, requêtes identiques simultanées) entre tous les appareils
+        dont le relevé quantifié est identique
+        """
+        prompt = f"DONNÉES DES CAPTEURS :\n{json.dumps(sensor_data, ensure_ascii=False, separators=(',', ':'))}"
+        similar_cases = self._similar_cases_block(sensor_data)
+        if similar_cases:
+            prompt += f"\n\n{similar_cases}"
+        return prompt
+
+    def _similar_cases_block(self, sensor_data):
+        """
+        Cas d'entraînement les plus proches du relevé, à injecter dans le prompt
+        """
+        if self.case_index is None:
+            return ""
+        return format_cases(self.case_index.query(sensor_data))
+
+    def _build_request(self, sensor_data, model=None):
+        """
+        Prépare les en-têtes et le payload de l'appel OpenRouter (API compatible OpenAI)
+        """
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "HTTP-Referer": "https://respiria.app",
+            "X-Title": "RespirIA"
+        }
+
+        with span("build_prompt"):
+            user_prompt = self._build_prompt(sensor_data)
+
+        payload = {
+            "model": model or self.model,
+            "messages": [
+                self._system_message,
+                {"role": "user", "content": user_prompt}
+            ],
+            "temperature": Config.TEMPERATURE,
+            "max_tokens": Config.MAX_OUTPUT_TOKENS,
+            # Demande à OpenRouter le détail des jetons (dont ceux servis depuis le cache)
+            "usage": {"include": True}
+        }
+        if Config.STRUCTURED_OUTPUT:
+            payload["response_format"] = RESPONSE_FORMAT
+        return headers, payload
+
+    def _extract_content(self, response, model, started):
+        """
+        Extrait le texte généré d'une réponse HTTP d'OpenRouter (requests ou httpx)
+        et enregistre latence, jetons et coût du modèle
+        Lève une exception si l'appel a échoué
+        """
+        if response.status_code != 200:
+            self._record_upstream_error(model, response.status_code)
+            raise UpstreamError(
+                response.status_code, response.text,
+                parse_retry_after(response.headers.get("Retry-After"))
+            )
+
+        response_data = response.json()
+        usage = response_data.get("usage")
+        self.token_usage.record(usage)
+        self.router.record(model, time.perf_counter() - started, usage)
+        UPSTREAM_REQUESTS.inc(model=model, status=response.status_code)
+        if usage:
+            details = usage.get("prompt_tokens_details") or {}
+            UPSTREAM_TOKENS.inc(usage.get("prompt_tokens", 0) or 0, model=model, type="prompt")
+            UPSTREAM_TOKENS.inc(details.get("cached_tokens", 0) or 0, model=model, type="cached")
+            UPSTREAM_TOKENS.inc(usage.get("completion_tokens", 0) or 0, model=model, type="completion")
+        return response_data['choices'][0]['message']['content']
+
+    def _complete(self, headers, payload):
+        """
+        Appel synchrone à OpenRouter, avec nouvelles tentatives, disjoncteur
+        et limite de débit (voir resilience.py)
+
+        Returns:
+            str: Texte généré
+        """
+        return self.upstream.call(lambda: self._post(headers, payload))
+
+    async def _complete_async(self, headers, payload):
+        """
+        Version asynchrone de _complete
+
+        Returns:
+            str: Texte généré
+        """
+        return await self.upstream.call_async(lambda: self._post_async(headers, payload))
+
+    def _post(self, headers, payload):
+        """
+        Requête synchrone unique à OpenRouter
+        """
+        # requests ne sert qu'au mode synchrone (CLI) : importé à la demande
+        import requests
+        started = time.perf_counter()
+        try:
+            with span("llm_call"):
+                response = requests.post(
+                    f"{self.base_url}/chat/completions",
+                    headers=headers,
+                    json=payload,
+                    timeout=Config.HTTP_TIMEOUT
+                )
+        except Exception:
+            self._record_upstream_error(payload["model"])
+            raise
+        return self._extract_content(response, payload["model"], started)
+
+    async def _post_async(self, headers, payload):
+        """
+        Requête asynchrone unique à OpenRouter (pool de connexions partagé)
+        """
+        started = time.perf_counter()
+        try:
+            with span("llm_call"):
+                response = await self._get_async_client().post(
+                    "/chat/completions",
+                    headers=headers,
+                    json=payload
+                )
+        except Exception:
+            self._record_upstream_error(payload["model"])
+            raise
+        return self._extract_content(response, payload["model"], started)
+
+    def _record_upstream_error(self, model, status="error"):
+        self.router.record_error(model)
+        UPSTREAM_REQUESTS.inc(model=model, status=status)
+
+    async def _complete_hedged(self, headers, payload):
+        """
+        Appel asynchrone avec couverture : si le modèle choisi n'a pas répondu
+        dans son budget de latence (p95), une seconde requête part vers le
+        modèle de secours et la première réponse valide est retenue
+
+        Returns:
+            tuple: (texte généré, modèle ayant répondu)
+        """
+        model = payload["model"]
+        fallback = self.router.fallback_for(model)
+        if fallback is None:
+            return await self._complete_async(headers, payload), model
+
+        primary = asyncio.ensure_future(self._complete_async(headers, payload))
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.router.hedge_delay(model))
+            if done:
+                return primary.result(), model
+
+            hedge = asyncio.ensure_future(self._complete_async(headers, dict(payload, model=fallback)))
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self.router.record_hedge(won=task is hedge)
+                        return task.result(), (fallback if task is hedge else model)
+            self.router.record_hedge(won=False)
+            raise primary.exception()
+        finally:
+            # La requête perdante est abandonnée
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def _build_repair_payload(self, response_text):
+        """
+        Prompt court demandant de corriger une réponse dont le JSON est invalide
+        """
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": REPAIR_INSTRUCTIONS},
+                {"role": "user", "content": response_text[:Config.REPAIR_MAX_INPUT_CHARS]}
+            ],
+            "temperature": 0,
+            "max_tokens": Config.MAX_OUTPUT_TOKENS
+        }
+        if Config.STRUCTURED_OUTPUT:
+            payload["response_format"] = RESPONSE_FORMAT
+        return payload
+
+    def _repair(self, headers, response_text):
+        """
+        Seconde tentative (unique) lorsque la réponse du LLM n'est pas un JSON valide
+        """
+        try:
+            with span("repair"):
+                repaired = self._complete(headers, self._build_repair_payload(response_text))
+        except Exception as e:
+            logger.warning("Erreur lors de la réparation de la réponse : %s", e)
+            repaired = None
+        return self._parse_repaired(response_text, repaired)
+
+    async def _repair_async(self, headers, response_text):
+        """
+        Version asynchrone de _repair
+        """
+        try:
+            with span("repair"):
+                repaired = await self._complete_async(headers, self._build_repair_payload(response_text))
+        except Exception as e:
+            logger.warning("Erreur lors de la réparation de la réponse : %s", e)
+            repaired = None
+        return self._parse_repaired(response_text, repaired)
+
+    def _prepare_analysis(self, sensor_data):
+        """
+        Étapes communes avant l'appel au LLM : historique de l'appareil,
+        score local, détection de changement puis cache
         
-        return context
-    
+        Returns:
+            tuple: (contexte de l'analyse, résultat déjà disponible ou None)
+        """
+        trends = None
+        if self.series is not None:
+            with span("timeseries"):
+                trends = self.series.observe(sensor_data)
+        with span("local_score"):
+            local = self.scorer.score(sensor_data)
+        ambiguous = local.pop("local_ambigu")
+        context = {
+            "local": local, "key": None, "model": self.router.choose(local, ambiguous),
+            "tendances": trends, "sensor_data": sensor_data
+        }
+
+        if self._can_answer_locally(local, ambiguous):
+            ANALYSES.inc(source=local["source"])
+            return context, self._attach_trends(context, local)
+
+        if self.changes is not None:
+            reused = self.changes.reusable(sensor_data)
+            if reused is not None:
+                ANALYSES.inc(source="reuse")
+                return context, self._attach_trends(context, reused)
+
+        context["key"] = payload_key(sensor_data)
+        if self.cache is not None:
+            with span("cache_lookup"):
+                cached = self.cache.get(context["key"])
+            if cached is not None:
+                cached["source"] = "cache"
+                ANALYSES.inc(source="cache")
+                self._remember(context, cached)
+                return context, self._attach_trends(context, cached)
+
+        return context, None
+
+    def _can_answer_locally(self, local, ambiguous):
+        """
+        En mode "hybrid", le LLM n'est consulté que si le score local est
+        ambigu ou atteint Config.LOCAL_LLM_THRESHOLD
+        """
+        if Config.ANALYSIS_MODE == "local":
+            return True
+        if Config.ANALYSIS_MODE == "hybrid":
+            return not ambiguous and local["score_risque"] < Config.LOCAL_LLM_THRESHOLD
+        return False
+
+    def _finish_analysis(self, context, result):
+        """
+        Complète l'analyse du LLM avec la qualité de l'air calculée localement
+        et l'enregistre dans le cache et comme état de référence de l'appareil
+        """
+        local = context["local"]
+        for field in ("air_quality_score", "air_quality_level"):
+            if result.get(field) is None:
+                result[field] = local[field]
+        result.setdefault("source", "llm")
+        ANALYSES.inc(source=result["source"])
+
+        if self.cache is not None and context["key"] is not None:
+            self.cache.set(context["key"], result)
+        self._remember(context, result)
+        # Les tendances sont propres à cet appareil (exclues du cache)
+        return self._attach_trends(context, result)
+
+    def _remember(self, context, result):
+        """
+        Retient l'analyse comme état de référence de l'appareil (détection de changement)
+        """
+        if self.changes is None or result.get("niveau_risque") in AnalysisCache.UNCACHEABLE_LEVELS:
+            return
+        self.changes.remember(context["sensor_data"], result)
+
+    def _attach_trends(self, context, result):
+        """
+        Ajoute au résultat (partagé entre appareils) les tendances de
+        l'appareil et sa prévision locale (régression sur la fenêtre), qui
+        remplace celle du LLM lorsque l'historique suffit
+        """
+        trends = context.get("tendances")
+        if trends is None:
+            return result
+        result["tendances"] = trends
+        result["previsions"] = forecast_text(trends) or result.get("previsions")
+        return result
+            
     def analyze_environment(self, sensor_data):
         """
         Analyse les données des capteurs et prédit les risques
@@ -68,110 +668,312 @@ class RespirIAModel:
         Returns:
             dict: Analyse complète avec risques et recommandations
         """
-        # Créer le prompt pour Gemini
-        prompt = f"""
-{self.training_context}
+        context, result = self._prepare_analysis(sensor_data)
+        if result is not None:
+            return result
 
-MISSION :
-Analyse les données environnementales suivantes et prédit les risques pour les maladies respiratoires.
+        try:
+            model = context["model"]
+            if Config.COALESCE_REQUESTS:
+                result = self.inflight.do(context["key"], lambda: self._request_llm(sensor_data, model))
+            else:
+                result = self._request_llm(sensor_data, model)
+            
+        except Exception as e:
+            logger.warning("Erreur lors de l'analyse : %s", e, extra={"model": context["model"]})
+            return self._get_degraded_response(context, e)
 
-DONNÉES DES CAPTEURS :
-{json.dumps(sensor_data, indent=2, ensure_ascii=False)}
+        return self._finish_analysis(context, result)
 
-ANALYSE REQUISE :
-1. Niveau de risque global (FAIBLE / MODÉRÉ / ÉLEVÉ / CRITIQUE)
-2. Maladies potentiellement concernées (asthme, bronchite, rhinite allergique, etc.)
-3. Facteurs environnementaux problématiques
-4. Recommandations personnalisées et concrètes
-5. Prévisions pour les prochaines heures
+    def _request_llm(self, sensor_data, model=None):
+        """
+        Appel au LLM et extraction de l'analyse (avec réparation si besoin)
+        Pas de couverture en synchrone : seul le routage s'applique
+        """
+        headers, payload = self._build_request(sensor_data, model)
+        response_text = self._complete(headers, payload)
 
-FORMAT DE RÉPONSE (JSON) :
-{{
-    "niveau_risque": "MODÉRÉ",
-    "score_risque": 65,
-    "maladies_concernees": ["asthme", "rhinite"],
-    "facteurs_risque": [
-        {{"facteur": "CO2 élevé", "valeur": "1200 ppm", "impact": "élevé"}},
-        {{"facteur": "Humidité faible", "valeur": "30%", "impact": "modéré"}}
-    ],
-    "recommandations": [
-        "Évitez les activités physiques intenses",
-        "Aérez votre intérieur tôt le matin",
-        "Gardez votre inhalateur à portée de main"
-    ],
-    "message_vocal": "Attention, risque respiratoire modéré détecté. Le taux de CO2 est élevé et l'air est sec. Je vous conseille d'éviter les activités physiques intenses et de bien aérer votre logement.",
-    "previsions": "Le risque devrait diminuer en soirée avec la baisse des températures."
-}}
+        result = self._parse_analysis(response_text)
+        if result is None:
+            result = self._repair(headers, response_text)
+        result["modele"] = payload["model"]
+        self._log_verdict(sensor_data, result)
+        return result
 
-Réponds UNIQUEMENT avec le JSON, sans texte supplémentaire.
-"""
-        
-        try:
-            # Appel à OpenRouter via l'API compatible OpenAI
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "HTTP-Referer": "https://respiria.app",
-                "X-Title": "RespirIA"
-            }
-            
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {"role": "system", "content": "Tu es RespirIA, un assistant médical spécialisé dans la prédiction des risques respiratoires."},
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": Config.TEMPERATURE,
-                "max_tokens": Config.MAX_OUTPUT_TOKENS
-            }
-            
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=30
+    def _log_verdict(self, sensor_data, result):
+        """
+        Journalise le verdict reçu du LLM (données d'entraînement du modèle
+        local, voir risk_model.py) ; appelé une seule fois par réponse, par
+        l'appelant qui a effectué l'appel (pas par les requêtes regroupées
+        ni pour les résultats issus du cache ou réutilisés)
+        """
+        if self.verdicts is not None:
+            self.verdicts.append(sensor_data, result)
+
+    def _get_async_client(self):
+        """
+        Retourne le client HTTP asynchrone partagé (pool de connexions keep-alive)
+        Créé à la première utilisation pour être lié à la boucle d'événements active
+        """
+        if self._async_client is None or self._async_client.is_closed:
+            self._async_client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=Config.HTTP_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=Config.HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=Config.HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=Config.HTTP_KEEPALIVE_EXPIRY
+                )
             )
+        return self._async_client
+
+    async def analyze_environment_async(self, sensor_data):
+        """
+        Version asynchrone de analyze_environment, à utiliser depuis l'API
+        L'appel à OpenRouter ne bloque pas la boucle d'événements : un seul
+        worker peut garder plusieurs dizaines d'analyses en cours
+        
+        Args:
+            sensor_data (dict): Données JSON des capteurs
             
-            if response.status_code != 200:
-                print(f"✗ Erreur OpenRouter : {response.status_code} - {response.text}")
-                return self._get_fallback_response()
-            
-            # Parser la réponse JSON de OpenRouter
-            response_data = response.json()
-            result_text = response_data['choices'][0]['message']['content']
-            
-            # Parser la réponse JSON
-            result = self._parse_gemini_response(result_text)
-            
+        Returns:
+            dict: Analyse complète avec risques et recommandations
+        """
+        context, result = self._prepare_analysis(sensor_data)
+        if result is not None:
             return result
-            
+
+        try:
+            model = context["model"]
+            if Config.COALESCE_REQUESTS:
+                # Les requêtes identiques simultanées partagent un seul appel au LLM
+                result = await self.inflight_async.do(
+                    context["key"], lambda: self._request_llm_async(sensor_data, model)
+                )
+            else:
+                result = await self._request_llm_async(sensor_data, model)
+
         except Exception as e:
-            print(f"✗ Erreur lors de l'analyse : {e}")
-            return self._get_fallback_response()
-    
-    def _parse_gemini_response(self, response_text):
+            logger.warning("Erreur lors de l'analyse : %s", e, extra={"model": context["model"]})
+            return self._get_degraded_response(context, e)
+
+        return self._finish_analysis(context, result)
+
+    async def _request_llm_async(self, sensor_data, model=None):
         """
-        Parse la réponse de Gemini et extrait le JSON
+        Version asynchrone de _request_llm, avec couverture optionnelle
         """
+        headers, payload = self._build_request(sensor_data, model)
+        response_text, answered_by = await self._complete_hedged(headers, payload)
+
+        result = self._parse_analysis(response_text)
+        if result is None:
+            result = await self._repair_async(headers, response_text)
+        result["modele"] = answered_by
+        self._log_verdict(sensor_data, result)
+        return result
+
+    async def analyze_environment_stream(self, sensor_data):
+        """
+        Analyse en streaming : relaie la génération d'OpenRouter au fil de l'eau
+        
+        Args:
+            sensor_data (dict): Données JSON des capteurs
+            
+        Yields:
+            tuple: (événement, données) avec les événements
+            "field" (niveau_risque / score_risque dès qu'ils sont complets),
+            "token" (texte généré), "result" (analyse finale) et "error"
+        """
+        context, result = self._prepare_analysis(sensor_data)
+        if result is not None:
+            yield "field", {field: result.get(field) for field in EARLY_FIELDS}
+            yield "result", result
+            return
+
+        extractor = IncrementalFieldExtractor()
         try:
-            # Nettoyer la réponse (enlever les balises markdown si présentes)
-            cleaned = response_text.strip()
-            if cleaned.startswith("```json"):
-                cleaned = cleaned[7:]
-            if cleaned.startswith("```"):
-                cleaned = cleaned[3:]
-            if cleaned.endswith("```"):
-                cleaned = cleaned[:-3]
+            headers, payload = self._build_request(sensor_data, context["model"])
+            payload["stream"] = True
+            # Pas de nouvelle tentative en streaming (texte déjà relayé),
+            # mais le disjoncteur et la limite de débit s'appliquent
+            wait = self.upstream.admit()
+            if wait:
+                await asyncio.sleep(wait)
+            started = time.perf_counter()
+
+            async with self._get_async_client().stream(
+                "POST", "/chat/completions", headers=headers, json=payload
+            ) as response:
+                if response.status_code != 200:
+                    body = (await response.aread()).decode("utf-8", errors="replace")
+                    self.router.record_error(payload["model"])
+                    raise UpstreamError(
+                        response.status_code, body,
+                        parse_retry_after(response.headers.get("Retry-After"))
+                    )
+
+                async for line in response.aiter_lines():
+                    text = parse_sse_line(line)
+                    if not text:
+                        continue
+                    if Config.STREAM_FORWARD_TOKENS:
+                        yield "token", {"text": text}
+                    fields = extractor.feed(text)
+                    if fields:
+                        yield "field", fields
+
+        except (asyncio.CancelledError, GeneratorExit):
+            # Client déconnecté : l'éventuel appel d'essai du disjoncteur est libéré
+            self.upstream.breaker.release()
+            raise
+        except Exception as e:
+            if not isinstance(e, UpstreamUnavailable):
+                self.upstream.record_failure(e)
+            logger.warning("Erreur lors de l'analyse en streaming : %s", e, extra={"model": context["model"]})
+            yield "error", {"message": str(e)}
+            yield "result", self._get_degraded_response(context, e)
+            return
+
+        self.upstream.record_success()
+        # Le flux ne renvoie pas le détail des jetons : seule la latence est suivie
+        self.router.record(payload["model"], time.perf_counter() - started, None)
+        result = self._parse_analysis(extractor.buffer)
+        if result is None:
+            result = await self._repair_async(headers, extractor.buffer)
+        result["modele"] = payload["model"]
+        self._log_verdict(sensor_data, result)
+        yield "result", self._finish_analysis(context, result)
+
+    async def analyze_batch_async(self, sensor_data_list, concurrency=None, timeout=None, validate=None):
+        """
+        Analyse plusieurs jeux de données en parallèle avec une concurrence bornée
+        
+        Args:
+            sensor_data_list (list): Liste de dictionnaires de données capteurs
+            concurrency (int): Nombre maximal d'analyses simultanées
+            timeout (float): Délai maximal pour l'ensemble du batch (secondes)
+            validate (callable): Fonction relevé brut -> dict validé, appliquée
+                dans la tâche de chaque élément (un relevé invalide n'échoue que
+                dans sa propre case de résultat)
             
-            result = json.loads(cleaned.strip())
+        Returns:
+            list: Résultats dans l'ordre des entrées ; un élément en échec contient
+            "success": False et "erreur" sans faire échouer le reste du batch
+        """
+        concurrency = concurrency or Config.BATCH_CONCURRENCY
+        timeout = Config.BATCH_TIMEOUT if timeout is None else timeout
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def analyze_one(sensor_data):
+            if validate is not None:
+                sensor_data = validate(sensor_data)
+            async with semaphore:
+                return await self.analyze_environment_async(sensor_data)
+
+        tasks = [asyncio.create_task(analyze_one(data)) for data in sensor_data_list]
+        if not tasks:
+            return []
+
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+
+        results = []
+        for index, task in enumerate(tasks):
+            if task in pending:
+                results.append({"success": False, "index": index, "erreur": "Délai du batch dépassé"})
+            elif task.exception() is not None:
+                results.append({"success": False, "index": index, "erreur": str(task.exception())})
+            else:
+                result = task.result()
+                result["success"] = True
+                results.append(result)
+        return results
+
+    def predict(self, sensor_data_list):
+        """
+        Prédiction du modèle local pour un lot de relevés, sans LLM
+        (un seul passage vectorisé au-delà de quelques relevés)
+        
+        Returns:
+            list: niveau_risque, score_risque, confiance, probabilites et
+            maladie_probable de chaque relevé, dans l'ordre des entrées
+        """
+        if self.risk_model is None:
+            raise RuntimeError("Modèle local non chargé (RISK_MODEL_ENABLED)")
+        return self.risk_model.predict(sensor_data_list)
+
+    async def aclose(self):
+        """
+        Ferme le pool de connexions HTTP asynchrone
+        """
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+    
+    def _parse_analysis(self, response_text):
+        """
+        Extrait l'analyse JSON de la réponse du LLM
+        Essaie d'abord un décodage strict, puis recherche le premier objet
+        JSON équilibré dans le texte (balises markdown, texte parasite)
+        
+        Returns:
+            dict | None: Analyse, ou None si aucun JSON exploitable
+        """
+        with span("parse"):
+            result = extract_json_object(response_text or "")
+        if isinstance(result, dict) and "niveau_risque" in result:
+            self.parse_stats.record(True)
             return result
-        except:
-            # Si le parsing échoue, retourner le texte brut
-            return {
-                "niveau_risque": "INDÉTERMINÉ",
-                "message_vocal": response_text,
-                "recommandations": ["Consultez les données manuellement"]
-            }
+        self.parse_stats.record(False)
+        return None
+
+    def _parse_repaired(self, response_text, repaired_text):
+        """
+        Résultat de la tentative de réparation, ou réponse INDÉTERMINÉ
+        """
+        result = extract_json_object(repaired_text or "")
+        if isinstance(result, dict) and "niveau_risque" in result:
+            self.parse_stats.record_repair(True)
+            return result
+        self.parse_stats.record_repair(False)
+        return self._get_unparsed_response(response_text)
+
+    def _parse_gemini_response(self, response_text):
+        """
+        Parse la réponse de Gemini et extrait le JSON (sans tentative de réparation)
+        """
+        result = self._parse_analysis(response_text)
+        if result is None:
+            return self._get_unparsed_response(response_text)
+        return result
+
+    def _get_unparsed_response(self, response_text):
+        """
+        Réponse renvoyée lorsque le JSON n'a pas pu être extrait : le texte brut est conservé
+        """
+        return {
+            "niveau_risque": "INDÉTERMINÉ",
+            "message_vocal": response_text,
+            "recommandations": ["Consultez les données manuellement"]
+        }
     
+    def _get_degraded_response(self, context, error=None):
+        """
+        Réponse lorsque le LLM est indisponible (erreurs, disjoncteur ouvert,
+        quota atteint) : score local calculé d'après les seuils
+        """
+        reason = "unavailable" if isinstance(error, UpstreamUnavailable) else "upstream_error"
+        FALLBACKS.inc(reason=reason)
+        ANALYSES.inc(source="fallback")
+        local = context.get("local") if context else None
+        if local is None:
+            return self._get_fallback_response()
+        result = dict(local)
+        result["source"] = "fallback"
+        return self._attach_trends(context, result)
+
     def _get_fallback_response(self):
         """
         Réponse de secours en cas d'erreur
@@ -183,36 +985,37 @@ Réponds UNIQUEMENT avec le JSON, sans texte supplémentaire.
             "recommandations": ["Vérifiez votre connexion", "Contactez le support technique"]
         }
     
-    def generate_audio(self, text, filename="alerte.mp3"):
+    def generate_audio(self, text, filename=None):
         """
         Génère un fichier audio à partir du texte
+        Sans nom de fichier explicite, le message est mis en cache par contenu :
+        un texte déjà synthétisé réutilise le MP3 existant
         
         Args:
             text (str): Texte à convertir en audio
-            filename (str): Nom du fichier de sortie
+            filename (str): Nom du fichier de sortie (optionnel)
             
         Returns:
             str: Chemin du fichier audio généré
         """
         try:
-            # Créer le dossier de sortie si nécessaire
-            os.makedirs(Config.AUDIO_OUTPUT_DIR, exist_ok=True)
-            
-            # Générer l'audio
-            tts = gTTS(text=text, lang=Config.AUDIO_LANGUAGE, slow=False)
-            output_path = os.path.join(Config.AUDIO_OUTPUT_DIR, filename)
-            tts.save(output_path)
+            if filename is None:
+                output_path = self.audio_cache.get_or_create(text)
+            else:
+                output_path = os.path.join(Config.AUDIO_OUTPUT_DIR, filename)
+                self.audio_cache.synthesize(text, output_path)
             
-            print(f"✓ Audio généré : {output_path}")
+            logger.info("Audio généré", extra={"path": output_path})
             return output_path
             
         except Exception as e:
-            print(f"✗ Erreur lors de la génération audio : {e}")
+            logger.error("Erreur lors de la génération audio : %s", e)
             return None
 
 
 # Fonction principale pour tester le modèle
 def main():
+    configure_logging(log_format="text")
     print("=== RespirIA - Système de Prédiction des Risques Respiratoires ===\n")
     
     # Initialiser le modèle
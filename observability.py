@@ -0,0 +1,242 @@
+"""
+Observabilité : métriques au format Prometheus et journalisation structurée
+
+- compteurs et histogrammes (avec étiquettes) exposés par GET /metrics
+- span(stage) : mesure la durée d'une étape (prompt, appel LLM, parsing,
+  synthèse audio...) dans l'histogramme respiria_stage_duration_seconds
+- configure_logging() : journaux JSON (une ligne par événement, champs
+  passés via extra=...) ou texte lisible selon Config.LOG_FORMAT
+"""
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from config import Config
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + list(extra or ())
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Compteur croissant, éventuellement étiqueté
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Histogram:
+    """
+    Histogramme à intervalles fixes (durées en secondes)
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._series = {}  # étiquettes -> [compteurs par intervalle, somme, nombre]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        samples = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                samples.append((f"{self.name}_bucket", labels, cumulative))
+            labels = _format_labels(self.labelnames, key)
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class CallbackMetric:
+    """
+    Métrique lue à la demande (compteurs déjà tenus ailleurs : caches, disjoncteur...)
+    callback() renvoie un nombre, ou un dict {valeur d'étiquette: nombre}
+    """
+
+    def __init__(self, name, documentation, callback, kind="gauge", labelname=None):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.kind = kind
+        self.labelname = labelname
+
+    def samples(self):
+        value = self.callback()
+        if value is None:
+            return []
+        if isinstance(value, dict):
+            return [
+                (self.name, _format_labels((self.labelname,), (label,)), number)
+                for label, number in value.items()
+            ]
+        return [(self.name, "", value)]
+
+
+class Registry:
+    """
+    Ensemble des métriques exposées par /metrics
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            # Réenregistrer un nom remplace la métrique (rechargement d'un modèle)
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """
+        Exposition au format texte Prometheus (version 0.0.4)
+        """
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "respiria_http_requests_total", "Requêtes HTTP traitées par l'API", ("route", "method", "status")
+))
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    "respiria_http_request_duration_seconds", "Durée des requêtes HTTP", ("route", "method")
+))
+STAGE_LATENCY = REGISTRY.register(Histogram(
+    "respiria_stage_duration_seconds", "Durée de chaque étape d'une analyse ou d'une synthèse audio", ("stage",)
+))
+ANALYSES = REGISTRY.register(Counter(
+    "respiria_analyses_total", "Analyses produites, par origine du résultat", ("source",)
+))
+FALLBACKS = REGISTRY.register(Counter(
+    "respiria_fallbacks_total", "Analyses dégradées (LLM indisponible), par cause", ("reason",)
+))
+UPSTREAM_REQUESTS = REGISTRY.register(Counter(
+    "respiria_upstream_requests_total", "Requêtes envoyées à OpenRouter", ("model", "status")
+))
+UPSTREAM_TOKENS = REGISTRY.register(Counter(
+    "respiria_upstream_tokens_total", "Jetons facturés par OpenRouter", ("model", "type")
+))
+STREAM_READINGS = REGISTRY.register(Counter(
+    "respiria_stream_readings_total", "Relevés reçus par WebSocket, acceptés ou invalides", ("status",)
+))
+
+
+@contextmanager
+def span(stage):
+    """
+    Mesure la durée du bloc dans respiria_stage_duration_seconds{stage=...}
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - started, stage=stage)
+
+
+# Attributs standard d'un LogRecord : tout autre attribut vient de extra=...
+_RESERVED_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Une ligne JSON par événement : horodatage, niveau, module, message et champs extra
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(level=None, log_format=None):
+    """
+    Configure la journalisation de l'application (à appeler une fois au démarrage)
+    """
+    handler = logging.StreamHandler()
+    if (log_format or Config.LOG_FORMAT) == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s : %(message)s"))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level or Config.LOG_LEVEL)
+    # Une ligne par requête HTTP sortante : déjà couvert par les métriques
+    logging.getLogger("httpx").setLevel(logging.WARNING)
@@ -0,0 +1,305 @@
+"""
+Protection des appels à OpenRouter
+
+- nouvelles tentatives avec attente exponentielle (et aléatoire) sur les
+  erreurs transitoires (429, 5xx, erreurs réseau), en respectant Retry-After
+- disjoncteur : au-delà d'un taux d'erreur, les appels sont coupés pendant
+  un délai de refroidissement et l'analyse bascule sur le score local
+- seau à jetons : limite côté client du débit de requêtes (quota OpenRouter) ;
+  une requête qui devrait attendre trop longtemps est abandonnée
+
+Sous forte charge ou pendant une panne, les requêtes excédentaires sont
+ainsi écartées au lieu d'amplifier l'incident.
+"""
+import asyncio
+import email.utils
+import random
+import sys
+import threading
+import time
+from collections import deque
+import httpx
+from config import Config
+
+
+class UpstreamError(RuntimeError):
+    """
+    Réponse HTTP en erreur d'OpenRouter
+    """
+
+    def __init__(self, status_code, body, retry_after=None):
+        super().__init__(f"Erreur OpenRouter : {status_code} - {body}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class UpstreamUnavailable(RuntimeError):
+    """
+    Appel non tenté : disjoncteur ouvert ou quota local épuisé
+    """
+
+
+def parse_retry_after(value):
+    """
+    Valeur de l'en-tête Retry-After en secondes (nombre ou date HTTP), None si absente
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+def transport_errors():
+    """
+    Erreurs réseau et délais dépassés : httpx (délais compris), requests
+    s'il est chargé (chemin synchrone), bibliothèque standard
+    """
+    errors = [httpx.TransportError, ConnectionError, TimeoutError]
+    requests = sys.modules.get("requests")
+    if requests is not None:
+        errors += [requests.ConnectionError, requests.Timeout]
+    return tuple(errors)
+
+
+def is_retryable(error):
+    """
+    Erreur transitoire justifiant une nouvelle tentative : statut de
+    Config.RETRY_STATUSES ou erreur réseau ; toute autre exception (réponse
+    invalide, bogue) est remontée sans nouvelle tentative
+    """
+    if isinstance(error, UpstreamError):
+        return error.status_code in Config.RETRY_STATUSES
+    return isinstance(error, transport_errors())
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur sur le taux d'erreur des appels récents
+    fermé -> ouvert (taux d'erreur dépassé) -> semi-ouvert (un appel d'essai) -> fermé
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, error_rate=None, min_calls=None, window=None, cooldown=None):
+        self.error_rate = error_rate or Config.BREAKER_ERROR_RATE
+        self.min_calls = min_calls or Config.BREAKER_MIN_CALLS
+        self.window = window or Config.BREAKER_WINDOW
+        self.cooldown = cooldown or Config.BREAKER_COOLDOWN
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.trips = 0
+        self._outcomes = deque()  # (horodatage, succès)
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Indique si un appel peut être tenté
+        """
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def record(self, success):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+                if success:
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open(now)
+                return
+
+            self._outcomes.append((now, success))
+            while self._outcomes and now - self._outcomes[0][0] > self.window:
+                self._outcomes.popleft()
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if (self.state == self.CLOSED and len(self._outcomes) >= self.min_calls
+                    and failures / len(self._outcomes) >= self.error_rate):
+                self._open(now)
+
+    def release(self):
+        """
+        Libère l'appel d'essai sans résultat (appel annulé)
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+
+    def _open(self, now):
+        self.state = self.OPEN
+        self.opened_at = now
+        self.trips += 1
+        self._outcomes.clear()
+
+    def stats(self):
+        return {"state": self.state, "trips": self.trips}
+
+
+class TokenBucket:
+    """
+    Seau à jetons (rate requêtes / s, capacité burst), partagé entre threads et coroutines
+    Les jetons sont réservés : l'appelant attend ensuite le délai renvoyé
+    """
+
+    def __init__(self, rate=None, burst=None):
+        self.rate = Config.RATE_LIMIT_RPS if rate is None else rate
+        self.burst = burst or Config.RATE_LIMIT_BURST or max(1.0, self.rate)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait):
+        """
+        Réserve un jeton
+
+        Returns:
+            float | None: Délai d'attente avant l'appel, None si supérieur à max_wait
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = max(0.0, (1 - self.tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            self.tokens -= 1
+            return wait
+
+
+class UpstreamGuard:
+    """
+    Nouvelles tentatives, disjoncteur et limite de débit autour d'un appel
+    """
+
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+        self.bucket = TokenBucket()
+        self.retries = 0
+        self.rejected = 0
+
+    def call(self, function):
+        """
+        Exécute function() (appel synchrone) avec la politique de résilience
+        """
+        attempt = 0
+        while True:
+            wait = self.admit()
+            if wait:
+                time.sleep(wait)
+            try:
+                result = function()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                time.sleep(delay)
+                continue
+            self.record_success()
+            return result
+
+    async def call_async(self, function):
+        """
+        Version asynchrone de call : function() renvoie une coroutine
+        """
+        attempt = 0
+        while True:
+            wait = self.admit()
+            try:
+                # Attente du jeton comprise : une annulation libère aussi l'appel d'essai
+                if wait:
+                    await asyncio.sleep(wait)
+                result = await function()
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            self.record_success()
+            return result
+
+    def admit(self):
+        """
+        Vérifie le disjoncteur et réserve un jeton
+
+        Returns:
+            float: Délai d'attente avant l'appel (secondes)
+
+        Raises:
+            UpstreamUnavailable: Disjoncteur ouvert ou quota épuisé
+        """
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise UpstreamUnavailable("Disjoncteur ouvert : OpenRouter temporairement écarté")
+        wait = self.bucket.reserve(Config.RATE_LIMIT_MAX_WAIT)
+        if wait is None:
+            self.breaker.release()
+            self.rejected += 1
+            raise UpstreamUnavailable("Quota de requêtes OpenRouter atteint")
+        return wait
+
+    def record_success(self):
+        self.breaker.record(True)
+
+    def record_failure(self, error):
+        """
+        Enregistre un échec
+
+        Returns:
+            bool: True si l'erreur est transitoire (comptée par le disjoncteur)
+        """
+        if not is_retryable(error):
+            # Erreur de la requête elle-même (400, 401...) : OpenRouter n'est pas en cause
+            self.breaker.release()
+            return False
+        self.breaker.record(False)
+        return True
+
+    def _retry_delay(self, error, attempt):
+        """
+        Enregistre l'échec et renvoie le délai avant la tentative suivante (None : abandon)
+        """
+        if not self.record_failure(error):
+            return None
+        if attempt >= Config.RETRY_ATTEMPTS or self.breaker.state == CircuitBreaker.OPEN:
+            return None
+
+        delay = min(Config.RETRY_MAX_DELAY, Config.RETRY_BASE_DELAY * 2 ** attempt)
+        delay *= random.uniform(0.5, 1.0)
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is not None:
+            if retry_after > Config.RETRY_MAX_DELAY:
+                return None
+            delay = max(delay, retry_after)
+        self.retries += 1
+        return delay
+
+    def stats(self):
+        return {**self.breaker.stats(), "retries": self.retries, "rejected": self.rejected}
@@ -0,0 +1,193 @@
+"""
+Recherche des cas d'entraînement les plus proches d'un relevé
+
+Les variables numériques de training_data.csv sont centrées-réduites dans
+une matrice NumPy ; pour chaque analyse, seuls les k cas les plus proches
+sont injectés dans le prompt. La taille du prompt reste ainsi constante
+quelle que soit la taille du jeu d'entraînement.
+"""
+import os
+import numpy as np
+from config import Config
+from training_stats import read_training_chunks, reservoir_positions, write_atomic
+
+# Champs texte conservés pour décrire chaque cas dans le prompt
+CASE_FIELDS = ("maladie", "severite", "pollen", "symptomes", "recommandations")
+
+
+def _pollen_values(values):
+    return np.array(
+        [Config.POLLEN_SCORES.get(str(v).strip().lower(), np.nan) for v in values],
+        dtype=np.float64
+    )
+
+
+class CaseIndex:
+    """
+    Index des cas d'entraînement (matrice normalisée, recherche exacte des k plus proches)
+    """
+
+    def __init__(self, matrix, means, stds, features, cases, raw):
+        self.matrix = matrix  # (cas, variables) float32, centrée-réduite
+        # Une ligne contiguë par variable : la distance se calcule sans copie de la matrice
+        self._columns = np.ascontiguousarray(matrix.T)
+        self.means = means
+        self.stds = stds
+        self.features = list(features)
+        self.cases = cases  # {champ texte: tableau}
+        self.raw = raw  # valeurs d'origine (cas, variables)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @classmethod
+    def from_dataframe(cls, df, features=None):
+        """
+        Construit l'index à partir du DataFrame d'entraînement
+        """
+        features = [f for f in (features or Config.RETRIEVAL_FEATURES) if f in df.columns]
+        columns = []
+        for feature in features:
+            if feature == "pollen":
+                columns.append(_pollen_values(df[feature]))
+            else:
+                columns.append(df[feature].to_numpy(dtype=np.float64))
+        raw = np.column_stack(columns) if columns else np.empty((len(df), 0))
+
+        means = np.nanmean(raw, axis=0) if len(raw) else np.zeros(len(features))
+        stds = np.nanstd(raw, axis=0) if len(raw) else np.ones(len(features))
+        stds[stds == 0] = 1
+        # Une valeur manquante dans l'entraînement est placée sur la moyenne
+        matrix = np.nan_to_num((raw - means) / stds).astype(np.float32)
+
+        cases = {
+            field: df[field].astype(str).to_numpy(dtype=str)
+            for field in CASE_FIELDS if field in df.columns
+        }
+        return cls(matrix, means, stds, features, cases, raw.astype(np.float32))
+
+    def query(self, sensor_data, k=None):
+        """
+        Les k cas les plus proches d'un relevé (distance sur les variables présentes)
+
+        Returns:
+            list: Cas (dict) du plus proche au plus éloigné
+        """
+        k = Config.RETRIEVAL_K if k is None else k
+        columns, values = [], []
+        for i, feature in enumerate(self.features):
+            value = sensor_data.get(feature)
+            if feature == "pollen" and isinstance(value, str):
+                value = Config.POLLEN_SCORES.get(value.strip().lower())
+            if isinstance(value, (int, float)):
+                columns.append(i)
+                values.append((value - self.means[i]) / self.stds[i])
+        if not columns or k <= 0 or len(self) == 0:
+            return []
+
+        distances = np.zeros(len(self), dtype=np.float32)
+        difference = np.empty(len(self), dtype=np.float32)
+        for column, value in zip(columns, values):
+            np.subtract(self._columns[column], np.float32(value), out=difference)
+            np.multiply(difference, difference, out=difference)
+            distances += difference
+
+        k = min(k, len(distances))
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest])]
+
+        results = []
+        for row in nearest:
+            case = {field: str(column[row]) for field, column in self.cases.items()}
+            case["mesures"] = {
+                feature: float(self.raw[row, i]) for i, feature in enumerate(self.features)
+                if feature != "pollen"
+            }
+            results.append(case)
+        return results
+
+    def save(self, path):
+        """
+        Enregistre l'index (format .npz, sans pickle)
+        """
+        write_atomic(path, lambda f: np.savez(
+            f,
+            matrix=self.matrix, means=self.means, stds=self.stds, raw=self.raw,
+            features=np.array(self.features, dtype=str),
+            **{f"case_{field}": values for field, values in self.cases.items()}
+        ), binary=True)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            cases = {
+                name[len("case_"):]: data[name] for name in data.files if name.startswith("case_")
+            }
+            return cls(
+                data["matrix"], data["means"], data["stds"],
+                data["features"].tolist(), cases, data["raw"]
+            )
+
+
+def sample_training_cases(csv_path, max_cases=None, seed=0):
+    """
+    Lit le CSV par blocs et garde au plus Config.RETRIEVAL_MAX_CASES cas
+    (échantillon par réservoir, tous les cas si le fichier est plus petit)
+
+    Returns:
+        DataFrame: Variables de Config.RETRIEVAL_FEATURES et champs de CASE_FIELDS
+    """
+    import pandas as pd
+    max_cases = max_cases or Config.RETRIEVAL_MAX_CASES
+    rng = np.random.default_rng(seed)
+    sample, seen = {}, 0
+    for chunk in read_training_chunks(csv_path, set(Config.RETRIEVAL_FEATURES) | set(CASE_FIELDS)):
+        positions, slots = reservoir_positions(seen, len(chunk), max_cases, rng)
+        for column in chunk.columns:
+            values = chunk[column].to_numpy()
+            if column not in sample:
+                sample[column] = np.empty(max_cases, dtype=values.dtype if values.dtype.kind == "f" else object)
+            sample[column][slots] = values[positions]
+        seen += len(chunk)
+    size = min(seen, max_cases)
+    return pd.DataFrame({column: values[:size] for column, values in sample.items()})
+
+
+def index_path(csv_hash):
+    return os.path.join(Config.TRAINING_STATS_DIR, f"case_index_{csv_hash[:16]}.npz")
+
+
+def load_or_build_index(csv_path, csv_hash):
+    """
+    Charge l'index correspondant au CSV, ou le construit et l'enregistre
+    """
+    path = index_path(csv_hash)
+    if os.path.exists(path):
+        return CaseIndex.load(path)
+
+    index = CaseIndex.from_dataframe(sample_training_cases(csv_path))
+    index.save(path)
+
+    directory = os.path.dirname(path)
+    for name in os.listdir(directory):
+        if name.startswith("case_index_") and os.path.join(directory, name) != path:
+            os.remove(os.path.join(directory, name))
+    return index
+
+
+def format_cases(cases):
+    """
+    Bloc de prompt décrivant les cas similaires
+    """
+    if not cases:
+        return ""
+    lines = ["CAS SIMILAIRES DU JEU D'ENTRAÎNEMENT :"]
+    for case in cases:
+        measures = ", ".join(f"{k} {v:g}" for k, v in case["mesures"].items())
+        if case.get("pollen"):
+            measures += f", pollen {case['pollen']}"
+        lines.append(
+            f"- {case.get('maladie', '?')} (sévérité {case.get('severite', '?')}) : {measures}"
+            f" ; symptômes : {case.get('symptomes', '')} ; recommandations : {case.get('recommandations', '')}"
+        )
+    return "\n".join(lines)
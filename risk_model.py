@@ -0,0 +1,494 @@
+"""
+Modèle local de risque respiratoire (régression logistique multinomiale NumPy)
+
+Deux têtes softmax, entraînées hors du chemin de démarrage de l'API
+(python risk_model.py, ou serve.py avant le lancement des workers) et
+enregistrées dans un artefact .npz de Config.TRAINING_STATS_DIR ; l'API se
+contente de charger cet artefact :
+- niveau de risque (FAIBLE / MODÉRÉ / ÉLEVÉ / CRITIQUE), distillé des
+  verdicts du LLM journalisés par VerdictLog ; des relevés synthétiques
+  étiquetés par les seuils (score_arrays) servent d'a priori, pour que le
+  modèle réponde avant les premiers verdicts. La colonne severite du CSV
+  décrit la gravité des cas et ne dépend pas des mesures : elle n'est pas
+  utilisée.
+- maladie probable, apprise sur les colonnes maladie et
+  Config.RETRIEVAL_FEATURES du CSV d'entraînement
+
+RiskModel.predict traite un lot de relevés en quelques opérations
+matricielles ; LearnedRiskScorer remplace RiskScorer comme moteur local de
+RespirIAModel (Config.LOCAL_BACKEND = "model").
+
+Usage :
+    python risk_model.py   # réentraîne le modèle si le journal a changé et affiche ses performances
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import deque
+import numpy as np
+from config import Config
+from scoring import RISK_LEVELS, RiskScorer, field_score_array, pollen_lookup, score_arrays
+
+_RULES = RiskScorer()
+
+MODEL_VERSION = 2
+RISK_CLASSES = tuple(level for _, level in RISK_LEVELS) + ("CRITIQUE",)
+# Plage du score de chaque niveau : le score des seuils y est ramené
+LEVEL_LOWS = np.array([0] + [limit for limit, _ in RISK_LEVELS])
+LEVEL_HIGHS = np.array([limit - 1 for limit, _ in RISK_LEVELS] + [100])
+# En deçà, les relevés sont prédits un par un : le coût fixe des opérations
+# vectorisées (score_arrays) dépasse celui du calcul scalaire
+SCALAR_BATCH = 8
+
+
+def _number(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return np.nan
+
+
+def reading_columns(readings):
+    """
+    Tableaux par champ (NaN si absent) d'une liste de relevés, au format de
+    score_arrays ; le pollen est converti en score
+    """
+    columns = {
+        field: np.array([_number(reading.get(field)) for reading in readings], dtype=np.float64)
+        for field in Config.THRESHOLDS
+    }
+    columns["pollen"] = pollen_lookup([reading.get("pollen") for reading in readings])
+    return columns
+
+
+def risk_features(columns, rule_scores):
+    """
+    Variables du niveau de risque : scores des seuils par champ (0 si absent),
+    score global des seuils, nombre de facteurs significatifs et mesures brutes
+    """
+    scores = [np.nan_to_num(field_score_array(field, columns[field])) for field in Config.THRESHOLDS]
+    scores.append(np.nan_to_num(columns["pollen"]))
+    scores = np.column_stack(scores) / 100
+    raw = np.column_stack([columns[field] for field in Config.THRESHOLDS])
+    return np.column_stack([scores, rule_scores / 100, (scores >= 0.5).sum(axis=1), raw])
+
+
+def reading_features(sensor_data, field_scores=None):
+    """
+    Version scalaire de risk_features pour un relevé
+
+    Args:
+        field_scores: Scores par champ de RiskScorer.field_scores, s'ils sont déjà calculés
+
+    Returns:
+        tuple: (variables (1, variables), score des seuils)
+    """
+    if field_scores is None:
+        field_scores = _RULES.field_scores(sensor_data)
+    scores = [field_scores.get(field, 0.0) / 100 for field in (*Config.THRESHOLDS, "pollen")]
+    highest = max(field_scores.values(), default=0.0)
+    aggravating = sum(1 for s in field_scores.values() if s >= 50) - (1 if highest >= 50 else 0)
+    rule_score = round(min(100.0, highest + 10 * aggravating)) if field_scores else 0
+    row = scores + [rule_score / 100, sum(1 for s in scores if s >= 0.5)]
+    row += [_number(sensor_data.get(field)) for field in Config.THRESHOLDS]
+    return np.array([row]), rule_score
+
+
+class SoftmaxRegression:
+    """
+    Régression logistique multinomiale sur variables centrées-réduites
+    (descente de gradient à moment, régularisation L2 hors biais)
+    """
+
+    def __init__(self, classes, weights=None, means=None, stds=None):
+        self.classes = np.asarray(classes, dtype=str)
+        self.weights = weights  # (variables + biais, classes)
+        self.means = means
+        self.stds = stds
+
+    def _standardize(self, X):
+        X = (X - self.means) / self.stds
+        X[np.isnan(X)] = 0  # valeur absente : placée sur la moyenne
+        return X
+
+    @staticmethod
+    def _softmax(logits):
+        logits = logits - logits.max(axis=1, keepdims=True)
+        np.exp(logits, out=logits)
+        logits /= logits.sum(axis=1, keepdims=True)
+        return logits
+
+    def fit(self, X, y, sample_weight=None, l2=1e-4, iterations=500, learning_rate=0.5, momentum=0.9):
+        """
+        Args:
+            X: Variables (lignes, variables), NaN si absentes
+            y: Libellés (parmi self.classes)
+            sample_weight: Poids de chaque ligne (1 par défaut)
+        """
+        with np.errstate(invalid="ignore"):
+            self.means = np.nan_to_num(np.nanmean(X, axis=0)) if len(X) else np.zeros(X.shape[1])
+            self.stds = np.nan_to_num(np.nanstd(X, axis=0)) if len(X) else np.ones(X.shape[1])
+        self.stds[self.stds == 0] = 1
+        design = np.hstack([self._standardize(X), np.ones((len(X), 1))])
+        targets = (np.asarray(y, dtype=str)[:, None] == self.classes[None, :]).astype(np.float64)
+        weights = np.ones(len(X)) if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+        weights = weights / weights.sum()
+
+        penalty = np.full((design.shape[1], 1), l2)
+        penalty[-1] = 0
+        self.weights = np.zeros((design.shape[1], len(self.classes)))
+        velocity = np.zeros_like(self.weights)
+        for _ in range(iterations):
+            # Gradient évalué au point anticipé (Nesterov)
+            ahead = self.weights + momentum * velocity
+            residuals = self._softmax(design @ ahead) - targets
+            gradient = design.T @ (residuals * weights[:, None]) + penalty * ahead
+            velocity = momentum * velocity - learning_rate * gradient
+            self.weights += velocity
+        return self
+
+    def predict_proba(self, X):
+        return self._softmax(self._standardize(X) @ self.weights[:-1] + self.weights[-1])
+
+    def accuracy(self, X, y, sample_weight=None):
+        if not len(X):
+            return None
+        correct = self.classes[self.predict_proba(X).argmax(axis=1)] == np.asarray(y, dtype=str)
+        return float(np.average(correct, weights=sample_weight))
+
+    def arrays(self, prefix):
+        return {
+            f"{prefix}_classes": self.classes, f"{prefix}_weights": self.weights,
+            f"{prefix}_means": self.means, f"{prefix}_stds": self.stds
+        }
+
+    @classmethod
+    def from_arrays(cls, data, prefix):
+        return cls(*(data[f"{prefix}_{name}"] for name in ("classes", "weights", "means", "stds")))
+
+
+class RiskModel:
+    """
+    Niveau de risque et maladie probable d'un lot de relevés
+    """
+
+    def __init__(self, level_head, disease_head=None, disease_features=(), info=None):
+        self.level_head = level_head
+        self.disease_head = disease_head
+        self.disease_features = list(disease_features)
+        self.info = info or {}  # effectifs et précisions de l'entraînement
+
+    def predict_columns(self, columns):
+        """
+        Prédiction vectorisée (tableaux par champ, voir reading_columns)
+
+        Returns:
+            dict: Tableaux niveau_risque, score_risque, confiance, probabilites
+            (lignes, RISK_CLASSES) et maladie_probable si la tête maladie existe
+        """
+        rule_scores = score_arrays(columns)["score_risque"]
+        disease_features = None
+        if self.disease_head is not None:
+            disease_features = np.column_stack([columns[field] for field in self.disease_features])
+        return self._predict(risk_features(columns, rule_scores), rule_scores, disease_features)
+
+    def _predict(self, features, rule_scores, disease_features):
+        probabilities = self.level_head.predict_proba(features)
+        # Les classes de la tête niveau suivent l'ordre de RISK_CLASSES
+        best = probabilities.argmax(axis=1)
+        prediction = {
+            "niveau_risque": self.level_head.classes[best],
+            "score_risque": np.clip(rule_scores, LEVEL_LOWS[best], LEVEL_HIGHS[best]),
+            "confiance": probabilities[np.arange(len(best)), best],
+            "probabilites": probabilities
+        }
+        if disease_features is not None:
+            prediction["maladie_probable"] = self.disease_head.classes[
+                self.disease_head.predict_proba(disease_features).argmax(axis=1)
+            ]
+        return prediction
+
+    def predict_one(self, sensor_data, field_scores=None):
+        """
+        Prédiction d'un seul relevé (calcul scalaire, quelques dizaines de µs)
+        """
+        features, rule_score = reading_features(sensor_data, field_scores)
+        disease_features = None
+        if self.disease_head is not None:
+            disease_features = np.array([[
+                Config.POLLEN_SCORES.get(str(sensor_data.get(field)).strip().lower(), np.nan)
+                if field == "pollen" else _number(sensor_data.get(field))
+                for field in self.disease_features
+            ]])
+        return self._results(self._predict(features, np.array([rule_score]), disease_features))[0]
+
+    def predict(self, readings):
+        """
+        Prédiction d'un lot de relevés (dictionnaires au format SensorData)
+
+        Returns:
+            list: Un dictionnaire par relevé, dans l'ordre des entrées
+        """
+        if len(readings) < SCALAR_BATCH:
+            return [self.predict_one(reading) for reading in readings]
+        return self._results(self.predict_columns(reading_columns(readings)))
+
+    def _results(self, prediction):
+        diseases = prediction.get("maladie_probable")
+        results = []
+        for i in range(len(prediction["niveau_risque"])):
+            result = {
+                "niveau_risque": str(prediction["niveau_risque"][i]),
+                "score_risque": int(prediction["score_risque"][i]),
+                "confiance": round(float(prediction["confiance"][i]), 3),
+                "probabilites": {
+                    str(level): round(float(p), 3)
+                    for level, p in zip(self.level_head.classes, prediction["probabilites"][i])
+                },
+                "source": "model"
+            }
+            if diseases is not None:
+                result["maladie_probable"] = str(diseases[i])
+            results.append(result)
+        return results
+
+    @classmethod
+    def train(cls, csv_path=None, verdict_path=None, seed=0):
+        """
+        Entraîne les deux têtes : niveau de risque sur l'a priori des seuils et
+        les verdicts du LLM, maladie sur un échantillon du CSV d'entraînement
+        """
+        from retrieval import sample_training_cases
+        prior = synthetic_readings(Config.RISK_MODEL_PRIOR_ROWS, seed)
+        prior_labels = score_arrays(prior)["niveau_risque"]
+        verdicts, verdict_labels = read_verdicts(verdict_path or Config.VERDICT_LOG_PATH)
+
+        columns = {field: np.concatenate([prior[field], verdicts[field]]) for field in prior}
+        labels = np.concatenate([prior_labels, verdict_labels])
+        weights = np.concatenate([
+            np.ones(len(prior_labels)), np.full(len(verdict_labels), Config.RISK_MODEL_VERDICT_WEIGHT)
+        ])
+        X = risk_features(columns, score_arrays(columns)["score_risque"])
+        level_head = SoftmaxRegression(RISK_CLASSES).fit(X, labels, weights)
+        verdict_rows = slice(len(prior_labels), None)
+        info = {
+            "prior": len(prior_labels),
+            "verdicts": len(verdict_labels),
+            "rules_agreement": level_head.accuracy(X[:len(prior_labels)], prior_labels),
+            "llm_agreement": level_head.accuracy(X[verdict_rows], labels[verdict_rows])
+        }
+
+        disease_head, disease_features = None, []
+        cases = sample_training_cases(csv_path or Config.TRAINING_DATA_PATH)
+        disease_features = [field for field in Config.RETRIEVAL_FEATURES if field in cases.columns]
+        if "maladie" in cases.columns and len(cases):
+            features = np.column_stack([
+                pollen_lookup(cases[field]) if field == "pollen" else cases[field].to_numpy(dtype=np.float64)
+                for field in disease_features
+            ])
+            diseases = cases["maladie"].astype(str).to_numpy()
+            disease_head = SoftmaxRegression(np.unique(diseases)).fit(features, diseases)
+            info["cases"] = len(diseases)
+            info["disease_accuracy"] = disease_head.accuracy(features, diseases)
+        return cls(level_head, disease_head, disease_features, info)
+
+    def save(self, path):
+        """
+        Enregistre le modèle (format .npz, sans pickle)
+        """
+        from training_stats import write_atomic
+        arrays = self.level_head.arrays("level")
+        if self.disease_head is not None:
+            arrays.update(self.disease_head.arrays("disease"))
+        write_atomic(path, lambda f: np.savez(
+            f,
+            disease_features=np.array(self.disease_features, dtype=str),
+            info=np.array(json.dumps(self.info)),
+            **arrays
+        ), binary=True)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            disease_head = SoftmaxRegression.from_arrays(data, "disease") if "disease_weights" in data else None
+            return cls(
+                SoftmaxRegression.from_arrays(data, "level"), disease_head,
+                data["disease_features"].tolist(), json.loads(str(data["info"]))
+            )
+
+
+def synthetic_readings(rows, seed=0):
+    """
+    Relevés aléatoires couvrant les plages de Config.THRESHOLDS (pour moitié
+    dans la plage normale), avec 20 % de mesures absentes
+    """
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for field, bands in Config.THRESHOLDS.items():
+        if "danger" in bands:
+            normal, full = (0, bands["normal"]), (0, bands["danger"] * 1.6)
+        else:
+            width = bands["max_normal"] - bands["min_normal"]
+            normal = (bands["min_normal"], bands["max_normal"])
+            full = (bands["min_normal"] - width, bands["max_normal"] + width)
+        values = np.where(rng.random(rows) < 0.5, rng.uniform(*normal, rows), rng.uniform(*full, rows))
+        values[rng.random(rows) < 0.2] = np.nan
+        columns[field] = values
+    pollen = np.array(sorted(set(Config.POLLEN_SCORES.values())) + [np.nan], dtype=np.float64)
+    columns["pollen"] = rng.choice(pollen, rows)
+    return columns
+
+
+def read_verdicts(path, limit=None, trusted_endpoints=None):
+    """
+    Derniers verdicts du journal (Config.RISK_MODEL_MAX_VERDICTS au plus),
+    produits par un point d'accès de Config.VERDICT_TRUSTED_ENDPOINTS (les
+    verdicts d'un faux serveur ou d'un point d'accès de test sont écartés)
+
+    Returns:
+        tuple: (tableaux par champ, niveaux de risque)
+    """
+    limit = limit or Config.RISK_MODEL_MAX_VERDICTS
+    trusted = set(Config.VERDICT_TRUSTED_ENDPOINTS if trusted_endpoints is None else trusted_endpoints)
+    records = deque(maxlen=limit)
+    # Journal précédent (après rotation) puis journal courant
+    for log_path in (path + ".1", path):
+        if not os.path.exists(log_path):
+            continue
+        with open(log_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # ligne tronquée (arrêt pendant l'écriture)
+                if (isinstance(record, dict) and record.get("niveau_risque") in RISK_CLASSES
+                        and record.get("endpoint") in trusted):
+                    records.append(record)
+    return reading_columns(records), np.array([r["niveau_risque"] for r in records], dtype=str)
+
+
+class VerdictLog:
+    """
+    Journal JSON-lines des verdicts du LLM (mesures, niveau de risque, modèle
+    et point d'accès), données d'entraînement du modèle local ; aucun
+    identifiant n'est conservé
+    Au-delà de Config.VERDICT_LOG_MAX_MB, le journal devient <path>.1
+    (remplaçant le précédent) : deux fichiers au plus sur le disque
+    """
+
+    def __init__(self, path=None, endpoint=None, max_bytes=None):
+        self.path = path or Config.VERDICT_LOG_PATH
+        self.endpoint = (endpoint or Config.OPENROUTER_BASE_URL).rstrip("/")
+        self.max_bytes = max_bytes or int(Config.VERDICT_LOG_MAX_MB * 1e6)
+        self._lock = threading.Lock()
+        self.logged = 0
+
+    def append(self, sensor_data, result):
+        level = result.get("niveau_risque")
+        if level not in RISK_CLASSES:
+            return
+        record = {
+            field: sensor_data[field] for field in (*Config.THRESHOLDS, "pollen")
+            if sensor_data.get(field) is not None
+        }
+        record["niveau_risque"] = level
+        record["score_risque"] = result.get("score_risque")
+        record["modele"] = result.get("modele")
+        record["endpoint"] = self.endpoint
+        # Une seule écriture par ligne (mode ajout) : pas d'entrelacement entre workers
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                size = f.tell()
+            if size >= self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+            self.logged += 1
+
+
+def model_path(csv_hash):
+    digest = hashlib.sha256(f"{MODEL_VERSION}:{csv_hash}:{Config.RISK_MODEL_PRIOR_ROWS}".encode())
+    return os.path.join(Config.TRAINING_STATS_DIR, f"risk_model_{digest.hexdigest()[:16]}.npz")
+
+
+def verdict_log_hash(verdict_path):
+    from training_stats import file_hash
+    return file_hash(verdict_path) if os.path.exists(verdict_path) else None
+
+
+def load_or_train_risk_model(csv_path, csv_hash, verdict_path=None, refresh=False):
+    """
+    Charge le modèle correspondant au CSV, ou l'entraîne et l'enregistre s'il
+    n'existe pas encore (les artefacts précédents sont supprimés)
+
+    Args:
+        refresh: Réentraîne aussi le modèle si le journal des verdicts a
+            changé depuis son entraînement (python risk_model.py, serve.py) ;
+            sans refresh (démarrage de l'API), l'artefact existant est chargé
+            tel quel, sans relire le journal
+    """
+    verdict_path = verdict_path or Config.VERDICT_LOG_PATH
+    path = model_path(csv_hash)
+    if os.path.exists(path):
+        model = RiskModel.load(path)
+        if not refresh or model.info.get("verdict_log") == verdict_log_hash(verdict_path):
+            return model
+
+    log_hash = verdict_log_hash(verdict_path)
+    model = RiskModel.train(csv_path, verdict_path)
+    model.info["verdict_log"] = log_hash
+    model.save(path)
+
+    directory = os.path.dirname(path)
+    for name in os.listdir(directory):
+        if name.startswith("risk_model_") and os.path.join(directory, name) != path:
+            os.remove(os.path.join(directory, name))
+    return model
+
+
+class LearnedRiskScorer(RiskScorer):
+    """
+    Moteur local fondé sur RiskModel : niveau et score prédits par le modèle,
+    facteurs et recommandations décrits d'après les seuils
+    """
+
+    def __init__(self, model, min_confidence=None, **kwargs):
+        super().__init__(**kwargs)
+        self.model = model
+        self.min_confidence = Config.RISK_MODEL_MIN_CONFIDENCE if min_confidence is None else min_confidence
+
+    def score(self, sensor_data):
+        """
+        Analyse locale au format de RiskScorer.score ; "local_ambigu" vaut True
+        si la confiance du modèle est sous Config.RISK_MODEL_MIN_CONFIDENCE
+        """
+        result = super().score(sensor_data)
+        field_scores = self.field_scores(sensor_data)
+        prediction = self.model.predict_one(sensor_data, field_scores)
+        result.update(prediction)
+        del result["probabilites"]
+        result["message_vocal"] = self._vocal_message(
+            result["niveau_risque"], result["facteurs_risque"], result["recommandations"]
+        )
+        result["local_ambigu"] = (
+            prediction["confiance"] < self.min_confidence or not field_scores
+        )
+        return result
+
+    def _vocal_message(self, level, factors, recommendations):
+        if not factors and level != "FAIBLE":
+            # Niveau appris sans facteur au-delà des seuils
+            return f"Risque respiratoire {level.lower()} estimé d'après vos relevés. {recommendations[0]}."
+        return super()._vocal_message(level, factors, recommendations)
+
+
+def main():
+    from training_stats import load_or_build_stats
+    stats, _ = load_or_build_stats(Config.TRAINING_DATA_PATH)
+    model = load_or_train_risk_model(Config.TRAINING_DATA_PATH, stats["csv_hash"], refresh=True)
+    print(json.dumps(model.info, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Routage des analyses entre plusieurs modèles OpenRouter
+
+- les relevés à faible risque (score local sous Config.ROUTING_FAST_MAX_SCORE,
+  non ambigus) partent vers un modèle rapide et peu coûteux
+- les relevés à risque ou ambigus partent vers le modèle principal (Pro)
+- couverture (« hedging ») optionnelle : si le premier modèle n'a pas répondu
+  dans son budget de latence p95, une seconde requête part vers le modèle de
+  secours et la première réponse obtenue est retenue
+
+Latence et coût sont suivis par modèle pour ajuster les seuils de routage.
+"""
+import threading
+from collections import deque
+import numpy as np
+from config import Config
+
+
+class ModelStats:
+    """
+    Latences récentes, jetons et coût d'un modèle
+    """
+
+    def __init__(self, window=None):
+        self.latencies = deque(maxlen=window or Config.ROUTING_LATENCY_WINDOW)
+        self.requests = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+
+    def record(self, model, latency, usage):
+        self.requests += 1
+        self.latencies.append(latency)
+        if usage:
+            prompt_tokens = usage.get("prompt_tokens", 0) or 0
+            completion_tokens = usage.get("completion_tokens", 0) or 0
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            # OpenRouter renvoie le coût réel ; à défaut, estimation d'après Config.MODEL_PRICING
+            cost = usage.get("cost")
+            if cost is None:
+                cost = estimate_cost(model, prompt_tokens, completion_tokens)
+            self.cost += cost
+
+    def percentile(self, q):
+        if not self.latencies:
+            return None
+        return float(np.percentile(np.fromiter(self.latencies, dtype=np.float64), q))
+
+    def stats(self):
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost_usd": round(self.cost, 6),
+            "cost_per_request_usd": round(self.cost / self.requests, 6) if self.requests else 0.0
+        }
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """
+    Coût estimé (USD) d'après les tarifs par million de jetons de Config.MODEL_PRICING
+    """
+    pricing = Config.MODEL_PRICING.get(model)
+    if not pricing:
+        return 0.0
+    return (prompt_tokens * pricing["input"] + completion_tokens * pricing["output"]) / 1_000_000
+
+
+class ModelRouter:
+    """
+    Choix du modèle par analyse et budget de couverture
+    """
+
+    def __init__(self, primary_model=None, fast_model=None, hedge_model=None):
+        self.primary_model = primary_model or Config.GEMINI_MODEL
+        self.fast_model = fast_model or Config.FAST_MODEL
+        self.hedge_model = hedge_model or Config.HEDGE_MODEL
+        self.models = {}
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def choose(self, local, ambiguous):
+        """
+        Modèle à utiliser d'après le score local du relevé
+        """
+        if not Config.ROUTING_ENABLED:
+            return self.primary_model
+        if ambiguous or local["score_risque"] >= Config.ROUTING_FAST_MAX_SCORE:
+            return self.primary_model
+        return self.fast_model
+
+    def fallback_for(self, model):
+        """
+        Modèle de secours pour la couverture (None si la couverture est inactive)
+        """
+        if not Config.HEDGE_ENABLED:
+            return None
+        fallback = self.hedge_model or (self.fast_model if model == self.primary_model else self.primary_model)
+        return fallback if fallback != model else None
+
+    def hedge_delay(self, model):
+        """
+        Délai avant la requête de couverture : p95 observé du modèle,
+        ou Config.HEDGE_DELAY tant que l'échantillon est trop petit
+        """
+        stats = self.models.get(model)
+        if stats is None or len(stats.latencies) < Config.HEDGE_MIN_SAMPLES:
+            return Config.HEDGE_DELAY
+        return stats.percentile(95)
+
+    def record(self, model, latency, usage):
+        with self._lock:
+            self._stats_for(model).record(model, latency, usage)
+
+    def record_error(self, model):
+        with self._lock:
+            self._stats_for(model).errors += 1
+
+    def record_hedge(self, won):
+        with self._lock:
+            self.hedges += 1
+            if won:
+                self.hedge_wins += 1
+
+    def stats(self):
+        return {
+            "routing": Config.ROUTING_ENABLED,
+            "primary_model": self.primary_model,
+            "fast_model": self.fast_model,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "models": {model: stats.stats() for model, stats in self.models.items()}
+        }
+
+    def _stats_for(self, model):
+        stats = self.models.get(model)
+        if stats is None:
+            stats = self.models[model] = ModelStats()
+        return stats
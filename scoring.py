@@ -0,0 +1,344 @@
+import bisect
+import numpy as np
+from config import Config
+
+# Libellés et unités des champs de Config.THRESHOLDS
+FIELD_LABELS = {
+    "co2": ("CO2", "ppm"),
+    "pm25": ("PM2.5", "µg/m³"),
+    "no2": ("NO2", "µg/m³"),
+    "humidity": ("Humidité", "%"),
+    "temperature": ("Température", "°C"),
+    "pressure": ("Pression", "hPa")
+}
+
+# Polluants utilisés pour le score de qualité de l'air
+POLLUTANTS = ("co2", "pm25", "no2")
+
+# Maladies associées à chaque facteur
+FIELD_DISEASES = {
+    "co2": ["asthme"],
+    "pm25": ["asthme", "bronchite"],
+    "no2": ["asthme", "bronchite"],
+    "humidity": ["asthme", "rhinite"],
+    "temperature": ["bronchite"],
+    "pressure": ["asthme"],
+    "pollen": ["rhinite allergique", "asthme"]
+}
+
+# Recommandations par facteur : (valeur trop basse, valeur trop haute)
+FIELD_RECOMMENDATIONS = {
+    "co2": (None, "Aérez votre intérieur pour faire baisser le taux de CO2"),
+    "pm25": (None, "Limitez les activités extérieures et portez un masque filtrant"),
+    "no2": (None, "Évitez les axes à forte circulation"),
+    "humidity": ("Utilisez un humidificateur, l'air est trop sec", "Aérez et déshumidifiez, l'air est trop humide"),
+    "temperature": ("Couvrez-vous, l'air froid irrite les voies respiratoires", "Restez au frais et hydratez-vous"),
+    "pressure": ("Soyez attentif aux changements de temps", "Soyez attentif aux changements de temps"),
+    "pollen": (None, "Fermez les fenêtres et gardez votre traitement antiallergique à portée de main")
+}
+
+RISK_LEVELS = ((25, "FAIBLE"), (50, "MODÉRÉ"), (75, "ÉLEVÉ"))
+# Un facteur de confort (champ à plage normale) ne peut pas à lui seul rendre
+# le risque critique : son score reste sous la limite du niveau CRITIQUE
+COMFORT_MAX_SCORE = RISK_LEVELS[-1][0] - 1
+AIR_QUALITY_LEVELS = ((75, "Bon"), (50, "Modéré"), (25, "Air malsain"))
+
+
+def field_score(field, value, thresholds=None):
+    """
+    Score de risque (0-100) d'une mesure d'après Config.THRESHOLDS
+
+    - seuils croissants (normal / warning / danger) : 0 jusqu'à la moitié du seuil
+      normal, puis 25 / 50 / 75 aux seuils avec interpolation linéaire entre eux,
+      100 à 1,5 x le seuil de danger
+    - plages (min_normal / max_normal) : 0 dans la plage, puis croissant avec
+      l'écart rapporté à la demi-largeur de la plage
+    """
+    bands = (thresholds or Config.THRESHOLDS)[field]
+
+    if "danger" in bands:
+        points = (
+            (bands["normal"] / 2, 0),
+            (bands["normal"], 25),
+            (bands["warning"], 50),
+            (bands["danger"], 75),
+            (bands["danger"] * 1.5, 100)
+        )
+        if value <= bands["normal"] / 2:
+            return 0.0
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            if value <= x1:
+                return y0 + (y1 - y0) * (value - x0) / (x1 - x0)
+        return 100.0
+
+    low, high = bands["min_normal"], bands["max_normal"]
+    if low <= value <= high:
+        return 0.0
+    half_width = (high - low) / 2
+    distance = low - value if value < low else value - high
+    return min(float(COMFORT_MAX_SCORE), 25 + 50 * distance / half_width)
+
+
+def threshold_bounds(field, thresholds=None):
+    """
+    Bornes des plages d'un champ de Config.THRESHOLDS, par ordre croissant
+    """
+    bands = (thresholds or Config.THRESHOLDS)[field]
+    if "danger" in bands:
+        return (bands["normal"], bands["warning"], bands["danger"])
+    return (bands["min_normal"], bands["max_normal"])
+
+
+def threshold_band(field, value, thresholds=None):
+    """
+    Plage d'une mesure : nombre de bornes de threshold_bounds dépassées
+    (0 = sous le seuil normal, ou sous la plage pour les champs à plage)
+    """
+    return bisect.bisect_left(threshold_bounds(field, thresholds), value)
+
+
+def risk_level(score):
+    """
+    Niveau de risque (FAIBLE / MODÉRÉ / ÉLEVÉ / CRITIQUE) correspondant à un score
+    """
+    for limit, level in RISK_LEVELS:
+        if score < limit:
+            return level
+    return "CRITIQUE"
+
+
+def air_quality_level(score):
+    """
+    Libellé de qualité de l'air correspondant à un score (100 = air pur)
+    """
+    for limit, level in AIR_QUALITY_LEVELS:
+        if score >= limit:
+            return level
+    return "Dangereux"
+
+
+def field_score_array(field, values, thresholds=None):
+    """
+    Version vectorisée de field_score (NaN pour les valeurs absentes)
+    """
+    bands = (thresholds or Config.THRESHOLDS)[field]
+    values = np.asarray(values, dtype=np.float64)
+
+    if "danger" in bands:
+        xp = (bands["normal"] / 2, bands["normal"], bands["warning"], bands["danger"], bands["danger"] * 1.5)
+        scores = np.interp(values, xp, (0, 25, 50, 75, 100))
+    else:
+        low, high = bands["min_normal"], bands["max_normal"]
+        distance = np.maximum(low - values, values - high)
+        scores = np.where(
+            distance > 0,
+            np.minimum(COMFORT_MAX_SCORE, 25 + 50 * distance / ((high - low) / 2)),
+            0.0
+        )
+    return np.where(np.isnan(values), np.nan, scores)
+
+
+def pollen_score_array(values):
+    """
+    Score vectorisé des niveaux de pollen (NaN si absent ou inconnu)
+    La correspondance n'est calculée qu'une fois par valeur distincte
+    """
+    uniques, inverse = np.unique(np.asarray(values, dtype=object).astype(str), return_inverse=True)
+    return pollen_lookup(uniques)[inverse.reshape(-1)]
+
+
+def pollen_lookup(labels):
+    """
+    Scores de pollen pour une liste de libellés distincts (NaN si inconnu)
+    """
+    return np.array(
+        [Config.POLLEN_SCORES.get(str(label).strip().lower(), np.nan) for label in labels],
+        dtype=np.float64
+    )
+
+
+def score_arrays(columns, thresholds=None):
+    """
+    Score vectorisé d'un lot de mesures, même règles que RiskScorer.score
+
+    Args:
+        columns (dict): Tableaux NumPy par champ (numériques, NaN si absent) ;
+            "pollen" contient les libellés ou des scores déjà calculés
+
+    Returns:
+        dict: Tableaux score_risque, niveau_risque, air_quality_score,
+        air_quality_level et facteur_principal
+    """
+    thresholds = thresholds or Config.THRESHOLDS
+    fields = [f for f in thresholds if f in columns]
+    size = len(next(iter(columns.values()))) if columns else 0
+
+    names = list(fields)
+    matrix = [field_score_array(f, columns[f], thresholds) for f in fields]
+    if "pollen" in columns:
+        names.append("pollen")
+        pollen = np.asarray(columns["pollen"])
+        matrix.append(pollen if pollen.dtype.kind == "f" else pollen_score_array(pollen))
+
+    if matrix:
+        scores = np.vstack(matrix)
+    else:
+        scores = np.full((1, size), np.nan)
+    present = ~np.isnan(scores)
+    filled = np.where(present, scores, -1.0)
+
+    highest = np.maximum(filled.max(axis=0), 0.0)
+    aggravating = (filled >= 50).sum(axis=0) - (highest >= 50)
+    total = np.minimum(100.0, highest + 10 * aggravating)
+    total = np.where(present.any(axis=0), total, 0.0)
+
+    level_labels = np.array([level for _, level in RISK_LEVELS] + ["CRITIQUE"])
+    levels = level_labels[np.searchsorted([limit for limit, _ in RISK_LEVELS], total, side="right")]
+
+    pollutant_rows = [i for i, name in enumerate(names) if name in POLLUTANTS]
+    if pollutant_rows:
+        pollutants = filled[pollutant_rows]
+        has_pollutant = present[pollutant_rows].any(axis=0)
+        air_quality = np.where(has_pollutant, np.round(100 - np.maximum(pollutants.max(axis=0), 0.0)), np.nan)
+    else:
+        air_quality = np.full(size, np.nan)
+    quality_labels = np.array(["Dangereux"] + [level for _, level in reversed(AIR_QUALITY_LEVELS)])
+    quality_limits = [limit for limit, _ in reversed(AIR_QUALITY_LEVELS)]
+    quality_levels = np.where(
+        np.isnan(air_quality),
+        None,
+        quality_labels[np.searchsorted(quality_limits, np.nan_to_num(air_quality), side="right")]
+    )
+
+    factor_names = np.array([""] + names if names else [""])
+    main_factor = np.where(highest >= 25, factor_names[filled.argmax(axis=0) + 1], "") if names else np.full(size, "")
+
+    return {
+        "score_risque": np.round(total).astype(np.int64),
+        "niveau_risque": levels,
+        "air_quality_score": air_quality,
+        "air_quality_level": quality_levels,
+        "facteur_principal": main_factor
+    }
+
+
+def _lower_first(label):
+    """
+    Met la première lettre en minuscule, sauf pour les sigles (CO2, PM2.5...)
+    """
+    if len(label) > 1 and label[1].isupper():
+        return label
+    return label[:1].lower() + label[1:]
+
+
+class RiskScorer:
+    """
+    Moteur de score déterministe basé sur Config.THRESHOLDS
+    Répond en quelques microsecondes, sans appel externe
+    """
+
+    def __init__(self, thresholds=None, ambiguity_margin=None):
+        self.thresholds = thresholds or Config.THRESHOLDS
+        self.ambiguity_margin = Config.LOCAL_AMBIGUITY_MARGIN if ambiguity_margin is None else ambiguity_margin
+
+    def field_scores(self, sensor_data):
+        """
+        Scores par champ pour les mesures connues et présentes
+        """
+        scores = {}
+        for field in self.thresholds:
+            value = sensor_data.get(field)
+            if isinstance(value, (int, float)):
+                scores[field] = field_score(field, value, self.thresholds)
+
+        pollen = sensor_data.get("pollen")
+        if isinstance(pollen, str) and pollen.strip().lower() in Config.POLLEN_SCORES:
+            scores["pollen"] = float(Config.POLLEN_SCORES[pollen.strip().lower()])
+        return scores
+
+    def score(self, sensor_data):
+        """
+        Analyse locale complète, au format de RespirIAModel.analyze_environment
+
+        Returns:
+            dict: Analyse avec "source": "local", "local_ambigu" indiquant si le
+            score est trop proche d'une limite de niveau pour être fiable
+        """
+        scores = self.field_scores(sensor_data)
+
+        if scores:
+            highest = max(scores.values())
+            # Chaque autre facteur significatif aggrave le risque
+            aggravating = sum(1 for s in scores.values() if s >= 50) - (1 if highest >= 50 else 0)
+            total = min(100.0, highest + 10 * aggravating)
+        else:
+            total = 0.0
+
+        pollutant_scores = [scores[f] for f in POLLUTANTS if f in scores]
+        air_quality_score = round(100 - max(pollutant_scores)) if pollutant_scores else None
+
+        level = risk_level(total)
+        factors = []
+        diseases = []
+        recommendations = []
+        for field, value_score in sorted(scores.items(), key=lambda item: -item[1]):
+            if value_score < 25:
+                continue
+            factors.append(self._describe_factor(field, sensor_data[field], value_score))
+            for disease in FIELD_DISEASES[field]:
+                if disease not in diseases:
+                    diseases.append(disease)
+            recommendation = self._recommendation(field, sensor_data[field])
+            if recommendation and recommendation not in recommendations:
+                recommendations.append(recommendation)
+
+        if not recommendations:
+            recommendations.append("Les conditions sont bonnes, aucune précaution particulière")
+
+        return {
+            "niveau_risque": level,
+            "score_risque": round(total),
+            "maladies_concernees": diseases,
+            "facteurs_risque": factors,
+            "recommandations": recommendations,
+            "message_vocal": self._vocal_message(level, factors, recommendations),
+            "previsions": None,
+            "air_quality_score": air_quality_score,
+            "air_quality_level": air_quality_level(air_quality_score) if air_quality_score is not None else None,
+            "source": "local",
+            "local_ambigu": not scores or self._is_ambiguous(total)
+        }
+
+    def _is_ambiguous(self, total):
+        """
+        Un score proche d'une limite de niveau est considéré comme ambigu
+        """
+        return any(abs(total - limit) < self.ambiguity_margin for limit, _ in RISK_LEVELS)
+
+    def _describe_factor(self, field, value, value_score):
+        if field == "pollen":
+            label, display = "Pollen", str(value)
+        else:
+            name, unit = FIELD_LABELS[field]
+            bands = self.thresholds[field]
+            if "min_normal" in bands and value < bands["min_normal"]:
+                label = f"{name} basse" if field != "humidity" else "Humidité faible"
+            else:
+                label = f"{name} élevé" if field in POLLUTANTS else f"{name} élevée"
+            display = f"{value:g} {unit}" if unit != "%" else f"{value:g}%"
+        impact = "élevé" if value_score >= 75 else "modéré" if value_score >= 50 else "faible"
+        return {"facteur": label, "valeur": display, "impact": impact}
+
+    def _recommendation(self, field, value):
+        too_low, too_high = FIELD_RECOMMENDATIONS[field]
+        bands = self.thresholds.get(field, {})
+        if "min_normal" in bands and value < bands["min_normal"]:
+            return too_low
+        return too_high
+
+    def _vocal_message(self, level, factors, recommendations):
+        if not factors:
+            return "Risque respiratoire faible. La qualité de l'air est bonne."
+        causes = ", ".join(_lower_first(f["facteur"]) for f in factors[:2])
+        return (f"Risque respiratoire {level.lower()} détecté : {causes}. "
+                f"{recommendations[0]}.")
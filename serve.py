@@ -0,0 +1,94 @@
+"""
+Lancement de l'API en production sur plusieurs processus (workers)
+
+- les artefacts d'entraînement (statistiques, index des cas similaires)
+  sont construits une seule fois dans le processus parent : les workers
+  les rechargent sans relire le CSV
+- avec gunicorn (si installé), l'application est préchargée avant le fork
+  (--preload) : le modèle et son contexte d'entraînement sont partagés en
+  copie-sur-écriture ; sinon, uvicorn lance ses propres workers
+- au-delà d'un worker, le cache des analyses est en SQLite (CACHE_BACKEND)
+  afin que tous les workers partagent les mêmes entrées ; les messages
+  vocaux sont déjà partagés sur disque (AUDIO_OUTPUT_DIR)
+
+Usage :
+    python serve.py --workers 4 --port 8000
+"""
+import argparse
+import gc
+import os
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Lancement de l'API RespirIA (plusieurs workers)")
+    parser.add_argument("--workers", type=int, help="Nombre de processus (WEB_CONCURRENCY, ou nombre de cœurs)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--timeout", type=int, default=120, help="Délai avant redémarrage d'un worker bloqué (gunicorn)")
+    parser.add_argument("--no-gunicorn", action="store_true", help="Utiliser les workers uvicorn même si gunicorn est installé")
+    return parser.parse_args()
+
+
+def prepare_artifacts(config):
+    """
+    Construit (ou vérifie) les artefacts d'entraînement avant le lancement des workers
+    """
+    from training_stats import load_or_build_stats
+    stats, _ = load_or_build_stats(config.TRAINING_DATA_PATH)
+    if config.RETRIEVAL_K > 0:
+        from retrieval import load_or_build_index
+        load_or_build_index(config.TRAINING_DATA_PATH, stats["csv_hash"])
+    if config.RISK_MODEL_ENABLED:
+        from risk_model import load_or_train_risk_model
+        load_or_train_risk_model(config.TRAINING_DATA_PATH, stats["csv_hash"], refresh=True)
+
+
+def run_gunicorn(args, workers):
+    from gunicorn.app.base import BaseApplication
+
+    class RespirIAApplication(BaseApplication):
+        def load_config(self):
+            for key, value in {
+                "bind": f"{args.host}:{args.port}",
+                "workers": workers,
+                "worker_class": "uvicorn.workers.UvicornWorker",
+                "preload_app": True,
+                "timeout": args.timeout
+            }.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            import api
+            # Objets chargés avant le fork exclus du ramasse-miettes : leurs
+            # pages mémoire restent partagées entre les workers
+            gc.freeze()
+            return api.app
+
+    RespirIAApplication().run()
+
+
+def main():
+    args = parse_args()
+    # Variables lues par config.py : à fixer avant son import (hérité par les workers)
+    if args.workers is not None:
+        os.environ["WEB_CONCURRENCY"] = str(args.workers)
+    from config import Config
+    workers = max(1, Config.WORKERS)
+    if workers > 1 and "CACHE_BACKEND" not in os.environ:
+        os.environ["CACHE_BACKEND"] = Config.CACHE_BACKEND = "sqlite"
+
+    prepare_artifacts(Config)
+
+    try:
+        if args.no_gunicorn:
+            raise ImportError
+        import gunicorn  # noqa: F401
+    except ImportError:
+        import uvicorn
+        uvicorn.run("api:app", host=args.host, port=args.port, workers=workers, log_level="warning")
+    else:
+        run_gunicorn(args, workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Regroupement des analyses identiques simultanées (« single-flight »)
+
+Quand plusieurs requêtes portant sur les mêmes mesures normalisées arrivent
+pendant qu'un appel au LLM est déjà en cours, elles attendent cet appel au
+lieu d'en déclencher un nouveau, et reçoivent toutes son résultat. Chaque
+appelant en reçoit une copie profonde : les listes (facteurs de risque,
+recommandations) complétées par l'un ne sont pas visibles des autres.
+"""
+import asyncio
+import copy
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Regroupement pour les appels synchrones (threads)
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, function):
+        """
+        Exécute function() une seule fois pour tous les appelants simultanés de même clé
+
+        Returns:
+            Copie du résultat de function(), propre à chaque appelant
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return copy.deepcopy(future.result())
+
+        try:
+            future.set_result(function())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return copy.deepcopy(future.result())
+
+    def stats(self):
+        return {"in_flight": len(self._calls), "calls": self.calls, "coalesced": self.coalesced}
+
+
+class AsyncSingleFlight:
+    """
+    Regroupement pour les appels asynchrones (boucle d'événements de l'API)
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key, function):
+        """
+        Attend le résultat de function() (coroutine), lancée une seule fois par clé
+
+        Returns:
+            Copie du résultat de function(), propre à chaque appelant
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(function())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+        # L'annulation d'un appelant (délai de batch dépassé) n'interrompt
+        # pas l'appel partagé attendu par les autres
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    def stats(self):
+        return {"in_flight": len(self._calls), "calls": self.calls, "coalesced": self.coalesced}
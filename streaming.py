@@ -0,0 +1,84 @@
+"""
+Outils pour l'analyse en streaming (Server-Sent Events)
+
+- lecture du flux SSE d'OpenRouter (format compatible OpenAI)
+- extraction incrémentale des champs JSON dès qu'ils sont complets, avant
+  la fin de la génération
+- formatage des événements SSE renvoyés au client
+"""
+import json
+import re
+
+# Champs émis dès qu'ils sont complets dans le JSON en cours de génération
+EARLY_FIELDS = ("niveau_risque", "score_risque")
+
+# Valeur JSON scalaire complète : chaîne fermée, ou nombre / booléen suivi d'un séparateur
+_VALUE_PATTERN = r'\s*:\s*("(?:[^"\\]|\\.)*"|-?\d+(?:\.\d+)?(?=\s*[,}\n])|true|false|null)'
+
+
+class IncrementalFieldExtractor:
+    """
+    Repère les champs scalaires d'un objet JSON reçu morceau par morceau
+    Chaque champ n'est émis qu'une fois, dès que sa valeur est complète
+    """
+
+    def __init__(self, fields=EARLY_FIELDS):
+        self.buffer = ""
+        self._patterns = {
+            field: re.compile(r'"' + re.escape(field) + r'"' + _VALUE_PATTERN)
+            for field in fields
+        }
+        # Position à partir de laquelle rechercher : une valeur ne peut pas
+        # commencer avant la fin du plus long nom de champ déjà reçu
+        self._scan_from = 0
+        self._margin = max((len(f) for f in fields), default=0) + 64
+
+    def feed(self, text):
+        """
+        Ajoute un morceau de texte
+
+        Returns:
+            dict: Champs nouvellement complets (vide si aucun)
+        """
+        self.buffer += text
+        found = {}
+        for field, pattern in list(self._patterns.items()):
+            match = pattern.search(self.buffer, self._scan_from)
+            if match:
+                found[field] = json.loads(match.group(1))
+                del self._patterns[field]
+        self._scan_from = max(0, len(self.buffer) - self._margin)
+        return found
+
+    @property
+    def done(self):
+        return not self._patterns
+
+
+def parse_sse_line(line):
+    """
+    Décode une ligne du flux SSE d'OpenRouter
+
+    Returns:
+        str | None: Morceau de texte généré, None pour les lignes sans contenu
+        (commentaires, lignes vides, [DONE])
+    """
+    if not line.startswith("data:"):
+        return None
+    data = line[len("data:"):].strip()
+    if not data or data == "[DONE]":
+        return None
+    chunk = json.loads(data)
+    if "error" in chunk:
+        raise RuntimeError(chunk["error"].get("message", str(chunk["error"])))
+    choices = chunk.get("choices") or []
+    if not choices:
+        return None
+    return (choices[0].get("delta") or {}).get("content") or None
+
+
+def format_sse(event, data):
+    """
+    Formate un événement Server-Sent Events
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -121,6 +121,12 @@ def test_analyze_with_audio():
     
     assert response.status_code == 200, "Erreur lors de l'analyse avec audio"
     assert "audio_url" in result, "URL audio manquante"
+    assert "audio_status_url" in result, "URL d'état audio manquante"
+    
+    # L'audio est généré en arrière-plan : vérifier l'état du job
+    status = requests.get(f"{API_URL}{result['audio_status_url']}").json()
+    print(f"État de l'audio : {status['status']}")
+    assert status["status"] in ("pending", "ready"), "Échec de la génération audio"
     
     print(f"\n✓ Test réussi")
     print(f"Audio disponible à : {API_URL}{result['audio_url']}")
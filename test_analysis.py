@@ -0,0 +1,125 @@
+"""
+Tests du parcours d'analyse de main.py (LLM remplacé par une fonction locale) :
+cache, regroupement des requêtes identiques entre appareils, réutilisation
+du résultat précédent, journal des verdicts et validation par élément des
+analyses en batch
+
+Usage :
+    python -m pytest -q test_analysis.py
+"""
+import asyncio
+import json
+import pytest
+from api import validate_sensor_data
+from change_detection import ChangeDetector
+from config import Config
+from main import RespirIAModel
+
+READING = {"temperature": 24.0, "humidity": 55.0, "co2": 1400.0, "pm25": 42.0}
+LLM_RESULT = {
+    "niveau_risque": "ÉLEVÉ",
+    "score_risque": 68,
+    "facteurs_risque": ["CO2 élevé"],
+    "recommandations": ["Aérer la pièce"],
+    "message_vocal": "Aérez la pièce.",
+    "previsions": "Risque stable."
+}
+
+
+@pytest.fixture
+def model(monkeypatch, tmp_path):
+    for name, value in {
+        "OPENROUTER_API_KEY": "test", "ANALYSIS_MODE": "llm", "CACHE_ENABLED": True,
+        "CACHE_BACKEND": "memory", "CHANGE_DETECTION": False, "COALESCE_REQUESTS": True,
+        "TIMESERIES_ENABLED": True, "VERDICT_LOG_ENABLED": True,
+        "VERDICT_LOG_PATH": str(tmp_path / "llm_verdicts.jsonl")
+    }.items():
+        monkeypatch.setattr(Config, name, value)
+    model = RespirIAModel()
+    model.llm_calls = 0
+
+    async def complete_hedged(headers, payload):
+        model.llm_calls += 1
+        await asyncio.sleep(0.05)
+        return json.dumps(LLM_RESULT, ensure_ascii=False), payload["model"]
+
+    model._complete_hedged = complete_hedged
+    return model
+
+
+def warm_up(model, devices):
+    """
+    Historique de plusieurs relevés (valeurs distinctes) pour chaque appareil
+    """
+    async def run():
+        for step in range(Config.TIMESERIES_MIN_POINTS + 2):
+            for device in devices:
+                await model.analyze_environment_async({
+                    **READING, "pm25": 5.0 + 10 * step, "user_id": device,
+                    "timestamp": f"2026-01-01T10:{step:02d}:00"
+                })
+    asyncio.run(run())
+
+
+def test_identical_readings_coalesce_across_warmed_up_devices(model):
+    devices = [f"appareil-{i}" for i in range(10)]
+    warm_up(model, devices)
+    calls = model.llm_calls
+
+    async def burst():
+        return await asyncio.gather(*(
+            model.analyze_environment_async({**READING, "user_id": device, "timestamp": "2026-01-01T11:00:00"})
+            for device in devices
+        ))
+
+    logged = model.verdicts.logged
+    results = asyncio.run(burst())
+    assert model.llm_calls == calls + 1
+    # Un seul verdict journalisé pour l'appel partagé
+    assert model.verdicts.logged == logged + 1
+    assert all(result["niveau_risque"] == "ÉLEVÉ" for result in results)
+    # Tendances propres à chaque appareil, ajoutées après le résultat partagé
+    assert all(result["tendances"]["releves"] > Config.TIMESERIES_MIN_POINTS for result in results)
+    results[0]["facteurs_risque"].append("modifié")
+    assert results[1]["facteurs_risque"] == ["CO2 élevé"]
+
+
+def test_identical_readings_hit_the_cache_across_warmed_up_devices(model):
+    devices = ["appareil-a", "appareil-b"]
+    warm_up(model, devices)
+    calls = model.llm_calls
+
+    async def one(device):
+        return await model.analyze_environment_async({**READING, "user_id": device})
+
+    logged = model.verdicts.logged
+    first = asyncio.run(one("appareil-a"))
+    second = asyncio.run(one("appareil-b"))
+    assert model.llm_calls == calls + 1
+    assert model.verdicts.logged == logged + 1
+    assert first["source"] == "llm"
+    assert second["source"] == "cache"
+    assert second["tendances"]["releves"] == first["tendances"]["releves"]
+
+
+def test_reused_result_is_reported_as_reuse(model):
+    model.changes = ChangeDetector()
+    reading = {**READING, "user_id": "appareil-r"}
+
+    first = asyncio.run(model.analyze_environment_async(dict(reading)))
+    second = asyncio.run(model.analyze_environment_async(dict(reading)))
+    assert first["source"] == "llm"
+    assert second["source"] == "reuse"
+    assert second["reutilise"] is True
+    assert model.llm_calls == 1
+    assert model.verdicts.logged == 1
+
+
+def test_invalid_batch_item_fails_only_in_its_own_slot(model):
+    batch = [dict(READING), {**READING, "co2": "beaucoup"}, "relevé", {**READING, "pm25": 12.0}]
+    results = asyncio.run(model.analyze_batch_async(batch, validate=validate_sensor_data))
+
+    assert [result["success"] for result in results] == [True, False, False, True]
+    assert results[1]["index"] == 1 and "co2" in results[1]["erreur"]
+    assert results[2]["index"] == 2
+    assert model.llm_calls == 2
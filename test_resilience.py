@@ -0,0 +1,261 @@
+"""
+Tests de resilience.py : nouvelles tentatives, disjoncteur et seau à jetons
+
+Usage :
+    python -m pytest -q test_resilience.py
+"""
+import asyncio
+import httpx
+import pytest
+import requests
+import resilience
+from config import Config
+from resilience import (
+    CircuitBreaker, TokenBucket, UpstreamError, UpstreamGuard, UpstreamUnavailable, is_retryable
+)
+
+
+class FakeClock:
+    """
+    Remplace time.monotonic dans resilience.py
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    delays = []
+    monkeypatch.setattr(resilience.time, "sleep", delays.append)
+    monkeypatch.setattr(resilience.random, "uniform", lambda low, high: high)
+    return delays
+
+
+@pytest.mark.parametrize("error", [
+    httpx.ConnectError("refusé"),
+    httpx.ReadTimeout("délai"),
+    httpx.RemoteProtocolError("connexion fermée"),
+    requests.ConnectionError("refusé"),
+    requests.Timeout("délai"),
+    ConnectionResetError(),
+    TimeoutError(),
+    UpstreamError(429, "quota"),
+    UpstreamError(503, "indisponible")
+])
+def test_transient_errors_are_retryable(error):
+    assert is_retryable(error)
+
+
+@pytest.mark.parametrize("error", [
+    UpstreamError(400, "requête invalide"),
+    UpstreamError(401, "clé invalide"),
+    UpstreamUnavailable("disjoncteur ouvert"),
+    ValueError("JSON invalide"),
+    KeyError("choices"),
+    TypeError("bogue"),
+    RuntimeError("bogue"),
+    httpx.HTTPStatusError("500", request=None, response=None)
+])
+def test_other_errors_are_not_retryable(error):
+    assert not is_retryable(error)
+
+
+def test_breaker_opens_on_error_rate_then_probes(clock):
+    breaker = CircuitBreaker(error_rate=0.5, min_calls=4, window=30, cooldown=10)
+    for success in (True, False, True):
+        breaker.record(success)
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.trips == 1
+    assert not breaker.allow()
+
+    # Après le refroidissement, un seul appel d'essai à la fois
+    clock.now += 10
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_breaker_reopens_when_probe_fails(clock):
+    breaker = CircuitBreaker(error_rate=0.5, min_calls=1, window=30, cooldown=10)
+    breaker.record(False)
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.trips == 2
+    clock.now += 5
+    assert not breaker.allow()
+
+
+def test_breaker_release_frees_the_probe(clock):
+    breaker = CircuitBreaker(error_rate=0.5, min_calls=1, window=30, cooldown=10)
+    breaker.record(False)
+    clock.now += 10
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_breaker_forgets_outcomes_outside_the_window(clock):
+    breaker = CircuitBreaker(error_rate=0.5, min_calls=2, window=30, cooldown=10)
+    breaker.record(False)
+    clock.now += 31
+    breaker.record(True)
+    breaker.record(True)
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_token_bucket_burst_then_rate(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    assert [bucket.reserve(max_wait=0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve(max_wait=0.1) is None
+    # Jeton réservé : l'appelant attend qu'il soit produit (1 / débit)
+    assert bucket.reserve(max_wait=1) == pytest.approx(0.5)
+    assert bucket.reserve(max_wait=1) == pytest.approx(1.0)
+    clock.now += 10
+    assert bucket.tokens < 0
+    assert bucket.reserve(max_wait=0) == 0.0
+    assert bucket.tokens == pytest.approx(2.0)
+
+
+def test_token_bucket_disabled_without_rate():
+    bucket = TokenBucket(rate=0)
+    assert all(bucket.reserve(max_wait=0) == 0.0 for _ in range(100))
+
+
+def test_guard_retries_transient_errors(monkeypatch, clock, no_sleep):
+    monkeypatch.setattr(Config, "RETRY_ATTEMPTS", 2)
+    guard = UpstreamGuard()
+    outcomes = [httpx.ConnectError("refusé"), UpstreamError(503, "indisponible"), "ok"]
+
+    def call():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert guard.call(call) == "ok"
+    assert guard.retries == 2
+    assert no_sleep == [Config.RETRY_BASE_DELAY, Config.RETRY_BASE_DELAY * 2]
+
+
+def test_guard_gives_up_after_retry_attempts(monkeypatch, clock, no_sleep):
+    monkeypatch.setattr(Config, "RETRY_ATTEMPTS", 1)
+    guard = UpstreamGuard()
+    calls = []
+
+    def call():
+        calls.append(1)
+        raise httpx.ReadTimeout("délai")
+
+    with pytest.raises(httpx.ReadTimeout):
+        guard.call(call)
+    assert len(calls) == 2
+
+
+def test_guard_does_not_retry_other_errors(clock, no_sleep):
+    guard = UpstreamGuard()
+    calls = []
+
+    def call():
+        calls.append(1)
+        raise ValueError("JSON invalide")
+
+    with pytest.raises(ValueError):
+        guard.call(call)
+    assert len(calls) == 1
+    assert guard.retries == 0
+    # Erreur non transitoire : non comptée par le disjoncteur
+    assert not guard.breaker._outcomes
+
+
+def test_guard_honours_retry_after(monkeypatch, clock, no_sleep):
+    monkeypatch.setattr(Config, "RETRY_ATTEMPTS", 1)
+    guard = UpstreamGuard()
+    outcomes = [UpstreamError(429, "quota", retry_after=3), "ok"]
+
+    def call():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert guard.call(call) == "ok"
+    assert no_sleep == [3]
+
+
+def test_guard_rejects_calls_while_breaker_is_open(monkeypatch, clock, no_sleep):
+    monkeypatch.setattr(Config, "RETRY_ATTEMPTS", 0)
+    guard = UpstreamGuard()
+    guard.breaker = CircuitBreaker(error_rate=0.5, min_calls=1, window=30, cooldown=10)
+
+    def call():
+        raise httpx.ConnectError("refusé")
+
+    with pytest.raises(httpx.ConnectError):
+        guard.call(call)
+    with pytest.raises(UpstreamUnavailable):
+        guard.call(lambda: "ok")
+    assert guard.rejected == 1
+    clock.now += 10
+    assert guard.call(lambda: "ok") == "ok"
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_guard_call_async_retries(monkeypatch, clock):
+    monkeypatch.setattr(Config, "RETRY_ATTEMPTS", 1)
+    monkeypatch.setattr(Config, "RETRY_BASE_DELAY", 0)
+    guard = UpstreamGuard()
+    outcomes = [httpx.ConnectTimeout("délai"), "ok"]
+
+    async def call():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert asyncio.run(guard.call_async(call)) == "ok"
+    assert guard.retries == 1
+
+
+def test_guard_call_async_cancelled_while_waiting_releases_the_probe(monkeypatch, clock):
+    guard = UpstreamGuard()
+    guard.breaker = CircuitBreaker(error_rate=0.5, min_calls=1, window=30, cooldown=10)
+    guard.breaker.record(False)
+    clock.now += 10
+    # Seau vide : l'appel d'essai doit attendre son jeton
+    monkeypatch.setattr(Config, "RATE_LIMIT_MAX_WAIT", 60)
+    guard.bucket = TokenBucket(rate=0.1, burst=1)
+    guard.bucket.reserve(max_wait=0)
+
+    async def call():
+        return "ok"
+
+    async def cancel_while_waiting():
+        task = asyncio.create_task(guard.call_async(call))
+        await asyncio.sleep(0)
+        assert guard.breaker.state == CircuitBreaker.HALF_OPEN
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_while_waiting())
+    # Appel d'essai libéré : le suivant peut sonder OpenRouter
+    assert guard.breaker.allow()
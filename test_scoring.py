@@ -0,0 +1,69 @@
+"""
+Tests de scoring.py : plafond des facteurs de confort sous le niveau CRITIQUE,
+même résultat pour le calcul scalaire et le calcul vectorisé
+
+Usage :
+    python -m pytest -q test_scoring.py
+"""
+import numpy as np
+import pytest
+from scoring import (
+    COMFORT_MAX_SCORE, RISK_LEVELS, RiskScorer, field_score, field_score_array, risk_level, score_arrays
+)
+
+CRITICAL_LIMIT = RISK_LEVELS[-1][0]
+
+
+def scalar_and_vectorized(sensor_data):
+    scalar = RiskScorer().score(sensor_data)
+    columns = {field: np.array([value], dtype=np.float64) for field, value in sensor_data.items()}
+    vectorized = score_arrays(columns)
+    return (
+        (scalar["niveau_risque"], scalar["score_risque"]),
+        (str(vectorized["niveau_risque"][0]), int(vectorized["score_risque"][0]))
+    )
+
+
+def test_comfort_cap_is_below_the_critical_limit():
+    assert COMFORT_MAX_SCORE == CRITICAL_LIMIT - 1
+    assert risk_level(COMFORT_MAX_SCORE) == "ÉLEVÉ"
+    assert risk_level(CRITICAL_LIMIT) == "CRITIQUE"
+
+
+@pytest.mark.parametrize("sensor_data", [
+    {"temperature": 30},
+    {"temperature": 60},
+    {"temperature": -20},
+    {"humidity": 75},
+    {"humidity": 100},
+    {"humidity": 0},
+    {"pressure": 900}
+])
+def test_comfort_field_alone_is_never_critical(sensor_data):
+    (field, value), = sensor_data.items()
+    assert field_score(field, value) == COMFORT_MAX_SCORE
+    assert field_score_array(field, [value])[0] == COMFORT_MAX_SCORE
+    assert scalar_and_vectorized(sensor_data) == (("ÉLEVÉ", COMFORT_MAX_SCORE),) * 2
+
+
+@pytest.mark.parametrize("field, value, expected", [
+    ("temperature", 26, 0.0),
+    ("temperature", 28, 50.0),
+    ("humidity", 70, 74.0),
+    ("humidity", 69, 70.0)
+])
+def test_comfort_scores_near_the_cap(field, value, expected):
+    assert field_score(field, value) == pytest.approx(expected)
+    assert field_score_array(field, [value])[0] == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("sensor_data, level", [
+    ({"co2": 1499}, "ÉLEVÉ"),
+    ({"co2": 1500}, "CRITIQUE"),
+    ({"pm25": 55}, "CRITIQUE"),
+    ({"humidity": 100, "temperature": 10}, "CRITIQUE")  # deux facteurs significatifs
+])
+def test_pollutants_and_combined_factors_can_still_be_critical(sensor_data, level):
+    scalar, vectorized = scalar_and_vectorized(sensor_data)
+    assert scalar == vectorized
+    assert scalar[0] == level
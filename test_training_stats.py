@@ -0,0 +1,202 @@
+"""
+Tests de training_stats.py : statistiques calculées par blocs comparées au
+calcul pandas en une passe, uniformité de l'échantillonnage par réservoir,
+empreinte du CSV reprise du manifeste et écriture atomique de l'artefact
+
+Usage :
+    python -m pytest -q test_training_stats.py
+"""
+import math
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import training_stats
+from config import Config
+from training_stats import (
+    CSV_DTYPES, NUMERIC_COLUMNS, QUANTILES, STATS_VERSION, TrainingStatsAccumulator,
+    cached_file_hash, compute_training_stats, compute_training_stats_from_csv, file_hash,
+    load_or_build_stats, read_training_chunks, reservoir_positions
+)
+
+
+def reference_shares(series):
+    counts = series.dropna().astype(str).value_counts()
+    total = counts.sum()
+    ordered = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    return {value: round(count / total, 3) for value, count in ordered}
+
+
+def reference_stats(df):
+    """
+    Statistiques calculées par pandas sur le DataFrame complet
+    """
+    numeric = [c for c in NUMERIC_COLUMNS if c in df.columns]
+    severity = df["severite"].map(Config.SEVERITY_ORDER).astype(np.float64)
+    diseases = {}
+    for disease, group in df.groupby("maladie", sort=True):
+        features, correlations = {}, {}
+        for column in numeric:
+            values = group[column].dropna()
+            if values.empty:
+                continue
+            quantiles = values.quantile(QUANTILES)
+            features[column] = {
+                "mean": round(float(values.mean()), 3),
+                "std": round(float(values.std()), 3) if len(values) > 1 else 0.0,
+                **{f"p{int(q * 100)}": round(float(quantiles[q]), 3) for q in QUANTILES}
+            }
+            r = group[column].corr(severity.loc[group.index])
+            if r == r:
+                correlations[column] = round(float(r), 3)
+        diseases[str(disease)] = {
+            "count": len(group),
+            "features": features,
+            "pollen": reference_shares(group["pollen"]),
+            "severite": reference_shares(group["severite"]),
+            "severity_correlation": correlations
+        }
+    return {
+        "version": STATS_VERSION,
+        "total": len(df),
+        "global_std": {c: round(float(df[c].std()), 3) for c in numeric},
+        "diseases": diseases
+    }
+
+
+def assert_close(actual, expected, path="stats"):
+    if isinstance(expected, dict):
+        assert isinstance(actual, dict) and set(actual) == set(expected), path
+        for key in expected:
+            assert_close(actual[key], expected[key], f"{path}.{key}")
+    elif isinstance(expected, float):
+        # Arrondi à 3 décimales : sommes et moyennes peuvent différer d'une unité
+        assert actual == pytest.approx(expected, abs=2e-3), path
+    else:
+        assert actual == expected, path
+
+
+def synthetic_training(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "maladie": rng.choice(["asthme", "bronchite", "grippe"], rows, p=[0.5, 0.3, 0.2]),
+        "temperature": rng.normal(37, 1.2, rows).round(1),
+        "humidity": rng.integers(20, 90, rows).astype(np.float64),
+        "co2": rng.normal(900, 250, rows).round(),
+        "pm25": rng.gamma(2, 15, rows).round(1),
+        "pollen": rng.choice(["faible", "moyen", "élevé"], rows),
+        "severite": rng.choice(list(Config.SEVERITY_ORDER), rows)
+    })
+    # Sévérité liée au CO2 pour des corrélations non nulles
+    df.loc[df["co2"] > 1100, "severite"] = "critique"
+    for column in ("temperature", "co2", "pollen", "severite"):
+        df.loc[rng.random(rows) < 0.05, column] = np.nan
+    return df
+
+
+def as_read(df):
+    """
+    Valeurs du DataFrame telles que relues depuis le CSV (float32, voir CSV_DTYPES)
+    """
+    df = df.copy()
+    for column in NUMERIC_COLUMNS:
+        df[column] = df[column].astype(np.float32).astype(np.float64)
+    return df
+
+
+def test_in_memory_stats_match_pandas():
+    df = synthetic_training(600)
+    assert_close(compute_training_stats(df), reference_stats(df))
+
+
+def test_training_csv_stats_match_pandas():
+    df = pd.read_csv(Config.TRAINING_DATA_PATH)
+    assert_close(compute_training_stats_from_csv(Config.TRAINING_DATA_PATH), reference_stats(as_read(df)))
+
+
+def test_multi_chunk_stats_match_pandas(tmp_path):
+    df = synthetic_training(6000, seed=1)
+    path = tmp_path / "training.csv"
+    df.to_csv(path, index=False)
+
+    chunks = list(read_training_chunks(str(path), memory_mb=1))
+    assert len(chunks) > 1
+    assert all(chunk[column].dtype == CSV_DTYPES[column] for chunk in chunks for column in NUMERIC_COLUMNS)
+    assert_close(compute_training_stats_from_csv(str(path), memory_mb=1), reference_stats(as_read(df)))
+
+
+def test_stats_do_not_depend_on_chunking():
+    df = synthetic_training(3000, seed=2)
+    whole = compute_training_stats(df)
+    accumulator = TrainingStatsAccumulator()
+    for start in range(0, len(df), 700):
+        accumulator.add(df.iloc[start:start + 700])
+    assert_close(accumulator.result(), whole)
+
+
+def run_reservoir(chunk_sizes, size, rng):
+    reservoir = np.full(size, -1)
+    seen = 0
+    for count in chunk_sizes:
+        positions, slots = reservoir_positions(seen, count, size, rng)
+        assert len(np.unique(slots)) == len(slots)
+        reservoir[slots] = seen + positions
+        seen += count
+    return reservoir[:min(seen, size)]
+
+
+def test_reservoir_keeps_everything_below_its_size():
+    rng = np.random.default_rng(0)
+    assert sorted(run_reservoir([3, 4, 2], 10, rng)) == list(range(9))
+
+
+def test_reservoir_sampling_is_uniform():
+    """
+    Chaque élément d'un flux de 60 (lots de tailles variées, dont un lot
+    plus grand que le réservoir) figure dans le réservoir de 12 avec une
+    probabilité 12 / 60
+    """
+    rng = np.random.default_rng(0)
+    size, chunk_sizes, trials = 12, [5, 20, 1, 9, 25], 20000
+    stream = sum(chunk_sizes)
+    counts = np.zeros(stream)
+    for _ in range(trials):
+        sample = run_reservoir(chunk_sizes, size, rng)
+        assert len(np.unique(sample)) == size
+        counts[sample] += 1
+
+    expected = trials * size / stream
+    sigma = math.sqrt(trials * size / stream * (1 - size / stream))
+    assert np.abs(counts - expected).max() < 5 * sigma
+    # Test du khi-deux (59 degrés de liberté, seuil à 0,1 % : 98,3)
+    assert ((counts - expected) ** 2 / expected).sum() < 98.3
+
+
+def test_csv_is_hashed_again_only_after_a_change(monkeypatch, tmp_path):
+    monkeypatch.setattr(Config, "TRAINING_STATS_DIR", str(tmp_path / "artefacts"))
+    path = tmp_path / "training.csv"
+    synthetic_training(200).to_csv(path, index=False)
+    hashed = []
+    monkeypatch.setattr(training_stats, "file_hash", lambda p: hashed.append(p) or file_hash(p))
+
+    first = cached_file_hash(str(path))
+    assert cached_file_hash(str(path)) == first
+    assert len(hashed) == 1
+
+    synthetic_training(200, seed=3).to_csv(path, index=False)
+    assert cached_file_hash(str(path)) == file_hash(str(path)) != first
+    assert len(hashed) == 2
+
+
+def test_stats_artifact_is_written_without_leftovers(monkeypatch, tmp_path):
+    directory = tmp_path / "artefacts"
+    monkeypatch.setattr(Config, "TRAINING_STATS_DIR", str(directory))
+    path = tmp_path / "training.csv"
+    synthetic_training(200).to_csv(path, index=False)
+
+    stats, loaded = load_or_build_stats(str(path))
+    assert not loaded
+    assert load_or_build_stats(str(path)) == (stats, True)
+    assert sorted(os.listdir(directory)) == [
+        training_stats.HASH_MANIFEST, f"training_stats_{stats['csv_hash'][:16]}.json"
+    ]
@@ -0,0 +1,318 @@
+"""
+Historique récent des relevés par appareil (user_id / location)
+
+Les relevés sont conservés dans des tampons circulaires NumPy préalloués :
+la mémoire est bornée par Config.TIMESERIES_WINDOW x Config.TIMESERIES_MAX_DEVICES
+(environ 2 Ko par appareil avec une fenêtre de 60 relevés, soit ~200 Mo pour
+100 000 appareils). Pour chaque appareil et chaque champ, les sommes
+glissantes (n, Σt, Σt², Σy, Σty) sont mises à jour en O(1) à chaque relevé :
+moyenne, pente (régression linéaire), dernier franchissement de seuil et
+prévision s'en déduisent sans parcourir l'historique.
+"""
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+import numpy as np
+from config import Config
+from scoring import FIELD_LABELS, threshold_bounds
+
+SERIES_FIELDS = tuple(Config.THRESHOLDS)
+
+# Indices des sommes glissantes
+_N, _ST, _STT, _SY, _STY = range(5)
+
+# Tableaux indexés par appareil : (forme par appareil, type, valeur initiale)
+_ARRAYS = {
+    "values": (lambda w, f: (w, f), np.float32, np.nan),  # relevés
+    "offsets": (lambda w, f: (w,), np.float32, np.nan),  # instants, relatifs à base
+    "base": (lambda w, f: (), np.float64, 0.0),
+    "head": (lambda w, f: (), np.int32, 0),  # prochaine position d'écriture
+    "count": (lambda w, f: (), np.int32, 0),
+    "since_rebase": (lambda w, f: (), np.int32, 0),
+    "sums": (lambda w, f: (5, f), np.float64, 0.0),
+    "band": (lambda w, f: (f,), np.int8, -1),  # plage de seuils du dernier relevé
+    "crossed_at": (lambda w, f: (f,), np.float64, np.nan)  # dernier changement de plage
+}
+
+
+def device_key(sensor_data):
+    """
+    Identifiant de l'appareil d'un relevé (None si ni user_id ni location)
+    """
+    user_id, location = sensor_data.get("user_id"), sensor_data.get("location")
+    if not user_id and not location:
+        return None
+    return f"{user_id or ''}|{location or ''}"
+
+
+def reading_time(sensor_data):
+    """
+    Instant du relevé (champ timestamp ISO 8601), ou instant de réception
+    """
+    timestamp = sensor_data.get("timestamp")
+    if timestamp:
+        try:
+            return datetime.fromisoformat(str(timestamp).replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            pass
+    return time.time()
+
+
+class DeviceSeriesStore:
+    """
+    Tampons circulaires des derniers relevés de chaque appareil
+    """
+
+    def __init__(self, window=None, max_devices=None, fields=SERIES_FIELDS):
+        self.window = window or Config.TIMESERIES_WINDOW
+        self.max_devices = max_devices or Config.TIMESERIES_MAX_DEVICES
+        self.fields = tuple(fields)
+        self._bounds = [threshold_bounds(field) for field in self.fields]
+        self._rows = OrderedDict()  # clé -> ligne, du moins au plus récemment observé
+        self._lock = threading.Lock()
+        self._capacity = 0
+        self._grow(min(1024, self.max_devices))
+
+    def __len__(self):
+        return len(self._rows)
+
+    def observe(self, sensor_data):
+        """
+        Ajoute un relevé à l'historique de son appareil
+
+        Returns:
+            dict | None: Indicateurs de tendance (voir features), None sans appareil identifié
+        """
+        key = device_key(sensor_data)
+        if key is None:
+            return None
+        values = [sensor_data.get(field) for field in self.fields]
+        values = np.array(
+            [v if isinstance(v, (int, float)) else np.nan for v in values], dtype=np.float32
+        )
+        with self._lock:
+            row = self._row_for(key)
+            self._append(row, values, reading_time(sensor_data))
+            return self._features(row, key)
+
+    def features_for(self, sensor_data):
+        """
+        Indicateurs de tendance de l'appareil d'un relevé, sans l'ajouter
+        """
+        key = device_key(sensor_data)
+        with self._lock:
+            row = self._rows.get(key)
+            return self._features(row, key) if row is not None else None
+
+    def memory_bytes(self):
+        return sum(getattr(self, name).nbytes for name in _ARRAYS)
+
+    def stats(self):
+        return {
+            "devices": len(self),
+            "capacity": self._capacity,
+            "window": self.window,
+            "memory_mb": round(self.memory_bytes() / 1e6, 1)
+        }
+
+    def _grow(self, capacity):
+        for name, (shape, dtype, fill) in _ARRAYS.items():
+            array = np.full((capacity,) + shape(self.window, len(self.fields)), fill, dtype=dtype)
+            if self._capacity:
+                array[:self._capacity] = getattr(self, name)
+            setattr(self, name, array)
+        self._capacity = capacity
+
+    def _row_for(self, key):
+        row = self._rows.get(key)
+        if row is not None:
+            self._rows.move_to_end(key)
+            return row
+
+        if len(self._rows) < self.max_devices:
+            if len(self._rows) == self._capacity:
+                self._grow(min(self._capacity * 2, self.max_devices))
+            row = len(self._rows)
+        else:
+            # Capacité atteinte : l'appareil resté muet le plus longtemps est oublié (O(1))
+            _, row = self._rows.popitem(last=False)
+            for name, (_, _, fill) in _ARRAYS.items():
+                getattr(self, name)[row] = fill
+        self._rows[key] = row
+        return row
+
+    def _append(self, row, values, timestamp):
+        window = self.window
+        count = self.count[row]
+        last = (self.head[row] - 1) % window
+        if count and timestamp < self.base[row] + self.offsets[row, last]:
+            return  # relevé plus ancien que le dernier reçu : ignoré
+
+        if count == 0:
+            self.base[row] = timestamp
+        head = self.head[row]
+        if count == window:
+            # Le plus ancien relevé sort de la fenêtre
+            self._accumulate(row, self.offsets[row, head], self.values[row, head], -1)
+        else:
+            self.count[row] = count + 1
+
+        offset = np.float32(timestamp - self.base[row])
+        self.values[row, head] = values
+        self.offsets[row, head] = offset
+        # Sommes calculées sur les valeurs float32 stockées : le retrait est exact
+        self._accumulate(row, offset, values, 1)
+        self.head[row] = (head + 1) % window
+
+        self.since_rebase[row] += 1
+        if self.since_rebase[row] >= window:
+            self._rebase(row)
+
+        bands = self.band[row]
+        for i, value in enumerate(values.tolist()):
+            if value != value:  # NaN : champ absent du relevé
+                continue
+            band = bisect.bisect_left(self._bounds[i], value)
+            if bands[i] >= 0 and band != bands[i]:
+                self.crossed_at[row, i] = timestamp
+            bands[i] = band
+
+    def _accumulate(self, row, offset, values, sign):
+        present = ~np.isnan(values)
+        y = np.where(present, values, 0).astype(np.float64)
+        t = float(offset)
+        sums = self.sums[row]
+        sums[_N] += sign * present
+        sums[_ST] += sign * t * present
+        sums[_STT] += sign * t * t * present
+        sums[_SY] += sign * y
+        sums[_STY] += sign * t * y
+
+    def _rebase(self, row):
+        """
+        Toutes les `window` insertions : instants recalés sur le plus ancien
+        relevé et sommes recalculées exactement (coût amorti O(1), pas de
+        dérive numérique des sommes glissantes)
+        """
+        offsets = self.offsets[row]
+        oldest = np.nanmin(offsets)
+        self.base[row] += float(oldest)
+        offsets -= oldest
+
+        t = offsets.astype(np.float64)[:, None]
+        values = self.values[row].astype(np.float64)
+        present = ~np.isnan(values) & ~np.isnan(t)
+        y = np.where(present, values, 0.0)
+        t = np.where(present, t, 0.0)
+        sums = self.sums[row]
+        sums[_N] = present.sum(axis=0)
+        sums[_ST] = t.sum(axis=0)
+        sums[_STT] = (t * t).sum(axis=0)
+        sums[_SY] = y.sum(axis=0)
+        sums[_STY] = (t * y).sum(axis=0)
+        self.since_rebase[row] = 0
+
+    def _features(self, row, key):
+        """
+        Moyenne, pente, franchissements et prévision de chaque champ (O(nombre de champs))
+        """
+        count = int(self.count[row])
+        if count == 0:
+            return None
+        horizon = Config.FORECAST_HORIZON
+        head = int(self.head[row])
+        last = (head - 1) % self.window
+        last_offset = float(self.offsets[row, last])
+        oldest = float(self.offsets[row, head if count == self.window else 0])
+
+        sums = self.sums[row]
+        n = sums[_N]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = sums[_SY] / n
+            denominator = n * sums[_STT] - sums[_ST] ** 2
+            slope = (n * sums[_STY] - sums[_ST] * sums[_SY]) / denominator
+            # Valeur de la droite de régression à l'instant du dernier relevé
+            fitted = mean + slope * (last_offset - sums[_ST] / n)
+        has_slope = (n >= Config.TIMESERIES_MIN_POINTS) & (denominator > 1e-9 * n * sums[_STT])
+
+        now = self.base[row] + last_offset
+        columns = zip(
+            self.fields, n.tolist(), mean.tolist(), slope.tolist(), fitted.tolist(), has_slope.tolist(),
+            self.values[row, last].tolist(), self.band[row].tolist(), self.crossed_at[row].tolist()
+        )
+        fields = {}
+        for i, (field, points, average, rate, value, trend, latest, band, crossed_at) in enumerate(columns):
+            if points == 0:
+                continue
+            entry = {"moyenne": round(average, 2), "points": int(points)}
+            if latest == latest:
+                entry["dernier"] = round(latest, 2)
+            if band >= 0:
+                entry["plage"] = band
+            if crossed_at == crossed_at:
+                entry["depuis_franchissement_s"] = round(now - crossed_at)
+            if trend:
+                entry["pente_par_min"] = round(rate * 60, 3)
+                entry["prevision"] = round(value + rate * horizon, 2)
+                eta = self._threshold_eta(i, value, rate)
+                if eta is not None:
+                    entry["seuil_suivant"], entry["eta_seuil_s"] = eta
+            fields[field] = entry
+
+        return {
+            "appareil": key,
+            "releves": count,
+            "duree_s": round(last_offset - oldest),
+            "horizon_s": horizon,
+            "champs": fields
+        }
+
+    def _threshold_eta(self, index, value, slope):
+        # Prochaine borne dans le sens de la pente et délai pour l'atteindre
+        bounds = self._bounds[index]
+        if slope > 0:
+            ahead = [b for b in bounds if b > value]
+            bound = ahead[0] if ahead else None
+        elif slope < 0:
+            behind = [b for b in bounds if b < value]
+            bound = behind[-1] if behind else None
+        else:
+            bound = None
+        if bound is None:
+            return None
+        return bound, round((bound - value) / slope)
+
+
+def forecast_text(trends):
+    """
+    Prévision en clair tirée des tendances (sans appel au LLM)
+
+    Returns:
+        str | None: Prévision, None si l'historique est trop court
+    """
+    if not trends:
+        return None
+    horizon = trends["horizon_s"]
+    alerts, moves = [], []
+    for field, entry in trends["champs"].items():
+        slope = entry.get("pente_par_min")
+        if slope is None:
+            continue
+        label, unit = FIELD_LABELS.get(field, (field, ""))
+        direction = "en hausse" if slope > 0 else "en baisse"
+        eta = entry.get("eta_seuil_s")
+        if eta is not None and eta <= horizon:
+            alerts.append((eta, (
+                f"{label} {direction} ({slope:+g} {unit}/min) : seuil de {entry['seuil_suivant']:g} {unit} "
+                f"franchi dans environ {max(1, round(eta / 60))} min."
+            )))
+        elif abs(slope * horizon / 60) >= Config.FORECAST_MIN_CHANGE * max(abs(entry["moyenne"]), 1):
+            moves.append(f"{label} {direction} ({slope:+g} {unit}/min).")
+
+    if not alerts and not moves:
+        if trends["releves"] < Config.TIMESERIES_MIN_POINTS:
+            return None
+        return f"Conditions stables sur les {max(1, round(trends['duree_s'] / 60))} dernières minutes."
+    return " ".join([text for _, text in sorted(alerts)] + moves)
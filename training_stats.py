@@ -0,0 +1,433 @@
+"""
+Statistiques précalculées du jeu d'entraînement
+
+Les distributions par maladie (quantiles, répartition pollen / sévérité,
+corrélations avec la sévérité) sont calculées une seule fois puis
+enregistrées dans un artefact JSON compact, nommé d'après l'empreinte
+SHA-256 du CSV. Au démarrage suivant, l'artefact est rechargé directement ;
+il n'est recalculé que si le CSV change. L'empreinte elle-même est gardée
+dans un manifeste avec la taille et la date de modification du CSV : le
+fichier n'est relu en entier que si l'une d'elles change.
+
+Le CSV est lu par blocs (types explicites, catégories pour maladie, pollen
+et sévérité) dont la taille découle de Config.TRAINING_MEMORY_MB : chaque
+bloc met à jour des sommes par maladie (un seul groupby) et un échantillon
+par réservoir de Config.TRAINING_QUANTILE_SAMPLE valeurs pour les
+quantiles, exacts tant qu'une maladie ne dépasse pas cette taille. Un jeu
+de données colonnaire (.npcols, voir columnar.py) est lu de la même façon,
+sans analyse de texte, et partage l'artefact du CSV dont il est issu.
+
+Usage :
+    python training_stats.py   # (re)construit l'artefact
+"""
+import glob
+import hashlib
+import json
+import math
+import os
+import tempfile
+from collections import Counter
+import numpy as np
+from config import Config
+
+STATS_VERSION = 2
+NUMERIC_COLUMNS = ("temperature", "humidity", "co2", "pm25")
+CATEGORY_COLUMNS = ("pollen", "severite")
+QUANTILES = (0.1, 0.5, 0.9)
+
+# Types à la lecture du CSV : une catégorie stocke chaque libellé une seule fois
+CSV_DTYPES = {
+    "maladie": "category",
+    "pollen": "category",
+    "severite": "category",
+    **{column: "float32" for column in NUMERIC_COLUMNS}
+}
+# Colonnes dérivées (float64) calculées par ligne d'un bloc avant le groupby,
+# copies temporaires et tables du groupby comprises (mesuré : ~1,1 Ko par ligne)
+WORKING_BYTES_PER_ROW = 4 * 8 * (1 + 9 * len(NUMERIC_COLUMNS))
+# Empreintes des fichiers déjà hachés, avec leur taille et date de modification
+HASH_MANIFEST = "file_hashes.json"
+
+
+def file_hash(path, block_size=1 << 20):
+    """
+    Empreinte SHA-256 d'un fichier, lu par blocs
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cached_file_hash(path):
+    """
+    Empreinte SHA-256 d'un fichier, reprise du manifeste de
+    Config.TRAINING_STATS_DIR tant que sa taille et sa date de modification
+    sont inchangées : le fichier n'est relu en entier qu'après modification
+    """
+    stat = os.stat(path)
+    signature = [stat.st_size, stat.st_mtime_ns]
+    manifest_path = os.path.join(Config.TRAINING_STATS_DIR, HASH_MANIFEST)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    key = os.path.abspath(path)
+    entry = manifest.get(key)
+    if isinstance(entry, dict) and entry.get("signature") == signature:
+        return entry["sha256"]
+
+    digest = file_hash(path)
+    manifest[key] = {"signature": signature, "sha256": digest}
+    try:
+        write_atomic(manifest_path, lambda f: json.dump(manifest, f, ensure_ascii=False, indent=1))
+    except OSError:
+        pass  # Dossier en lecture seule : l'empreinte sera recalculée au prochain démarrage
+    return digest
+
+
+def write_atomic(path, write, binary=False):
+    """
+    Écrit un fichier via un fichier temporaire unique du même dossier puis
+    os.replace : ni fichier partiel visible, ni collision entre processus
+    qui écrivent le même artefact
+
+    Args:
+        write: Fonction qui reçoit le fichier temporaire ouvert
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        if binary:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+        else:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def dataset_hash(path):
+    """
+    Empreinte des données d'entraînement : celle du CSV d'origine pour un
+    jeu de données colonnaire (mêmes statistiques, même artefact)
+    """
+    from columnar import ColumnarDataset, is_columnar
+    if is_columnar(path):
+        return ColumnarDataset(path).source_hash
+    return cached_file_hash(path)
+
+
+def artifact_path(csv_hash):
+    return os.path.join(Config.TRAINING_STATS_DIR, f"training_stats_{csv_hash[:16]}.json")
+
+
+def reservoir_positions(seen, count, size, rng):
+    """
+    Échantillonnage par réservoir (algorithme R) d'un lot de `count` éléments
+    arrivant après `seen` éléments déjà vus
+
+    Returns:
+        tuple: (positions dans le lot, emplacements du réservoir à remplacer)
+    """
+    index = np.arange(count)
+    fill = max(0, min(size - seen, count))
+    positions, slots = index[:fill], seen + index[:fill]
+    rest = index[fill:]
+    if len(rest):
+        draws = rng.integers(0, seen + rest + 1)
+        keep = draws < size
+        positions = np.concatenate([positions, rest[keep]])
+        slots = np.concatenate([slots, draws[keep]])
+    # Un emplacement tiré plusieurs fois garde le dernier élément du lot
+    _, last = np.unique(slots[::-1], return_index=True)
+    last = len(slots) - 1 - last
+    return positions[last], slots[last]
+
+
+def read_training_chunks(csv_path, columns=None, memory_mb=None):
+    """
+    Lit le CSV d'entraînement (ou le jeu colonnaire .npcols) par blocs dont
+    la taille respecte le budget mémoire
+
+    Args:
+        columns: Colonnes à lire (toutes par défaut)
+        memory_mb: Budget mémoire d'un bloc et de ses colonnes dérivées (Config.TRAINING_MEMORY_MB)
+    """
+    import pandas as pd
+    from columnar import ColumnarDataset, is_columnar
+    budget = (memory_mb or Config.TRAINING_MEMORY_MB) * 1e6
+    if is_columnar(csv_path):
+        dataset = ColumnarDataset(csv_path)
+        # Colonnes numériques : vues des fichiers projetés, seules les colonnes dérivées sont allouées
+        chunk_rows = max(1000, int(budget / (dataset.row_bytes(columns) + WORKING_BYTES_PER_ROW)))
+        return dataset.iter_chunks(columns, chunk_rows)
+    usecols = (lambda column: column in columns) if columns is not None else None
+    probe = pd.read_csv(csv_path, usecols=usecols, dtype=CSV_DTYPES, nrows=1000)
+    row_bytes = probe.memory_usage(deep=True, index=False).sum() / max(len(probe), 1)
+    # Le lecteur garde aussi le texte brut des lignes (colonnes ignorées comprises)
+    with open(csv_path, "rb") as f:
+        lines = [line for _, line in zip(range(1001), f)][1:]
+    row_bytes += 2 * sum(map(len, lines)) / max(len(lines), 1)
+    chunk_rows = max(1000, int(budget / (row_bytes + WORKING_BYTES_PER_ROW)))
+    return pd.read_csv(csv_path, usecols=usecols, dtype=CSV_DTYPES, chunksize=chunk_rows)
+
+
+class TrainingStatsAccumulator:
+    """
+    Statistiques par maladie calculées bloc par bloc, en mémoire bornée
+
+    Moyennes, écarts-types et corrélations découlent de sommes (décalées par
+    la moyenne du premier bloc pour limiter les erreurs d'arrondi) ; les
+    quantiles d'un échantillon par réservoir de taille fixe.
+    """
+
+    def __init__(self, sample_size=None, seed=0):
+        self.sample_size = sample_size or Config.TRAINING_QUANTILE_SAMPLE
+        self.total = 0
+        self._rng = np.random.default_rng(seed)
+        self._shifts = {}
+        self._sums = None  # DataFrame : maladie -> sommes
+        self._global = {}  # colonne -> [n, somme, somme des carrés] (toutes lignes)
+        self._samples = {}  # (maladie, colonne) -> [valeurs vues, réservoir]
+        self._categories = {column: {} for column in CATEGORY_COLUMNS}  # colonne -> maladie -> Counter
+        self._columns = set()
+
+    def add(self, chunk):
+        """
+        Intègre un bloc (DataFrame) du CSV d'entraînement
+        """
+        import pandas as pd
+        self.total += len(chunk)
+        numeric = [c for c in NUMERIC_COLUMNS if c in chunk.columns]
+        self._columns.update(c for c in numeric + list(CATEGORY_COLUMNS) if c in chunk.columns)
+
+        diseases = chunk["maladie"].astype("category")
+        labels = np.asarray(diseases.cat.categories.astype(str))
+        codes = diseases.cat.codes.to_numpy()
+        valid = codes >= 0
+        codes = codes[valid]
+
+        severity = None
+        if "severite" in chunk.columns:
+            levels = chunk["severite"].astype("category")
+            order = [Config.SEVERITY_ORDER.get(str(level), np.nan) for level in levels.cat.categories]
+            # Code -1 (valeur manquante) : dernier élément, NaN
+            severity = np.array(order + [np.nan], dtype=np.float64)[levels.cat.codes.to_numpy()][valid]
+
+        derived = {"n": np.ones(len(codes))}
+        rows = np.argsort(codes, kind="stable")
+        groups = np.split(rows, np.flatnonzero(np.diff(codes[rows])) + 1) if len(rows) else []
+        for column in numeric:
+            values = chunk[column].to_numpy(dtype=np.float64)
+            self._update_global(column, values)
+            values = values[valid]
+            for group in groups:
+                self._sample(labels[codes[group[0]]], column, values[group])
+
+            x = values - self._shifts[column]
+            present = ~np.isnan(x)
+            derived[f"{column}:n"] = present
+            derived[f"{column}:s"] = np.where(present, x, 0.0)
+            derived[f"{column}:ss"] = np.where(present, x * x, 0.0)
+            if severity is not None:
+                both = present & ~np.isnan(severity)
+                bx, by = np.where(both, x, 0.0), np.where(both, severity, 0.0)
+                derived.update({
+                    f"{column}:bn": both, f"{column}:bx": bx, f"{column}:by": by,
+                    f"{column}:bxx": bx * bx, f"{column}:byy": by * by, f"{column}:bxy": bx * by
+                })
+
+        sums = pd.DataFrame(derived).groupby(codes).sum()
+        sums.index = labels[sums.index]
+        self._sums = sums if self._sums is None else self._sums.add(sums, fill_value=0)
+
+        for column in CATEGORY_COLUMNS:
+            if column not in chunk.columns:
+                continue
+            counts = chunk.groupby(["maladie", column], observed=True).size()
+            for (disease, value), count in counts.items():
+                self._categories[column].setdefault(str(disease), Counter())[str(value)] += int(count)
+
+    def _update_global(self, column, values):
+        present = values[~np.isnan(values)]
+        shift = self._shifts.setdefault(column, float(present.mean()) if len(present) else 0.0)
+        present = present - shift
+        totals = self._global.setdefault(column, [0, 0.0, 0.0])
+        totals[0] += len(present)
+        totals[1] += float(present.sum())
+        totals[2] += float((present * present).sum())
+
+    def _sample(self, disease, column, values):
+        values = values[~np.isnan(values)]
+        state = self._samples.setdefault((disease, column), [0, np.empty(self.sample_size)])
+        positions, slots = reservoir_positions(state[0], len(values), self.sample_size, self._rng)
+        state[1][slots] = values[positions]
+        state[0] += len(values)
+
+    def result(self):
+        """
+        Statistiques sérialisables en JSON (même format que l'artefact)
+        """
+        numeric = [c for c in NUMERIC_COLUMNS if c in self._columns]
+        global_std = {}
+        for column in numeric:
+            n, total, squares = self._global[column]
+            global_std[column] = round(_std(n, total, squares), 3) if n > 1 else float("nan")
+
+        diseases = {}
+        sums = self._sums if self._sums is not None else {}
+        for disease in sorted(getattr(sums, "index", [])):
+            row = sums.loc[disease]
+            features, correlations = {}, {}
+            for column in numeric:
+                n = row[f"{column}:n"]
+                if not n:
+                    continue
+                seen, sample = self._samples[(disease, column)]
+                quantiles = np.quantile(sample[:min(seen, self.sample_size)], QUANTILES)
+                features[column] = {
+                    "mean": round(row[f"{column}:s"] / n + self._shifts[column], 3),
+                    "std": round(_std(n, row[f"{column}:s"], row[f"{column}:ss"]), 3) if n > 1 else 0.0,
+                    **{f"p{int(q * 100)}": round(float(v), 3) for q, v in zip(QUANTILES, quantiles)}
+                }
+                if f"{column}:bn" in row:
+                    r = _correlation(*(row[f"{column}:{k}"] for k in ("bn", "bx", "by", "bxx", "byy", "bxy")))
+                    if r is not None:
+                        correlations[column] = round(r, 3)
+
+            entry = {"count": int(row["n"]), "features": features}
+            for column in CATEGORY_COLUMNS:
+                if column in self._columns:
+                    entry[column] = _shares(self._categories[column].get(disease, Counter()))
+            if "severite" in self._columns:
+                entry["severity_correlation"] = correlations
+            diseases[disease] = entry
+
+        return {
+            "version": STATS_VERSION,
+            "total": int(self.total),
+            "global_std": global_std,
+            "diseases": diseases
+        }
+
+
+def _std(n, total, squares):
+    return math.sqrt(max(squares - total * total / n, 0.0) / (n - 1))
+
+
+def _correlation(n, sx, sy, sxx, syy, sxy):
+    """
+    Corrélation de Pearson à partir des sommes (None si indéfinie, comme pandas)
+    """
+    if n < 2:
+        return None
+    vx, vy = sxx - sx * sx / n, syy - sy * sy / n
+    # Variance nulle aux erreurs d'arrondi près
+    if vx <= 1e-12 * sxx or vy <= 1e-12 * syy:
+        return None
+    return float((sxy - sx * sy / n) / math.sqrt(vx * vy))
+
+
+def _shares(counts):
+    total = sum(counts.values())
+    ordered = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    return {value: round(count / total, 3) for value, count in ordered}
+
+
+def compute_training_stats(df):
+    """
+    Calcule les statistiques par maladie à partir d'un DataFrame d'entraînement
+
+    Returns:
+        dict: Statistiques sérialisables en JSON
+    """
+    accumulator = TrainingStatsAccumulator()
+    accumulator.add(df)
+    return accumulator.result()
+
+
+def compute_training_stats_from_csv(csv_path, memory_mb=None):
+    """
+    Calcule les statistiques en lisant le CSV par blocs (mémoire bornée)
+    """
+    accumulator = TrainingStatsAccumulator()
+    columns = ("maladie",) + NUMERIC_COLUMNS + CATEGORY_COLUMNS
+    for chunk in read_training_chunks(csv_path, columns, memory_mb):
+        accumulator.add(chunk)
+    return accumulator.result()
+
+
+def load_or_build_stats(csv_path=None):
+    """
+    Charge l'artefact correspondant au CSV (ou au jeu colonnaire), ou le construit s'il n'existe pas
+
+    Returns:
+        tuple: (statistiques, True si chargées depuis l'artefact)
+    """
+    csv_path = csv_path or Config.TRAINING_DATA_PATH
+    csv_hash = dataset_hash(csv_path)
+    path = artifact_path(csv_hash)
+
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            stats = json.load(f)
+        if stats.get("version") == STATS_VERSION:
+            return stats, True
+
+    stats = compute_training_stats_from_csv(csv_path)
+    stats["csv_hash"] = csv_hash
+    save_stats(stats, path)
+    return stats, False
+
+
+def save_stats(stats, path):
+    """
+    Écrit l'artefact de façon atomique et supprime les versions obsolètes
+    """
+    write_atomic(path, lambda f: json.dump(stats, f, ensure_ascii=False, separators=(",", ":")))
+
+    for old in glob.glob(os.path.join(os.path.dirname(path), "training_stats_*.json")):
+        if old != path:
+            os.remove(old)
+
+
+def context_from_stats(stats):
+    """
+    Transforme les statistiques en contexte textuel compact pour Gemini
+    """
+    lines = ["CONNAISSANCES MÉDICALES (statistiques des données d'entraînement, médiane [p10-p90]) :"]
+    total = stats["total"] or 1
+    for disease, entry in stats["diseases"].items():
+        lines.append(f"\n{disease.upper()} ({entry['count']} cas, {100 * entry['count'] / total:.0f} %) :")
+        for column, feature in entry["features"].items():
+            lines.append(f"- {column} : {feature['p50']:g} [{feature['p10']:g}-{feature['p90']:g}]")
+        if entry.get("pollen"):
+            lines.append("- pollen : " + ", ".join(f"{k} {v:.0%}" for k, v in entry["pollen"].items()))
+        if entry.get("severite"):
+            lines.append("- sévérité : " + ", ".join(f"{k} {v:.0%}" for k, v in entry["severite"].items()))
+        correlated = sorted(
+            entry.get("severity_correlation", {}).items(), key=lambda item: -abs(item[1])
+        )
+        correlated = [(c, r) for c, r in correlated if abs(r) >= Config.CONTEXT_MIN_CORRELATION]
+        if correlated:
+            lines.append("- liés à la sévérité : " + ", ".join(f"{c} (r={r:+.2f})" for c, r in correlated))
+
+    lines.append(f"\nTOTAL DES CAS ANALYSÉS : {stats['total']}")
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    stats, cached = load_or_build_stats()
+    print(f"✓ Statistiques {'rechargées' if cached else 'calculées'} : {stats['total']} enregistrements")
+    print(context_from_stats(stats))